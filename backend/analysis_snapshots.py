@@ -0,0 +1,65 @@
+"""
+Stored Granite analyses of saved sessions.
+A snapshot lives in the same database file as its session (its shard) and is keyed by a hash of the
+exact prompt inputs plus the model version, so it is served again only while neither has changed.
+Deleting a session (archival, re-import) deletes its snapshot through a trigger.
+"""
+import hashlib
+import json
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional
+
+def init_snapshot_schema(conn: sqlite3.Connection):
+    with conn:
+        conn.execute('''CREATE TABLE IF NOT EXISTS analysis_snapshots (
+            session_id INTEGER PRIMARY KEY,
+            content_hash TEXT NOT NULL,
+            model_version TEXT NOT NULL,
+            report TEXT NOT NULL,
+            seconds REAL,
+            created_at REAL NOT NULL
+        )''')
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS analysis_snapshots_delete AFTER DELETE ON sessions BEGIN
+                DELETE FROM analysis_snapshots WHERE session_id = old.id;
+            END
+        """)
+
+def content_hash(*parts: str) -> str:
+    """Hash of everything that goes into the analysis prompt"""
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+def get_snapshot(conn: sqlite3.Connection, session_id: int, digest: str, model_version: str) -> Optional[Dict[str, Any]]:
+    """The stored analysis if it was made from the same inputs by the same model, else None"""
+    init_snapshot_schema(conn)
+    row = conn.execute("""
+        SELECT report, seconds, created_at FROM analysis_snapshots
+        WHERE session_id = ? AND content_hash = ? AND model_version = ?
+    """, (session_id, digest, model_version)).fetchone()
+    if row is None:
+        return None
+    return {"report": row[0], "seconds": row[1], "created_at": row[2]}
+
+def save_snapshot(conn: sqlite3.Connection, session_id: int, digest: str, model_version: str, report: str,
+                  seconds: float = None):
+    init_snapshot_schema(conn)
+    with conn:
+        conn.execute("""
+            INSERT INTO analysis_snapshots (session_id, content_hash, model_version, report, seconds, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(session_id) DO UPDATE SET content_hash = excluded.content_hash,
+                model_version = excluded.model_version, report = excluded.report,
+                seconds = excluded.seconds, created_at = excluded.created_at
+        """, (session_id, digest, model_version, report, seconds, time.time()))
+
+def sessions_without_snapshot(conn: sqlite3.Connection, model_version: str, max_age_hours: float,
+                              limit: int = 10) -> List[int]:
+    """Newest sessions saved in the last max_age_hours with no snapshot from model_version"""
+    init_snapshot_schema(conn)
+    rows = conn.execute("""
+        SELECT s.id FROM sessions s LEFT JOIN analysis_snapshots a ON a.session_id = s.id
+        WHERE s.created_at >= datetime('now', ?) AND (a.session_id IS NULL OR a.model_version != ?)
+        ORDER BY s.id DESC LIMIT ?
+    """, (f"-{max_age_hours} hours", model_version, limit)).fetchall()
+    return [row[0] for row in rows]
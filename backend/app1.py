@@ -1,12 +1,19 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-import sqlite3
+import multiprocessing
+import os
+import threading
+import time
 import requests
 import json
+import re
 from typing import Dict, Any
-import torch
-from transformers import AutoTokenizer, AutoModelForCausalLM
 import logging
+from monte_carlo import simulate_goal_success, summarize_goal_simulation
+import knowledge_base
+import report_rules
+import session_shards
+import analysis_snapshots
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -25,24 +32,86 @@ app.add_middleware(
 
 # IBM Granite model configuration
 GRANITE_MODEL_ID = "ibm-granite/granite-3.0-1b-a400m-instruct"
+# On CPU: "pretrained" gives each process its own copy of the weights, "mmap" maps the
+# float32 safetensors written by granite_mmap.py so all workers share one copy
+GRANITE_LOAD_MODE = os.getenv("GRANITE_LOAD_MODE", "pretrained")
+GRANITE_HOST = os.getenv("GRANITE_HOST", "0.0.0.0")
+GRANITE_PORT = int(os.getenv("GRANITE_PORT", "8002"))
+# More than one worker forks them from a parent that has already loaded the model
+GRANITE_WORKERS = int(os.getenv("GRANITE_WORKERS", "1"))
+
+# Decoding mode when a request does not pick one:
+#   standard      - plain autoregressive decoding
+#   prompt_lookup - drafts from n-grams already in the prompt, verified by Granite in one forward pass
+#   assisted      - drafts from GRANITE_DRAFT_MODEL_ID (must share Granite's tokenizer)
+DECODING_MODES = ("standard", "prompt_lookup", "assisted")
+GRANITE_DECODING = os.getenv("GRANITE_DECODING", "standard")
+GRANITE_DRAFT_MODEL_ID = os.getenv("GRANITE_DRAFT_MODEL_ID", "")
+PROMPT_LOOKUP_TOKENS = int(os.getenv("GRANITE_PROMPT_LOOKUP_TOKENS", "10"))
+MAX_NEW_TOKENS = 256
+
+# Session analyses are stored and served again until the session, the model or this version changes;
+# bump it when the analysis prompt or the structured report rules change
+ANALYSIS_VERSION = 1
+ANALYSIS_MODEL_VERSION = f"{GRANITE_MODEL_ID}/analysis-v{ANALYSIS_VERSION}"
+# Analyze sessions saved in the last ANALYSIS_PRECOMPUTE_MAX_AGE_HOURS in the background once no request
+# has arrived for ANALYSIS_IDLE_SECONDS, so /analyze-session usually finds a stored analysis
+ANALYSIS_PRECOMPUTE = os.getenv("ANALYSIS_PRECOMPUTE", "0") == "1"
+ANALYSIS_IDLE_SECONDS = float(os.getenv("ANALYSIS_IDLE_SECONDS", "30"))
+ANALYSIS_PRECOMPUTE_MAX_AGE_HOURS = float(os.getenv("ANALYSIS_PRECOMPUTE_MAX_AGE_HOURS", "24"))
 
 # Global variables for model and tokenizer
 tokenizer = None
 model = None
+draft_model = None
+# Index of this pre-forked worker (None without pre-forking)
+worker_index = None
+
+# Requests in flight and when the last one arrived, for the background precompute. Created at import, so
+# pre-forked workers inherit the same shared memory and worker 0 sees the requests of every worker
+_in_flight = multiprocessing.Value("i", 0)
+_last_request = multiprocessing.Value("d", time.monotonic())
+
+def _record_activity(delta: int):
+    with _in_flight.get_lock():
+        _in_flight.value += delta
+        _last_request.value = time.monotonic()
+
+@app.middleware("http")
+async def track_activity(request: Request, call_next):
+    if request.url.path == "/health":
+        return await call_next(request)
+    _record_activity(1)
+    try:
+        return await call_next(request)
+    finally:
+        _record_activity(-1)
 
 def load_granite_model():
     """Load IBM Granite model and tokenizer"""
     global tokenizer, model
+    if model is not None and tokenizer is not None:
+        # Already loaded, e.g. by the pre-forking parent
+        return True
     try:
         logger.info(f"Loading Granite model: {GRANITE_MODEL_ID}")
-        
-        # Load tokenizer
-        tokenizer = AutoTokenizer.from_pretrained(GRANITE_MODEL_ID, trust_remote_code=True)
+        # torch and transformers take seconds to import, so they load with the model rather than with the app
+        import torch
+        from transformers import AutoTokenizer, AutoModelForCausalLM
         
         # Load model with appropriate device
         device = "cuda" if torch.cuda.is_available() else "cpu"
         logger.info(f"Using device: {device}")
         
+        if device == "cpu" and GRANITE_LOAD_MODE == "mmap":
+            import granite_mmap
+            tokenizer, model = granite_mmap.load(GRANITE_MODEL_ID)
+            logger.info("Granite model loaded from memory-mapped weights")
+            return True
+        
+        # Load tokenizer
+        tokenizer = AutoTokenizer.from_pretrained(GRANITE_MODEL_ID, trust_remote_code=True)
+        
         model = AutoModelForCausalLM.from_pretrained(
             GRANITE_MODEL_ID,
             torch_dtype=torch.float16 if device == "cuda" else torch.float32,
@@ -60,6 +129,62 @@ def load_granite_model():
         logger.error(f"Failed to load Granite model: {e}")
         return False
 
+def load_draft_model():
+    """Load the draft model for assisted decoding; None when none is configured or it fails to load"""
+    global draft_model
+    if draft_model is None and GRANITE_DRAFT_MODEL_ID:
+        from transformers import AutoModelForCausalLM
+        try:
+            logger.info(f"Loading draft model: {GRANITE_DRAFT_MODEL_ID}")
+            draft_model = AutoModelForCausalLM.from_pretrained(
+                GRANITE_DRAFT_MODEL_ID,
+                torch_dtype=next(model.parameters()).dtype,
+                trust_remote_code=True
+            ).to(next(model.parameters()).device)
+        except Exception as e:
+            logger.error(f"Failed to load draft model: {e}")
+    return draft_model
+
+def decoding_kwargs(decoding: str) -> dict:
+    """Extra generate() arguments for a decoding mode; unusable modes fall back to standard decoding"""
+    if decoding == "prompt_lookup":
+        return {"prompt_lookup_num_tokens": PROMPT_LOOKUP_TOKENS}
+    if decoding == "assisted":
+        if load_draft_model() is not None:
+            return {"assistant_model": draft_model}
+        logger.warning("Assisted decoding requested without a usable GRANITE_DRAFT_MODEL_ID; using standard decoding")
+    return {}
+
+def granite_generate(full_prompt: str, decoding: str = None, sample: bool = True):
+    """
+    Generate a continuation of full_prompt; returns (text, new token count, seconds)
+    Greedy decoding (sample=False) gives identical tokens in every mode, which the decoding benchmark relies on
+    """
+    import torch
+    
+    inputs = tokenizer(full_prompt, return_tensors="pt", truncation=True, max_length=512)
+    
+    # Move to same device as model
+    device = next(model.parameters()).device
+    inputs = {k: v.to(device) for k, v in inputs.items()}
+    sampling = {"do_sample": True, "temperature": 0.5, "top_p": 0.7} if sample else {"do_sample": False}
+    
+    start = time.perf_counter()
+    with torch.no_grad():
+        outputs = model.generate(
+            **inputs,
+            **sampling,
+            **decoding_kwargs(decoding or GRANITE_DECODING),
+            max_new_tokens=MAX_NEW_TOKENS,
+            pad_token_id=tokenizer.eos_token_id,
+            repetition_penalty=1.05,
+            num_beams=1         # Single beam for speed
+        )
+    elapsed = time.perf_counter() - start
+    
+    new_tokens = outputs[0][inputs["input_ids"].shape[1]:]
+    return tokenizer.decode(new_tokens, skip_special_tokens=True), len(new_tokens), elapsed
+
 def is_finance_related(query: str) -> bool:
     """Check if query is related to finance, tax, savings, loans, or financial laws"""
     finance_keywords = [
@@ -96,9 +221,20 @@ def is_finance_related(query: str) -> bool:
     query_lower = query.lower()
     return any(keyword in query_lower for keyword in finance_keywords)
 
-def run_granite_model(prompt: str, system_prompt: str = None) -> str:
+def knowledge_context(raw_content: str, max_chars: int = 300) -> str:
+    """Knowledge base notes relevant to the goal and user type in a report's raw content"""
+    fields = dict(re.findall(r"^(goal|user_type):\s*(.*)$", raw_content, re.M))
+    query = f"{fields.get('goal', '')} {fields.get('user_type', '')} savings budget"
+    try:
+        return knowledge_base.context_for(query, k=2, max_chars=max_chars)
+    except Exception as e:
+        logger.warning(f"Knowledge base unavailable: {e}")
+        return ""
+
+def run_granite_model(prompt: str, system_prompt: str = None, context: str = "", decoding: str = None) -> str:
     """
-    Run IBM Granite 3.0 1B model for report generation
+    Run IBM Granite 3.0 1B model for report generation, grounded in optional reference notes
+    decoding picks one of DECODING_MODES for this request (default GRANITE_DECODING)
     """
     global tokenizer, model
     
@@ -117,36 +253,16 @@ def run_granite_model(prompt: str, system_prompt: str = None) -> str:
             full_prompt = f"Analyze: {prompt[:200]}... Report:"
         else:
             full_prompt = f"Financial Report: {prompt[:200]}... Analysis:"
+        if context:
+            full_prompt = f"Notes: {context[:300]}\n{full_prompt}"
         
-        # Tokenize input with minimal context for maximum speed
-        inputs = tokenizer(full_prompt, return_tensors="pt", truncation=True, max_length=512)
-        
-        # Move to same device as model
-        device = next(model.parameters()).device
-        inputs = {k: v.to(device) for k, v in inputs.items()}
-        
-        # Generate response with ultra-fast parameters
-        with torch.no_grad():
-            outputs = model.generate(
-                **inputs,
-                max_new_tokens=256,  # Even shorter for speed
-                temperature=0.5,     # Lower for consistency
-                do_sample=True,
-                pad_token_id=tokenizer.eos_token_id,
-                repetition_penalty=1.05,
-                top_p=0.7,          # More focused sampling
-                num_beams=1,        # Single beam for speed
-                early_stopping=True  # Stop early when possible
-            )
+        generated_text, new_tokens, elapsed = granite_generate(full_prompt, decoding)
+        logger.info(f"Granite generated {new_tokens} tokens in {elapsed:.1f}s ({decoding or GRANITE_DECODING} decoding)")
         
-        # Decode the response
-        response = tokenizer.decode(outputs[0], skip_special_tokens=True)
-        
-        # Extract only the generated part (after "Assistant:")
-        if "Assistant:" in response:
-            generated_text = response.split("Assistant:")[-1].strip()
-        else:
-            generated_text = response[len(full_prompt):].strip()
+        # Keep only the answer when the model echoes a chat turn
+        if "Assistant:" in generated_text:
+            generated_text = generated_text.split("Assistant:")[-1]
+        generated_text = generated_text.strip()
         
         # Combine with structured report for comprehensive output
         structured_report = generate_structured_report(prompt)
@@ -161,16 +277,11 @@ def run_granite_model(prompt: str, system_prompt: str = None) -> str:
 def generate_structured_report(raw_content: str) -> str:
     """
     Generate structured financial report from raw content
-    This function processes the input and formats it into a proper structure
+    The content is parsed once into a FinancialProfile and every rule-based section comes from one rules pass
     """
-    # Parse raw content to extract financial data
-    lines = raw_content.strip().split('\n')
-    report_data = {}
-    
-    for line in lines:
-        if ':' in line:
-            key, value = line.split(':', 1)
-            report_data[key.strip().lower()] = value.strip()
+    profile = report_rules.FinancialProfile.parse(raw_content)
+    sections = report_rules.evaluate(profile)
+    net_savings = f"{profile.savings:,.2f}" if profile.valid and profile.income and profile.expenses else "N/A"
     
     # Generate structured report
     report = f"""
@@ -181,31 +292,36 @@ def generate_structured_report(raw_content: str) -> str:
 📊 FINANCIAL OVERVIEW
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 
-Monthly Income:     ${report_data.get('income', 'N/A')}
-Monthly Expenses:   ${report_data.get('expenses', 'N/A')}
-Net Savings:        ${float(report_data.get('income', 0)) - float(report_data.get('expenses', 0)) if report_data.get('income') and report_data.get('expenses') else 'N/A'}
+Monthly Income:     ${format_amount(profile.income) if profile.valid else 'N/A'}
+Monthly Expenses:   ${format_amount(profile.expenses) if profile.valid else 'N/A'}
+Net Savings:        ${net_savings}
 
 🎯 FINANCIAL GOALS
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 
-Primary Goal:       {report_data.get('goal', 'No goal specified')}
-Target Amount:      ${report_data.get('goal_amount', 'N/A')}
-User Type:          {report_data.get('user_type', 'Not specified').title()}
-
+Primary Goal:       {profile.goal or 'No goal specified'}
+Target Amount:      ${format_amount(profile.goal_amount)}
+User Type:          {profile.user_type.title()}
+{format_spending_categories(profile)}
 📈 FINANCIAL ANALYSIS
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 
-{analyze_financial_health(report_data)}
+{chr(10).join(sections['analysis'])}
 
 💡 RECOMMENDATIONS
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 
-{generate_recommendations(report_data)}
+{chr(10).join(sections['recommendations'])}
+
+🎲 GOAL ACHIEVEMENT STRATEGY
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+{generate_goal_strategy(profile)}
 
 📋 ACTION ITEMS
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 
-{generate_action_items(report_data)}
+{chr(10).join(sections['actions'])}
 
 ═══════════════════════════════════════════════════════════════
 Report Generated by: IBM Granite 3.0-1B Financial Assistant
@@ -214,111 +330,38 @@ Generated on: {__import__('datetime').datetime.now().strftime('%Y-%m-%d %H:%M:%S
 """
     return report
 
-def analyze_financial_health(data: Dict[str, Any]) -> str:
-    """Analyze financial health based on input data"""
-    try:
-        income = float(data.get('income', 0))
-        expenses = float(data.get('expenses', 0))
-        
-        if income == 0:
-            return "• Insufficient data for comprehensive analysis"
-        
-        savings_rate = ((income - expenses) / income) * 100
-        
-        analysis = []
-        
-        if savings_rate > 20:
-            analysis.append(f"• Excellent savings rate: {savings_rate:.1f}% (Above recommended 20%)")
-        elif savings_rate > 10:
-            analysis.append(f"• Good savings rate: {savings_rate:.1f}% (Above minimum 10%)")
-        elif savings_rate > 0:
-            analysis.append(f"• Low savings rate: {savings_rate:.1f}% (Below recommended 10%)")
-        else:
-            analysis.append(f"• Negative savings: {savings_rate:.1f}% (Expenses exceed income)")
-        
-        expense_ratio = (expenses / income) * 100
-        analysis.append(f"• Expense ratio: {expense_ratio:.1f}% of income")
-        
-        if expense_ratio > 80:
-            analysis.append("• High expense ratio - requires immediate attention")
-        elif expense_ratio > 70:
-            analysis.append("• Moderate expense ratio - room for improvement")
-        else:
-            analysis.append("• Healthy expense ratio - good financial discipline")
-            
-        return '\n'.join(analysis)
-        
-    except (ValueError, TypeError):
-        return "• Unable to analyze due to invalid financial data"
+def format_amount(value) -> str:
+    return f"{value:,.2f}" if value else "N/A"
 
-def generate_recommendations(data: Dict[str, Any]) -> str:
-    """Generate personalized recommendations"""
-    recommendations = []
-    
-    try:
-        income = float(data.get('income', 0))
-        expenses = float(data.get('expenses', 0))
-        user_type = data.get('user_type', 'general')
-        
-        if income > expenses:
-            recommendations.append("• Continue maintaining positive cash flow")
-            recommendations.append("• Consider increasing savings rate to 20% if possible")
-        else:
-            recommendations.append("• Urgent: Review and reduce monthly expenses")
-            recommendations.append("• Create a detailed budget to track spending")
-        
-        if user_type == 'student':
-            recommendations.append("• Focus on building emergency fund (3-6 months expenses)")
-            recommendations.append("• Consider part-time income opportunities")
-            recommendations.append("• Look into student-specific financial products")
-        elif user_type == 'professional':
-            recommendations.append("• Maximize employer retirement contributions")
-            recommendations.append("• Consider diversifying income streams")
-            recommendations.append("• Review insurance coverage adequacy")
-        
-        goal_amount = data.get('goal_amount')
-        if goal_amount:
-            try:
-                monthly_savings_needed = float(goal_amount) / 12
-                recommendations.append(f"• To reach your goal in 1 year, save ${monthly_savings_needed:.2f} monthly")
-            except (ValueError, TypeError):
-                pass
-    
-    except (ValueError, TypeError):
-        recommendations.append("• Ensure accurate financial data for better recommendations")
-    
-    return '\n'.join(recommendations) if recommendations else "• Please provide complete financial data for personalized recommendations"
-
-def generate_action_items(data: Dict[str, Any]) -> str:
-    """Generate specific action items"""
-    actions = [
-        "1. Set up automatic savings transfer for consistent saving habit",
-        "2. Review and categorize all monthly expenses",
-        "3. Create a monthly budget and stick to it",
-        "4. Track progress toward financial goals weekly",
-        "5. Review and update financial plan quarterly"
-    ]
-    
-    try:
-        income = float(data.get('income', 0))
-        expenses = float(data.get('expenses', 0))
-        
-        if expenses >= income:
-            actions.insert(0, "PRIORITY: Immediately reduce expenses or increase income")
-        
-        if data.get('goal') and not data.get('goal_amount'):
-            actions.append("6. Define specific monetary target for your financial goal")
-            
-    except (ValueError, TypeError):
-        pass
+def format_spending_categories(profile: report_rules.FinancialProfile) -> str:
+    """List spending categories from uploaded transactions, when available"""
+    if not profile.spending_categories:
+        return ""
+    parts = re.split(r"(?<=\)),\s*", profile.spending_categories)
+    section = "\nSpending by Category:\n" + '\n'.join(f"  • {part}" for part in parts) + "\n"
+    if profile.subscriptions:
+        section += f"Recurring Subscriptions: {profile.subscriptions}\n"
+    return section
+
+def generate_goal_strategy(profile: report_rules.FinancialProfile) -> str:
+    """Estimate the probability of reaching the goal with a Monte Carlo simulation"""
+    if not profile.valid:
+        return "• Unable to simulate goal progress due to invalid financial data"
+    if not profile.goal_amount or profile.goal_amount <= 0:
+        return "• Set a target amount to estimate your chances of reaching the goal"
     
-    return '\n'.join(actions)
+    simulation = simulate_goal_success(profile.goal_amount, profile.income, profile.expenses,
+                                       months=profile.goal_months, seed=0)
+    return summarize_goal_simulation(simulation)
 
 @app.on_event("startup")
 async def startup_event():
     """Load the Granite model on startup"""
     logger.info("Starting Financial Report Generator with IBM Granite 3.0-1B")
     load_granite_model()
+    # One precompute thread per service, not one per pre-forked worker
+    if ANALYSIS_PRECOMPUTE and worker_index in (None, 0):
+        threading.Thread(target=precompute_analyses, name="analysis-precompute", daemon=True).start()
 
 @app.post("/generate-report")
 async def generate_report(request: Request):
@@ -328,9 +371,12 @@ async def generate_report(request: Request):
     data = await request.json()
     raw_content = data.get("raw_content", "")
     report_type = data.get("report_type", "financial_summary")
+    decoding = data.get("decoding")
     
     if not raw_content:
         return {"error": "No raw content provided"}
+    if decoding and decoding not in DECODING_MODES:
+        return {"error": f"Unknown decoding mode: {decoding}. Use one of {', '.join(DECODING_MODES)}"}
     
     # System prompt for Granite model
     system_prompt = f"""You are a professional financial advisor using IBM Granite AI. 
@@ -339,67 +385,115 @@ async def generate_report(request: Request):
     Report type: {report_type}"""
     
     # Generate report using Granite model
-    report = run_granite_model(raw_content, system_prompt)
+    report = run_granite_model(raw_content, system_prompt, knowledge_context(raw_content), decoding)
     
     return {
         "report": report,
         "model": GRANITE_MODEL_ID,
         "report_type": report_type,
+        "decoding": decoding or GRANITE_DECODING,
         "status": "success"
     }
 
-@app.post("/analyze-session")
-async def analyze_session(request: Request):
+def analyze_saved_session(session_id: int, decoding: str = None, refresh: bool = False) -> dict:
     """
-    Analyze saved session data and generate comprehensive report
+    Granite analysis of a saved session, served from its stored snapshot when the session and model are unchanged
     """
-    data = await request.json()
-    session_id = data.get("session_id")
-    
-    if not session_id:
-        return {"error": "Session ID required"}
+    session = session_shards.load_session(session_id)
+    if not session:
+        return {"error": "Session not found"}
     
-    try:
-        # Retrieve session from database
-        conn = sqlite3.connect("financebot.db")
-        c = conn.cursor()
-        c.execute("SELECT * FROM sessions WHERE id = ?", (session_id,))
-        row = c.fetchone()
-        conn.close()
-        
-        if not row:
-            return {"error": "Session not found"}
-        
-        # Convert session data to raw content format
-        keys = ["id", "user_type", "chat_history", "income", "expenses", "goal", "goal_amount", "created_at"]
-        session = dict(zip(keys, row))
-        
-        raw_content = f"""
+    # Convert session data to raw content format
+    raw_content = f"""
 user_type: {session['user_type']}
 income: {session['income']}
 expenses: {session['expenses']}
 goal: {session['goal']}
 goal_amount: {session['goal_amount']}
 chat_history: {session['chat_history']}
-        """.strip()
+    """.strip()
+    context = knowledge_context(raw_content)
+    digest = analysis_snapshots.content_hash(raw_content, context)
+    
+    conn = session_shards.connect(session_shards.shard_of(session_id))
+    try:
+        snapshot = None if refresh else analysis_snapshots.get_snapshot(conn, session_id, digest, ANALYSIS_MODEL_VERSION)
+        if snapshot:
+            return {
+                "report": snapshot["report"],
+                "session_data": session,
+                "model": GRANITE_MODEL_ID,
+                "cached": True,
+                "analyzed_at": snapshot["created_at"],
+                "status": "success"
+            }
         
         # Generate report
         system_prompt = """You are a professional financial advisor using IBM Granite AI. 
         Generate a comprehensive financial analysis report based on the session data. 
         Include trends, patterns, and actionable recommendations."""
         
-        report = run_granite_model(raw_content, system_prompt)
-        
-        return {
-            "report": report,
-            "session_data": session,
-            "model": GRANITE_MODEL_ID,
-            "status": "success"
-        }
-        
+        start = time.perf_counter()
+        report = run_granite_model(raw_content, system_prompt, context, decoding)
+        # Fallback reports written after a model error are not worth keeping
+        if not report.startswith("[Granite Model Error]"):
+            analysis_snapshots.save_snapshot(conn, session_id, digest, ANALYSIS_MODEL_VERSION, report,
+                                             time.perf_counter() - start)
+    finally:
+        conn.close()
+    
+    return {
+        "report": report,
+        "session_data": session,
+        "model": GRANITE_MODEL_ID,
+        "cached": False,
+        "status": "success"
+    }
+
+@app.post("/analyze-session")
+async def analyze_session(request: Request):
+    """
+    Analyze saved session data and generate comprehensive report; {"refresh": true} ignores a stored analysis
+    """
+    data = await request.json()
+    session_id = data.get("session_id")
+    decoding = data.get("decoding")
+    
+    if not session_id:
+        return {"error": "Session ID required"}
+    if decoding and decoding not in DECODING_MODES:
+        return {"error": f"Unknown decoding mode: {decoding}. Use one of {', '.join(DECODING_MODES)}"}
+    
+    try:
+        return analyze_saved_session(session_id, decoding, bool(data.get("refresh")))
     except Exception as e:
         return {"error": str(e)}
 
+def is_idle() -> bool:
+    """No request in flight in any worker, and none for ANALYSIS_IDLE_SECONDS"""
+    with _in_flight.get_lock():
+        quiet = time.monotonic() - _last_request.value
+        # A worker killed mid-request never decrements the count; no request runs for ten minutes
+        return quiet >= ANALYSIS_IDLE_SECONDS and (_in_flight.value == 0 or quiet >= 600)
+
+def precompute_analyses():
+    """Analyze recently saved sessions one at a time, only while no requests are being served"""
+    while True:
+        time.sleep(max(1.0, ANALYSIS_IDLE_SECONDS / 2))
+        if not is_idle():
+            continue
+        try:
+            pending = session_shards.fan_out(lambda conn: analysis_snapshots.sessions_without_snapshot(
+                conn, ANALYSIS_MODEL_VERSION, ANALYSIS_PRECOMPUTE_MAX_AGE_HOURS, limit=5))
+            for session_id in sorted((i for ids in pending for i in ids), reverse=True):
+                # A request that arrives meanwhile has priority; the rest waits for the next idle period
+                if not is_idle():
+                    break
+                result = analyze_saved_session(session_id)
+                logger.info(f"Precomputed analysis of session {session_id} ({result.get('status', 'error')})")
+        except Exception as e:
+            logger.warning(f"Analysis precompute failed: {e}")
+
 @app.get("/health")
 async def health():
     return {
@@ -408,6 +502,20 @@ async def health():
         "service": "Financial Report Generator"
     }
 
+def configure_worker(index: int):
+    """Split the cores between pre-forked workers so their matmuls do not oversubscribe the CPU"""
+    global worker_index
+    worker_index = index
+    threads = max(1, (os.cpu_count() or 1) // GRANITE_WORKERS)
+    import torch
+    torch.set_num_threads(threads)
+    logger.info(f"Granite worker {index} started (pid {os.getpid()})")
+
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
+    if GRANITE_WORKERS > 1:
+        import prefork
+        prefork.run(app, GRANITE_HOST, GRANITE_PORT, GRANITE_WORKERS, preload=load_granite_model,
+                    post_fork=configure_worker)
+    else:
+        import uvicorn
+        uvicorn.run(app, host=GRANITE_HOST, port=GRANITE_PORT)
@@ -0,0 +1,259 @@
+"""
+Body encoding middleware for the FastAPI backend.
+- Responses with a compressible type and at least COMPRESS_MIN_BYTES are compressed with brotli or gzip,
+  whichever the client accepts (brotli preferred when the `brotli` package is installed).
+- Requests may be sent with Content-Encoding: gzip or br, e.g. a report request carrying a long chat history.
+- Clients that send or accept application/msgpack (needs the `msgpack` package) exchange msgpack instead of
+  JSON; endpoints keep reading and returning JSON.
+"""
+import gzip
+import json
+import os
+import zlib
+from typing import Optional
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = 6
+# Quality 5 is close to brotli's best ratio on JSON at a fraction of the CPU of quality 11
+BROTLI_QUALITY = 5
+# Compressed request bodies may expand to at most this many bytes
+MAX_REQUEST_BYTES = int(os.getenv("MAX_REQUEST_BYTES", str(20 * 1024 * 1024)))
+
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+# DOCX and other zip-based formats are already deflated, so they are sent as is
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/", "application/xml") + MSGPACK_TYPES
+
+def _header(headers: list, name: bytes) -> str:
+    for key, value in headers:
+        if key.lower() == name:
+            return value.decode("latin-1")
+    return ""
+
+def _replace_headers(headers: list, updates: dict) -> list:
+    """Copy of ASGI headers with `updates` set; a None value removes the header"""
+    kept = [(k, v) for k, v in headers if k.lower().decode("latin-1") not in updates]
+    return kept + [(k.encode("latin-1"), v.encode("latin-1")) for k, v in updates.items() if v is not None]
+
+def _merged_vary(headers: list, *names: str) -> str:
+    """Vary value listing what the response already varies on (e.g. Origin from CORS) plus `names`"""
+    values = [v.decode("latin-1") for k, v in headers if k.lower() == b"vary"]
+    tokens = [t.strip() for value in values for t in value.split(",") if t.strip()]
+    if "*" in tokens:
+        return "*"
+    seen = {t.lower() for t in tokens}
+    return ", ".join(tokens + [n for n in names if n.lower() not in seen])
+
+def _accepted_tokens(header: str) -> dict:
+    """Accept-Encoding / Accept tokens mapped to their q value"""
+    tokens = {}
+    for part in header.split(","):
+        token, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if token:
+            tokens[token.strip().lower()] = q
+    return tokens
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    tokens = _accepted_tokens(accept_encoding)
+    if brotli is not None and tokens.get("br", 0) > 0:
+        return "br"
+    if tokens.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+def wants_msgpack(accept: str) -> bool:
+    return msgpack is not None and any(_accepted_tokens(accept).get(t, 0) > 0 for t in MSGPACK_TYPES)
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+def decompress(body: bytes, encoding: str, limit: int = MAX_REQUEST_BYTES) -> bytes:
+    """Decode a request body; raises ValueError for unknown encodings, bad data or bodies over `limit`"""
+    if encoding == "gzip":
+        d = zlib.decompressobj(wbits=31)
+        try:
+            out = d.decompress(body, limit + 1)
+        except zlib.error as e:
+            raise ValueError(f"invalid gzip body: {e}")
+    elif encoding == "br" and brotli is not None:
+        # Output is produced at most limit + 1 bytes at a time, so a small body cannot expand without bound
+        d = brotli.Decompressor()
+        try:
+            out = d.process(body, output_buffer_limit=limit + 1)
+            while len(out) <= limit and not d.is_finished():
+                more = d.process(b"", output_buffer_limit=limit + 1 - len(out))
+                if not more:
+                    break
+                out += more
+        except brotli.error as e:
+            raise ValueError(f"invalid brotli body: {e}")
+        if len(out) <= limit and not d.is_finished():
+            raise ValueError("invalid brotli body: truncated")
+    else:
+        raise ValueError(f"unsupported Content-Encoding: {encoding}")
+    if len(out) > limit:
+        raise ValueError("request body too large")
+    return out
+
+class _StreamCompressor:
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            self._c = brotli.Compressor(quality=BROTLI_QUALITY)
+            self.compress, self.flush = self._c.process, self._c.finish
+        else:
+            self._c = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+            self.compress = self._c.compress
+            self.flush = self._c.flush
+
+class BodyEncodingMiddleware:
+    """ASGI middleware: request decompression and msgpack decoding, response msgpack encoding and compression"""
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = scope["headers"]
+        content_encoding = _header(headers, b"content-encoding").strip().lower()
+        content_type = _header(headers, b"content-type").split(";")[0].strip().lower()
+
+        if content_encoding not in ("", "identity") or content_type in MSGPACK_TYPES:
+            body = await self._read_body(receive)
+            if body is None:
+                await self._error(send, 413, "request body too large")
+                return
+            try:
+                if content_encoding not in ("", "identity"):
+                    body = decompress(body, content_encoding)
+                updates = {"content-encoding": None}
+                if content_type in MSGPACK_TYPES:
+                    if msgpack is None:
+                        raise ValueError("msgpack request bodies are not supported on this server")
+                    body = json.dumps(msgpack.unpackb(body, raw=False)).encode()
+                    updates["content-type"] = "application/json"
+            except Exception as e:
+                await self._error(send, 413 if "too large" in str(e) else 400, str(e))
+                return
+            updates["content-length"] = str(len(body))
+            scope = {**scope, "headers": _replace_headers(headers, updates)}
+            receive = self._replay(body, receive)
+
+        encoding = negotiate_encoding(_header(headers, b"accept-encoding"))
+        to_msgpack = wants_msgpack(_header(headers, b"accept"))
+        if encoding is None and not to_msgpack:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, _ResponseEncoder(send, encoding, to_msgpack, self.minimum_size))
+
+    @staticmethod
+    async def _read_body(receive) -> Optional[bytes]:
+        """The whole request body, or None once it exceeds MAX_REQUEST_BYTES"""
+        chunks, size = [], 0
+        while True:
+            message = await receive()
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > MAX_REQUEST_BYTES:
+                return None
+            chunks.append(chunk)
+            if not message.get("more_body"):
+                break
+        return b"".join(chunks)
+
+    @staticmethod
+    def _replay(body: bytes, receive):
+        """Receive channel that yields the decoded body once, then waits on the client as usual"""
+        sent = False
+
+        async def replay():
+            nonlocal sent
+            if sent:
+                return await receive()
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return replay
+
+    @staticmethod
+    async def _error(send, status: int, message: str):
+        body = json.dumps({"error": message, "status": "error"}).encode()
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]})
+        await send({"type": "http.response.body", "body": body})
+
+class _ResponseEncoder:
+    """Wraps `send`: whole responses are re-encoded at once, streamed ones are compressed chunk by chunk"""
+    def __init__(self, send, encoding: Optional[str], to_msgpack: bool, minimum_size: int):
+        self.send = send
+        self.encoding = encoding
+        self.to_msgpack = to_msgpack
+        self.minimum_size = minimum_size
+        self.start = None
+        self.passthrough = False
+        self.streamer = None
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            content_type = _header(message.get("headers", []), b"content-type").split(";")[0].strip().lower()
+            already_encoded = _header(message.get("headers", []), b"content-encoding")
+            self.passthrough = already_encoded or not content_type.startswith(COMPRESSIBLE_TYPES)
+            self.is_json = content_type == "application/json"
+            if self.passthrough:
+                await self.send(message)
+            else:
+                self.start = message
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.streamer is None and not more_body:
+            await self._send_whole(body)
+            return
+        # Streaming response: compress as it goes, no msgpack conversion
+        if self.streamer is None:
+            if self.encoding is None:
+                self.passthrough = True
+                await self.send(self.start)
+                await self.send(message)
+                return
+            self.streamer = _StreamCompressor(self.encoding)
+            await self.send({**self.start, "headers": _replace_headers(self.start["headers"], {
+                "content-encoding": self.encoding, "content-length": None,
+                "vary": _merged_vary(self.start["headers"], "Accept-Encoding")})})
+        chunk = self.streamer.compress(body)
+        if not more_body:
+            chunk += self.streamer.flush()
+        await self.send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+    async def _send_whole(self, body: bytes):
+        updates = {"vary": _merged_vary(self.start["headers"], "Accept", "Accept-Encoding")}
+        if self.to_msgpack and self.is_json and body:
+            body = msgpack.packb(json.loads(body), use_bin_type=True)
+            updates["content-type"] = "application/msgpack"
+        if self.encoding and len(body) >= self.minimum_size:
+            body = compress(body, self.encoding)
+            updates["content-encoding"] = self.encoding
+        updates["content-length"] = str(len(body))
+        await self.send({**self.start, "headers": _replace_headers(self.start["headers"], updates)})
+        await self.send({"type": "http.response.body", "body": body})
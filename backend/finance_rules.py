@@ -0,0 +1,41 @@
+"""
+Pure-Python budgeting rules shared by the FastAPI backend and the Streamlit frontend.
+Nothing here does I/O, so the frontend can evaluate it in-process on every rerun.
+"""
+
+HIGH_SPENDING_RATIO = 0.7
+
+def savings_metrics(income: float, expenses: float) -> dict:
+    """Monthly savings and savings rate (percent of income)"""
+    savings = income - expenses
+    savings_rate = (savings / income * 100) if income > 0 else 0
+    return {"savings": savings, "savings_rate": savings_rate}
+
+def budget_summary(income: float, expenses: float) -> str:
+    savings = income - expenses
+    if savings < 0:
+        return f"Your expenses exceed your income by ${-savings:.2f}. Consider reducing discretionary spending."
+    elif savings == 0:
+        return "You are breaking even. Try to save a small amount each month for emergencies."
+    else:
+        return f"You are saving ${savings:.2f} per month. Great job! Consider allocating some to your financial goals."
+
+def goal_calculation(goal_amount: float, income: float, expenses: float, months: int = 12) -> dict:
+    """Monthly amount needed to reach goal_amount in the given number of months"""
+    available = max(income - expenses, 0)
+    if months > 0:
+        monthly_needed = goal_amount / months
+    else:
+        monthly_needed = goal_amount
+    if available < monthly_needed:
+        msg = f"You need to save ${monthly_needed:.2f} per month, but only ${available:.2f} is available. Consider extending your timeline or reducing expenses."
+    else:
+        msg = f"You need to save ${monthly_needed:.2f} per month to reach your goal. You have enough available!"
+    return {"monthly_amount": monthly_needed, "message": msg}
+
+def spending_insights(income: float, expenses: float) -> str:
+    """Highlight spending that is high compared to income"""
+    if income > 0 and expenses / income > HIGH_SPENDING_RATIO:
+        return "Your spending is more than 70% of your income. Review subscriptions, eating out, and impulse purchases."
+    else:
+        return "Your spending is within a healthy range. Keep tracking for overlooked expenses like small subscriptions or fees."
@@ -0,0 +1,95 @@
+"""
+Memory-mapped Granite weights.
+`convert` writes the checkpoint once as float32 safetensors; `load` then builds the model without
+allocating weights and points every parameter into a copy-on-write mapping of those files. Inference
+never writes to the weights, so the mapped pages stay clean in the page cache and every worker process
+mapping the same files (or forked after loading) shares one physical copy.
+    python granite_mmap.py convert
+"""
+import argparse
+import json
+import os
+import struct
+from pathlib import Path
+from typing import Dict
+
+import torch
+
+MMAP_DIR = Path(os.getenv("GRANITE_MMAP_DIR", str(Path(__file__).resolve().parent / "models" / "granite-mmap")))
+
+SAFETENSORS_DTYPES = {
+    "F64": torch.float64, "F32": torch.float32, "F16": torch.float16, "BF16": torch.bfloat16,
+    "I64": torch.int64, "I32": torch.int32, "I16": torch.int16, "I8": torch.int8, "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+
+def is_converted(mmap_dir: Path = MMAP_DIR) -> bool:
+    return any(mmap_dir.glob("*.safetensors"))
+
+def convert(model_id: str, mmap_dir: Path = MMAP_DIR) -> Path:
+    """Save the checkpoint as float32 safetensors with its config and tokenizer"""
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+
+    model = AutoModelForCausalLM.from_pretrained(model_id, torch_dtype=torch.float32, trust_remote_code=True)
+    model.save_pretrained(mmap_dir, safe_serialization=True)
+    AutoTokenizer.from_pretrained(model_id, trust_remote_code=True).save_pretrained(mmap_dir)
+    return mmap_dir
+
+def map_safetensors(path: Path) -> Dict[str, torch.Tensor]:
+    """Tensors of a safetensors file as views into one copy-on-write mapping of the file"""
+    with open(path, "rb") as f:
+        header_size = struct.unpack("<Q", f.read(8))[0]
+        header = json.loads(f.read(header_size))
+    header.pop("__metadata__", None)
+    data_start = 8 + header_size
+    storage = torch.UntypedStorage.from_file(str(path), shared=False, nbytes=os.path.getsize(path))
+
+    tensors = {}
+    for name, info in header.items():
+        dtype = SAFETENSORS_DTYPES[info["dtype"]]
+        begin, end = info["data_offsets"]
+        itemsize = torch.empty(0, dtype=dtype).element_size()
+        offset = data_start + begin
+        if offset % itemsize:
+            # Misaligned for its dtype; copy just this tensor
+            raw = torch.empty(0, dtype=torch.uint8).set_(storage, offset, (end - begin,))
+            tensors[name] = raw.clone().view(dtype).reshape(info["shape"])
+            continue
+        tensors[name] = torch.empty(0, dtype=dtype).set_(storage, offset // itemsize, info["shape"])
+    return tensors
+
+def load(model_id: str, mmap_dir: Path = MMAP_DIR):
+    """(tokenizer, model) with weights mapped from mmap_dir; converts first if needed"""
+    from accelerate import init_empty_weights
+    from transformers import AutoConfig, AutoModelForCausalLM, AutoTokenizer
+
+    if not is_converted(mmap_dir):
+        convert(model_id, mmap_dir)
+    config = AutoConfig.from_pretrained(mmap_dir, trust_remote_code=True)
+    with init_empty_weights():
+        model = AutoModelForCausalLM.from_config(config, torch_dtype=torch.float32, trust_remote_code=True)
+
+    state = {}
+    for path in sorted(mmap_dir.glob("*.safetensors")):
+        state.update(map_safetensors(path))
+    result = model.load_state_dict(state, strict=False, assign=True)
+    model.tie_weights()
+    missing = [name for name, p in model.named_parameters() if p.is_meta]
+    if missing or result.unexpected_keys:
+        raise ValueError(f"{mmap_dir} does not match the model config (missing {missing[:3]}, "
+                         f"unexpected {result.unexpected_keys[:3]}); reconvert with `python granite_mmap.py convert`")
+    model.eval()
+    return AutoTokenizer.from_pretrained(mmap_dir, trust_remote_code=True), model
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory-mapped Granite weights")
+    sub = parser.add_subparsers(dest="command", required=True)
+    convert_parser = sub.add_parser("convert", help=f"Write float32 safetensors to {MMAP_DIR}")
+    convert_parser.add_argument("--model-id", default="ibm-granite/granite-3.0-1b-a400m-instruct")
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        print(f"Converted {args.model_id} to {convert(args.model_id)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+Request shaping for Groq chat completions.
+max_tokens and temperature come from a query-class estimate instead of one fixed budget, identical
+prompts already in flight share a single upstream call, recent answers are reused from the shared
+cache, and every request's token usage and latency is recorded in SQLite so cost can be compared per class.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Tuple
+
+import requests
+
+import rate_limit
+import shared_cache
+
+logger = logging.getLogger(__name__)
+
+API_URL = "https://api.groq.com/openai/v1/chat/completions"
+MODEL = "llama3-8b-8192"
+DB_PATH = "financebot.db"
+
+# query class -> (max_tokens, temperature)
+QUERY_CLASSES = {
+    "definition": (160, 0.5),
+    "advice": (256, 0.7),
+    "planning": (448, 0.5),
+    "report": (1000, 0.3),
+    "report_detailed": (1500, 0.3),
+}
+
+DEFINITION_PATTERN = re.compile(r"^\s*(what\s+(is|are|does)|define|meaning\s+of|explain\s+(what|the\s+term))\b", re.I)
+PLANNING_PATTERN = re.compile(
+    r"\b(plan|planning|strategy|step[- ]by[- ]step|how\s+much|how\s+long|calculate|compare|versus|vs\.?|"
+    r"allocate|portfolio|retire|retirement|breakdown)\b", re.I)
+LANGUAGE_PATTERN = re.compile(r"^Reply in (\w+):")
+
+# Answers in Indic scripts take roughly twice as many tokens as the same answer in English
+NON_ENGLISH_TOKEN_FACTOR = 2.0
+MAX_COMPLETION_TOKENS = 2048
+# Questions this long usually ask several things at once
+LONG_QUERY_WORDS = 40
+# Identical requests within this window are answered from the cache shared by all workers (0 disables)
+CACHE_TTL_SECONDS = float(os.getenv("GROQ_CACHE_TTL_SECONDS", "3600"))
+
+def classify_query(prompt: str) -> str:
+    """Cheap estimate of how long a good answer to a chat prompt needs to be"""
+    question = LANGUAGE_PATTERN.sub("", prompt, count=1).strip()
+    if PLANNING_PATTERN.search(question) or len(question.split()) > LONG_QUERY_WORDS:
+        return "planning"
+    if DEFINITION_PATTERN.search(question):
+        return "definition"
+    return "advice"
+
+def token_budget(query_class: str, prompt: str = "") -> Tuple[int, float]:
+    """(max_tokens, temperature) for a query class, scaled up for replies in other languages"""
+    max_tokens, temperature = QUERY_CLASSES[query_class]
+    if LANGUAGE_PATTERN.match(prompt):
+        max_tokens = min(int(max_tokens * NON_ENGLISH_TOKEN_FACTOR), MAX_COMPLETION_TOKENS)
+    return max_tokens, temperature
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Concurrent calls with the same key share the leader's result (or exception)"""
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn):
+        """Returns (result, shared); shared is True when another caller's request was reused"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        try:
+            call.result = fn()
+            return call.result, False
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+_flight = SingleFlight()
+
+def init_usage_schema(conn: sqlite3.Connection):
+    conn.execute('''CREATE TABLE IF NOT EXISTS llm_usage (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        query_class TEXT NOT NULL,
+        model TEXT NOT NULL,
+        max_tokens INTEGER,
+        prompt_tokens INTEGER DEFAULT 0,
+        completion_tokens INTEGER DEFAULT 0,
+        latency_ms REAL,
+        coalesced INTEGER DEFAULT 0,
+        truncated INTEGER DEFAULT 0,
+        status TEXT NOT NULL
+    )''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_usage_created_at ON llm_usage (created_at)")
+
+def record_usage(query_class: str, max_tokens: int, usage: dict, latency_ms: float, coalesced: bool,
+                 truncated: bool, status: str):
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        init_usage_schema(conn)
+        with conn:
+            conn.execute("""
+                INSERT INTO llm_usage (query_class, model, max_tokens, prompt_tokens, completion_tokens, latency_ms,
+                                       coalesced, truncated, status)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (query_class, MODEL, max_tokens, usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0),
+                  latency_ms, int(coalesced), int(truncated), status))
+        conn.close()
+    except sqlite3.Error as e:
+        # Usage accounting must never fail the user's request
+        logger.warning(f"Could not record LLM usage: {e}")
+
+def _post(payload: dict) -> dict:
+    headers = {
+        "Authorization": f"Bearer {os.getenv('GROQ_API_KEY', 'your-groq-api-key-here')}",
+        "Content-Type": "application/json"
+    }
+    with rate_limit.upstream_slot("groq"):
+        response = requests.post(API_URL, headers=headers, json=payload, timeout=30)
+    response.raise_for_status()
+    return response.json()
+
+def _post_and_cache(payload: dict, key: str) -> dict:
+    result = _post(payload)
+    shared_cache.put(f"groq:{key}", result, CACHE_TTL_SECONDS)
+    return result
+
+def chat_completion(messages: List[dict], query_class: str, max_tokens: int = None, temperature: float = None) -> dict:
+    """
+    Groq chat completion shaped by query class. Returns the raw response JSON; identical concurrent
+    requests are sent once, and identical requests within CACHE_TTL_SECONDS are served from the shared
+    cache by any worker. Raises like requests.post (and rate_limit.Overloaded when Groq is saturated).
+    """
+    default_tokens, default_temperature = QUERY_CLASSES[query_class]
+    payload = {
+        "model": MODEL,
+        "messages": messages,
+        "max_tokens": max_tokens or default_tokens,
+        "temperature": default_temperature if temperature is None else temperature,
+    }
+    key = hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+    start = time.perf_counter()
+    if CACHE_TTL_SECONDS > 0:
+        cached = shared_cache.get(f"groq:{key}")
+        if cached is not None:
+            record_usage(query_class, payload["max_tokens"], {}, (time.perf_counter() - start) * 1000, True, False, "ok")
+            return cached
+    try:
+        result, shared = _flight.do(key, lambda: _post_and_cache(payload, key))
+    except Exception:
+        record_usage(query_class, payload["max_tokens"], {}, (time.perf_counter() - start) * 1000, False, False, "error")
+        raise
+    choices = result.get("choices") or [{}]
+    truncated = choices[0].get("finish_reason") == "length"
+    # Followers did not spend any tokens of their own
+    usage = {} if shared else result.get("usage", {})
+    record_usage(query_class, payload["max_tokens"], usage, (time.perf_counter() - start) * 1000, shared, truncated, "ok")
+    return result
+
+def usage_summary(conn: sqlite3.Connection, hours: float = 24) -> List[dict]:
+    """Requests, tokens and latency per query class over the last `hours`"""
+    init_usage_schema(conn)
+    rows = conn.execute("""
+        SELECT query_class, COUNT(*), SUM(coalesced), SUM(truncated), SUM(status = 'error'),
+               SUM(prompt_tokens), SUM(completion_tokens),
+               AVG(CASE WHEN coalesced = 0 AND status = 'ok' THEN completion_tokens END), AVG(latency_ms), MAX(latency_ms)
+        FROM llm_usage
+        WHERE created_at >= datetime('now', ?)
+        GROUP BY query_class
+        ORDER BY query_class
+    """, (f"-{float(hours)} hours",)).fetchall()
+    return [
+        {
+            "query_class": r[0],
+            "requests": r[1],
+            "coalesced": r[2],
+            "truncated": r[3],
+            "errors": r[4],
+            "prompt_tokens": r[5],
+            "completion_tokens": r[6],
+            "avg_completion_tokens": round(r[7] or 0, 1),
+            "avg_latency_ms": round(r[8] or 0, 1),
+            "max_latency_ms": round(r[9] or 0, 1),
+        }
+        for r in rows
+    ]
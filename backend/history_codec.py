@@ -0,0 +1,71 @@
+"""
+Compressed storage for session chat histories.
+Compacted sessions keep chat_history NULL and the compressed text in chat_history_z, prefixed with one
+byte naming the codec. Readers go through decode() and never need to know which form a row is in.
+The search index keeps the text of compacted sessions, so a compacted row is expanded again (expand())
+before it is rewritten or deleted.
+zstd is used when the `zstandard` package is installed, zlib otherwise; both are always readable
+when their library is present.
+"""
+import sqlite3
+import zlib
+from typing import Any, Dict, List, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ZLIB = b"\x01"
+ZSTD = b"\x02"
+ZLIB_LEVEL = 9
+ZSTD_LEVEL = 10
+
+SESSION_KEYS = ["id", "user_type", "chat_history", "income", "expenses", "goal", "goal_amount", "created_at"]
+
+def init_column(conn: sqlite3.Connection):
+    """Add sessions.chat_history_z to databases created before compaction existed"""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(sessions)")}
+    if columns and "chat_history_z" not in columns:
+        with conn:
+            conn.execute("ALTER TABLE sessions ADD COLUMN chat_history_z BLOB")
+
+def encode(text: str) -> bytes:
+    data = text.encode("utf-8")
+    if zstandard is not None:
+        return ZSTD + zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return ZLIB + zlib.compress(data, ZLIB_LEVEL)
+
+def decode(text: Optional[str], blob: Optional[bytes]) -> Optional[str]:
+    """The chat history of a row, whichever column holds it"""
+    if not blob:
+        return text
+    codec, payload = blob[:1], blob[1:]
+    if codec == ZLIB:
+        return zlib.decompress(payload).decode("utf-8")
+    if codec == ZSTD:
+        if zstandard is None:
+            raise RuntimeError("This chat history is zstd-compressed; install the zstandard package to read it")
+        return zstandard.ZstdDecompressor().decompress(payload).decode("utf-8")
+    raise ValueError(f"Unknown chat history codec {codec!r}")
+
+def expand(conn: sqlite3.Connection, session_ids: List[int]):
+    """Move compacted chat histories back into chat_history, within the caller's transaction"""
+    for start in range(0, len(session_ids), 500):
+        batch = session_ids[start:start + 500]
+        rows = conn.execute(f"""
+            SELECT id, chat_history_z FROM sessions WHERE id IN ({', '.join('?' * len(batch))}) AND chat_history_z IS NOT NULL
+        """, batch).fetchall()
+        conn.executemany("UPDATE sessions SET chat_history = ?, chat_history_z = NULL WHERE id = ?",
+                         [(decode(None, blob), session_id) for session_id, blob in rows])
+
+def load_session(conn: sqlite3.Connection, session_id: int) -> Optional[Dict[str, Any]]:
+    """A saved session with its chat history decompressed, or None"""
+    init_column(conn)
+    row = conn.execute(f"SELECT {', '.join(SESSION_KEYS)}, chat_history_z FROM sessions WHERE id = ?",
+                       (session_id,)).fetchone()
+    if row is None:
+        return None
+    session = dict(zip(SESSION_KEYS, row))
+    session["chat_history"] = decode(session["chat_history"], row[-1])
+    return session
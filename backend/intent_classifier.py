@@ -0,0 +1,173 @@
+"""
+Local finance intent classifier used to gate /chat before any upstream call.
+A logistic regression over hashed word, word-bigram and character n-gram features, trained from the
+labeled examples in data/finance_intents.tsv. Trained weights are bundled in data/finance_intent_model.npz
+and load in a few milliseconds; scoring one query takes tens of microseconds on CPU.
+
+Retrain after editing the labeled set:
+    python intent_classifier.py train
+"""
+import argparse
+import hashlib
+import logging
+import os
+import re
+import threading
+import unicodedata
+import zlib
+from pathlib import Path
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(__file__).resolve().parent / "data"
+EXAMPLES_PATH = DATA_DIR / "finance_intents.tsv"
+MODEL_PATH = DATA_DIR / "finance_intent_model.npz"
+
+N_FEATURES = 2 ** 18
+CHAR_NGRAMS = (3, 4)
+FINANCE_LABEL = "finance"
+# Probability above which a query counts as finance-related
+THRESHOLD = float(os.getenv("INTENT_THRESHOLD", "0.5"))
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+def _hash(feature: str) -> int:
+    return zlib.crc32(feature.encode("utf-8")) & (N_FEATURES - 1)
+
+def extract_features(text: str) -> np.ndarray:
+    """Unique hashed feature indices of a query; each feature has value 1/sqrt(count) so vectors have unit length"""
+    words = TOKEN_PATTERN.findall(unicodedata.normalize("NFKC", text).lower())
+    features = set()
+    for i, word in enumerate(words):
+        features.add(_hash("w:" + word))
+        if i:
+            features.add(_hash(f"b:{words[i - 1]} {word}"))
+        padded = f"<{word}>"
+        for n in CHAR_NGRAMS:
+            for j in range(len(padded) - n + 1):
+                features.add(_hash("c:" + padded[j:j + n]))
+    return np.fromiter(features, dtype=np.int64, count=len(features))
+
+def load_examples(path: Path = EXAMPLES_PATH) -> List[Tuple[int, str]]:
+    """(1 for finance / 0 for anything else, text) pairs from a label<TAB>text file"""
+    examples = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip() or line.startswith("#"):
+                continue
+            label, text = line.rstrip("\n").split("\t", 1)
+            examples.append((int(label == FINANCE_LABEL), text))
+    return examples
+
+def examples_digest(path: Path = EXAMPLES_PATH) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+class FinanceIntentClassifier:
+    def __init__(self, weights: np.ndarray, bias: float, threshold: float = THRESHOLD):
+        self.weights = weights
+        self.bias = bias
+        self.threshold = threshold
+
+    def score(self, text: str) -> float:
+        """Probability that the query is about finance"""
+        idx = extract_features(text)
+        z = self.bias + (self.weights[idx].sum() / np.sqrt(len(idx)) if len(idx) else 0.0)
+        return float(1.0 / (1.0 + np.exp(-z)))
+
+    def score_batch(self, texts: Iterable[str]) -> np.ndarray:
+        """Probabilities for many queries, computed with one gather over all their features"""
+        feature_sets = [extract_features(t) for t in texts]
+        if not feature_sets:
+            return np.zeros(0)
+        lengths = np.fromiter((len(f) for f in feature_sets), dtype=np.int64, count=len(feature_sets))
+        gathered = self.weights[np.concatenate(feature_sets)]
+        # Per-query sums via a cumulative sum over the concatenated weights
+        ends = np.cumsum(lengths)
+        totals = np.concatenate(([0.0], np.cumsum(gathered)))
+        z = self.bias + (totals[ends] - totals[ends - lengths]) / np.sqrt(np.maximum(lengths, 1))
+        return 1.0 / (1.0 + np.exp(-z))
+
+    def is_finance(self, text: str, threshold: float = None) -> bool:
+        return self.score(text) >= (self.threshold if threshold is None else threshold)
+
+    def predict_batch(self, texts: Iterable[str], threshold: float = None) -> List[bool]:
+        cutoff = self.threshold if threshold is None else threshold
+        return (self.score_batch(texts) >= cutoff).tolist()
+
+    def save(self, path: Path = MODEL_PATH, digest: str = ""):
+        # Only the non-zero weights are stored; most hashed buckets are never touched
+        nonzero = np.flatnonzero(self.weights)
+        np.savez_compressed(path, indices=nonzero.astype(np.int32), values=self.weights[nonzero].astype(np.float32),
+                            bias=np.float32(self.bias), n_features=N_FEATURES, digest=digest)
+
+    @classmethod
+    def load(cls, path: Path = MODEL_PATH, digest: str = None) -> "FinanceIntentClassifier":
+        """Bundled weights; raises ValueError if they were trained on a different labeled set or feature size"""
+        with np.load(path) as data:
+            if int(data["n_features"]) != N_FEATURES or (digest is not None and str(data["digest"]) != digest):
+                raise ValueError(f"{path} is out of date; run `python intent_classifier.py train`")
+            weights = np.zeros(N_FEATURES, dtype=np.float32)
+            weights[data["indices"]] = data["values"]
+            return cls(weights, float(data["bias"]))
+
+def train(examples: List[Tuple[int, str]], epochs: int = 20, learning_rate: float = 1.0, l2: float = 1e-3,
+          seed: int = 0) -> FinanceIntentClassifier:
+    """Logistic regression by SGD with a decaying step size over sparse, unit-length binary features"""
+    rng = np.random.default_rng(seed)
+    features = [extract_features(text) for _, text in examples]
+    labels = np.array([label for label, _ in examples], dtype=np.float64)
+    weights = np.zeros(N_FEATURES, dtype=np.float64)
+    bias = 0.0
+    step = 0
+    for _ in range(epochs):
+        for i in rng.permutation(len(examples)):
+            step += 1
+            rate = learning_rate / (1 + step * 1e-4)
+            idx = features[i]
+            x = 1.0 / np.sqrt(max(len(idx), 1))
+            p = 1.0 / (1.0 + np.exp(-(bias + weights[idx].sum() * x)))
+            grad = p - labels[i]
+            weights[idx] -= rate * (grad * x + l2 * weights[idx])
+            bias -= rate * grad
+    return FinanceIntentClassifier(weights.astype(np.float32), bias)
+
+_classifier = None
+_classifier_lock = threading.Lock()
+
+def get_classifier() -> FinanceIntentClassifier:
+    """The bundled classifier, retrained in-process if the labeled set changed since the weights were saved"""
+    global _classifier
+    with _classifier_lock:
+        if _classifier is None:
+            digest = examples_digest()
+            try:
+                _classifier = FinanceIntentClassifier.load(digest=digest)
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Training finance intent classifier ({e})")
+                _classifier = train(load_examples())
+    return _classifier
+
+def main():
+    parser = argparse.ArgumentParser(description="Finance intent classifier")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("train", help=f"Train on {EXAMPLES_PATH.name} and write {MODEL_PATH.name}")
+    score = sub.add_parser("score", help="Score queries")
+    score.add_argument("queries", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "train":
+        examples = load_examples()
+        classifier = train(examples)
+        classifier.save(digest=examples_digest())
+        accuracy = np.mean(np.array(classifier.predict_batch([t for _, t in examples])) == np.array([l for l, _ in examples], dtype=bool))
+        print(f"Trained on {len(examples)} examples (training accuracy {accuracy:.1%}); saved {MODEL_PATH}")
+    else:
+        classifier = get_classifier()
+        for query, p in zip(args.queries, classifier.score_batch(args.queries)):
+            print(f"{p:.3f}  {query}")
+
+if __name__ == "__main__":
+    main()
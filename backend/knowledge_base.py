@@ -0,0 +1,314 @@
+"""
+Local retrieval over the bundled financial knowledge base in knowledge/*.md.
+Documents are split into heading-sized chunks (FAQ entries are kept whole) and embedded once with
+signed feature hashing and TF-IDF weights into a unit-length float32 matrix. The matrix is saved
+under knowledge/index/ and memory-mapped at load. Search is one matrix-vector product, optionally
+restricted to the nearest IVF partitions for large corpora.
+
+Rebuild after editing the corpus (done automatically when the index is stale):
+    python knowledge_base.py build [--ivf-lists N]
+    python knowledge_base.py search "how much emergency fund"
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import re
+import tempfile
+import threading
+import unicodedata
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+KNOWLEDGE_DIR = Path(__file__).resolve().parent / "knowledge"
+INDEX_DIR = Path(os.getenv("KNOWLEDGE_INDEX_DIR", str(KNOWLEDGE_DIR / "index")))
+
+DIM = 4096
+CHAR_NGRAM = 4
+CHUNK_WORDS = 160
+CHUNK_OVERLAP = 30
+# Corpora smaller than this are searched exhaustively; IVF only pays off on larger ones
+IVF_MIN_CHUNKS = 5000
+DEFAULT_NPROBE = 4
+
+# Chunks scoring below this are not worth putting in a prompt
+MIN_CONTEXT_SCORE = float(os.getenv("KNOWLEDGE_MIN_SCORE", "0.15"))
+# An FAQ entry is returned verbatim only when it matches this well and clearly beats the runner-up
+FAQ_ANSWER_SCORE = float(os.getenv("KNOWLEDGE_FAQ_SCORE", "0.6"))
+FAQ_MARGIN = 0.05
+# ...and when the FAQ question covers this share of the query's terms, so a question with personal
+# details ("... for my family of 5 with a mortgage") goes to the LLM instead of getting the generic answer
+FAQ_MIN_COVERAGE = 0.6
+
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "to", "in", "on", "for", "is", "are", "be", "it", "my", "i", "me", "you",
+    "your", "what", "how", "do", "does", "should", "can", "which", "with", "as", "at", "by", "if", "this", "that",
+    "much", "many", "from", "about", "into", "than", "so", "but", "not", "we", "our", "they", "their", "there",
+}
+TOKEN_PATTERN = re.compile(r"\w+")
+HEADING_PATTERN = re.compile(r"^(#{1,3})\s+(.*)$")
+
+def tokenize(text: str) -> List[str]:
+    words = TOKEN_PATTERN.findall(unicodedata.normalize("NFKC", text).lower())
+    return [w for w in words if w not in STOPWORDS]
+
+def _features(text: str) -> Dict[Tuple[int, int], float]:
+    """Hashed term counts keyed by (bucket, sign): words, adjacent word pairs and character n-grams (for word variants)"""
+    counts: Dict[Tuple[int, int], float] = {}
+    words = tokenize(text)
+    terms = ["w:" + w for w in words] + [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+    for w in words:
+        padded = f"<{w}>"
+        terms.extend("c:" + padded[i:i + CHAR_NGRAM] for i in range(len(padded) - CHAR_NGRAM + 1))
+    for term in terms:
+        h = zlib.crc32(term.encode("utf-8"))
+        # The top bit picks the sign so colliding terms tend to cancel instead of adding up
+        key = (h % DIM, 1 if h & 0x80000000 else -1)
+        counts[key] = counts.get(key, 0.0) + 1.0
+    return counts
+
+def _vectorize(features: Dict[Tuple[int, int], float], idf: np.ndarray) -> np.ndarray:
+    vec = np.zeros(DIM, dtype=np.float32)
+    for (idx, sign), count in features.items():
+        vec[idx] += sign * (1.0 + math.log(count)) * idf[idx]
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+def load_corpus(knowledge_dir: Path = KNOWLEDGE_DIR) -> List[dict]:
+    """Chunks of every markdown document: FAQ entries whole, other sections split into overlapping windows"""
+    chunks = []
+    for path in sorted(knowledge_dir.glob("*.md")):
+        title, section, lines = path.stem, None, []
+
+        def flush():
+            text = " ".join(" ".join(lines).split())
+            if not text:
+                return
+            if section and section.startswith("Q:"):
+                question = section[2:].strip()
+                answer = text[2:].strip() if text.startswith("A:") else text
+                chunks.append({"source": path.name, "title": question, "kind": "faq", "text": answer, "question": question})
+                return
+            words = text.split()
+            step = CHUNK_WORDS - CHUNK_OVERLAP
+            for start in range(0, max(len(words) - CHUNK_OVERLAP, 1), step):
+                chunks.append({"source": path.name, "title": f"{title}: {section}" if section else title,
+                               "kind": "doc", "text": " ".join(words[start:start + CHUNK_WORDS])})
+
+        for line in path.read_text(encoding="utf-8").splitlines():
+            heading = HEADING_PATTERN.match(line)
+            if heading:
+                flush()
+                lines = []
+                if len(heading.group(1)) == 1:
+                    title = heading.group(2).strip()
+                    section = None
+                else:
+                    section = heading.group(2).strip()
+            else:
+                lines.append(line)
+        flush()
+    return chunks
+
+def corpus_digest(knowledge_dir: Path = KNOWLEDGE_DIR) -> str:
+    digest = hashlib.sha256(f"{DIM}:{CHAR_NGRAM}:{CHUNK_WORDS}".encode())
+    for path in sorted(knowledge_dir.glob("*.md")):
+        digest.update(path.name.encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+def _kmeans(matrix: np.ndarray, n_lists: int, iterations: int = 20, seed: int = 0) -> np.ndarray:
+    """Spherical k-means centroids for the IVF partition"""
+    rng = np.random.default_rng(seed)
+    centroids = matrix[rng.choice(len(matrix), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(matrix @ centroids.T, axis=1)
+        for j in range(n_lists):
+            members = matrix[assignment == j]
+            if len(members):
+                c = members.sum(axis=0)
+                centroids[j] = c / (np.linalg.norm(c) or 1.0)
+    return centroids
+
+def _write_atomic(path: Path, write):
+    """Write through a uniquely named temporary file so workers loading the index never see a partial file"""
+    with tempfile.NamedTemporaryFile(dir=path.parent, prefix=path.name + ".", suffix=".tmp", delete=False) as f:
+        try:
+            write(f)
+        except BaseException:
+            f.close()
+            os.unlink(f.name)
+            raise
+    os.replace(f.name, path)
+
+@contextmanager
+def _build_lock(index_dir: Path = INDEX_DIR):
+    """Held while checking and rebuilding the index, so pre-forked workers build it once instead of all at once"""
+    index_dir.mkdir(parents=True, exist_ok=True)
+    with open(index_dir / ".build.lock", "wb") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+def _is_stale(index_dir: Path = INDEX_DIR) -> bool:
+    try:
+        with open(index_dir / "meta.json") as f:
+            return json.load(f).get("digest") != corpus_digest()
+    except (OSError, ValueError):
+        return True
+
+def build_index(knowledge_dir: Path = KNOWLEDGE_DIR, index_dir: Path = INDEX_DIR, ivf_lists: int = None) -> dict:
+    """Embed every chunk and write embeddings.npy, idf.npy, chunks.json and meta.json (plus the IVF files)"""
+    chunks = load_corpus(knowledge_dir)
+    # FAQ entries are matched on their question, documents on their heading and body
+    features = [_features(c["question"] if c["kind"] == "faq" else f'{c["title"]} {c["text"]}') for c in chunks]
+
+    df = np.zeros(DIM, dtype=np.float64)
+    for f in features:
+        df[list({idx for idx, _ in f})] += 1
+    idf = (np.log((1 + len(chunks)) / (1 + df)) + 1).astype(np.float32)
+    matrix = np.stack([_vectorize(f, idf) for f in features]) if chunks else np.zeros((0, DIM), dtype=np.float32)
+
+    index_dir.mkdir(parents=True, exist_ok=True)
+    _write_atomic(index_dir / "embeddings.npy", lambda f: np.save(f, matrix))
+    _write_atomic(index_dir / "idf.npy", lambda f: np.save(f, idf))
+    _write_atomic(index_dir / "chunks.json", lambda f: f.write(json.dumps(chunks, ensure_ascii=False).encode("utf-8")))
+
+    if ivf_lists is None and len(chunks) >= IVF_MIN_CHUNKS:
+        ivf_lists = int(math.sqrt(len(chunks)))
+    meta = {"digest": corpus_digest(knowledge_dir), "chunks": len(chunks), "ivf_lists": 0}
+    if ivf_lists and len(chunks) >= ivf_lists:
+        centroids = _kmeans(matrix, ivf_lists)
+        assignment = np.argmax(matrix @ centroids.T, axis=1)
+        # Chunk ids grouped by list, with offsets[j]:offsets[j + 1] selecting list j
+        order = np.argsort(assignment, kind="stable").astype(np.int32)
+        offsets = np.searchsorted(assignment[order], np.arange(ivf_lists + 1)).astype(np.int64)
+        _write_atomic(index_dir / "ivf_centroids.npy", lambda f: np.save(f, centroids))
+        _write_atomic(index_dir / "ivf_order.npy", lambda f: np.save(f, order))
+        _write_atomic(index_dir / "ivf_offsets.npy", lambda f: np.save(f, offsets))
+        meta["ivf_lists"] = ivf_lists
+    else:
+        for name in ("ivf_centroids.npy", "ivf_order.npy", "ivf_offsets.npy"):
+            (index_dir / name).unlink(missing_ok=True)
+    # Written last: a matching digest means the rest of the index is complete
+    _write_atomic(index_dir / "meta.json", lambda f: f.write(json.dumps(meta).encode()))
+    return meta
+
+class KnowledgeIndex:
+    def __init__(self, index_dir: Path = INDEX_DIR):
+        with open(index_dir / "meta.json") as f:
+            self.meta = json.load(f)
+        with open(index_dir / "chunks.json", encoding="utf-8") as f:
+            self.chunks = json.load(f)
+        # Memory-mapped so worker processes share the page cache instead of each holding a copy
+        self.embeddings = np.load(index_dir / "embeddings.npy", mmap_mode="r")
+        self.idf = np.load(index_dir / "idf.npy")
+        self.centroids = self.order = self.offsets = None
+        if self.meta.get("ivf_lists"):
+            self.centroids = np.load(index_dir / "ivf_centroids.npy")
+            self.order = np.load(index_dir / "ivf_order.npy", mmap_mode="r")
+            self.offsets = np.load(index_dir / "ivf_offsets.npy")
+
+    def embed(self, text: str) -> np.ndarray:
+        return _vectorize(_features(text), self.idf)
+
+    def _candidates(self, query_vec: np.ndarray, nprobe: int) -> Optional[np.ndarray]:
+        if self.centroids is None:
+            return None
+        lists = np.argsort(self.centroids @ query_vec)[::-1][:nprobe]
+        return np.concatenate([self.order[self.offsets[j]:self.offsets[j + 1]] for j in lists])
+
+    def search(self, query: str, k: int = 3, nprobe: int = DEFAULT_NPROBE, kind: str = None) -> List[dict]:
+        """Top-k chunks by cosine similarity, each with its score"""
+        if not len(self.chunks):
+            return []
+        query_vec = self.embed(query)
+        candidates = self._candidates(query_vec, nprobe)
+        if candidates is None:
+            scores = self.embeddings @ query_vec
+            ids = np.arange(len(scores))
+        else:
+            scores = self.embeddings[np.sort(candidates)] @ query_vec
+            ids = np.sort(candidates)
+        if kind is not None:
+            mask = np.array([self.chunks[i]["kind"] == kind for i in ids], dtype=bool)
+            scores, ids = scores[mask], ids[mask]
+        top = np.argsort(scores)[::-1][:k] if len(scores) <= 4 * k else np.argpartition(scores, -k)[-k:]
+        top = top[np.argsort(scores[top])[::-1]]
+        return [{**self.chunks[ids[i]], "score": float(scores[i])} for i in top]
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_index() -> KnowledgeIndex:
+    """The knowledge index, rebuilt first if the corpus changed since it was written"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            if _is_stale():
+                with _build_lock():
+                    # Another worker may have finished the build while this one waited
+                    if _is_stale():
+                        build_index()
+            _index = KnowledgeIndex()
+    return _index
+
+def retrieve(query: str, k: int = 3, min_score: float = MIN_CONTEXT_SCORE) -> List[dict]:
+    return [hit for hit in get_index().search(query, k) if hit["score"] >= min_score]
+
+def context_for(query: str, k: int = 3, max_chars: int = 1200) -> str:
+    """Retrieved reference notes formatted for a prompt, or "" when nothing relevant is indexed"""
+    notes, used = [], 0
+    for hit in retrieve(query, k):
+        note = f"- {hit['title']}: {hit['text']}"
+        if used + len(note) > max_chars:
+            note = note[:max(max_chars - used, 0)]
+        if note:
+            notes.append(note)
+            used += len(note)
+        if used >= max_chars:
+            break
+    return "\n".join(notes)
+
+def faq_answer(query: str) -> Optional[dict]:
+    """The FAQ entry for a query when the match is confident enough to answer without an LLM"""
+    hits = get_index().search(query, k=2, kind="faq")
+    if not hits or hits[0]["score"] < FAQ_ANSWER_SCORE:
+        return None
+    if len(hits) > 1 and hits[0]["score"] - hits[1]["score"] < FAQ_MARGIN:
+        return None
+    terms = set(tokenize(query))
+    if len(terms & set(tokenize(hits[0]["question"]))) < FAQ_MIN_COVERAGE * len(terms):
+        return None
+    return hits[0]
+
+def main():
+    parser = argparse.ArgumentParser(description="Financial knowledge base index")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Chunk and embed knowledge/*.md")
+    build.add_argument("--ivf-lists", type=int, default=None, help="Partition the index into this many IVF lists")
+    search = sub.add_parser("search", help="Show the best matching chunks for a query")
+    search.add_argument("query")
+    search.add_argument("-k", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        with _build_lock():
+            meta = build_index(ivf_lists=args.ivf_lists)
+        print(f"Indexed {meta['chunks']} chunks into {INDEX_DIR} (IVF lists: {meta['ivf_lists'] or 'none'})")
+    else:
+        for hit in get_index().search(args.query, args.k):
+            print(f"{hit['score']:.3f}  [{hit['kind']}] {hit['title']}\n       {hit['text'][:160]}")
+
+if __name__ == "__main__":
+    main()
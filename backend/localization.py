@@ -0,0 +1,161 @@
+"""
+Localized fixed responses and a per-language answer cache for /chat.
+The catalog in locales/responses.json is loaded once at import. Answers from Groq are cached per
+(language, user type, English intent): each language's intent_terms glossary maps question words and
+finance terms to English, so a common question asked again in Hindi or Tamil, in other words or in
+another word order, is served without another upstream call.
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional
+
+CATALOG_PATH = Path(__file__).resolve().parent / "locales" / "responses.json"
+DEFAULT_LANGUAGE = "english"
+DB_PATH = "financebot.db"
+
+ANSWER_CACHE_TTL_HOURS = float(os.getenv("ANSWER_CACHE_TTL_HOURS", "72"))
+ANSWER_CACHE_MEMORY_SIZE = 1024
+# Longer questions, or ones quoting amounts, are usually about the asker's own situation
+MAX_CACHEABLE_WORDS = 20
+
+FILLER_WORDS = {"please", "kindly", "hi", "hello", "hey", "can", "could", "would", "you", "tell", "me", "plz", "pls"}
+
+def load_catalog(path: Path = CATALOG_PATH) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def _words(text: str) -> List[str]:
+    """Lowercased words; Indic vowel signs and viramas are combining marks, so they stay inside their word"""
+    chars = []
+    for c in unicodedata.normalize("NFKC", text).lower():
+        category = unicodedata.category(c)
+        # Zero-width (non-)joiners only change how a word is rendered
+        if category != "Cf":
+            chars.append(c if c.isalnum() or c == "_" or category.startswith("M") else " ")
+    return "".join(chars).split()
+
+CATALOG = load_catalog()
+SUPPORTED_LANGUAGES = set(CATALOG)
+# Per language: word -> English words it stands for ("" for filler)
+INTENT_TERMS = {
+    language: {" ".join(_words(word)): english for word, english in messages.get("intent_terms", {}).items()}
+    for language, messages in CATALOG.items()
+}
+
+def normalize_language(language: str) -> str:
+    language = (language or DEFAULT_LANGUAGE).lower()
+    return language if language in SUPPORTED_LANGUAGES else DEFAULT_LANGUAGE
+
+def language_name(language: str) -> str:
+    return CATALOG[normalize_language(language)]["name"]
+
+def get_message(key: str, language: str, **kwargs) -> str:
+    """Fixed response `key` in `language`, falling back to English"""
+    messages = CATALOG[normalize_language(language)]
+    template = messages.get(key) or CATALOG[DEFAULT_LANGUAGE][key]
+    return template.format(**kwargs) if kwargs else template
+
+def report_redirect(report_type: str, language: str) -> str:
+    names = CATALOG[normalize_language(language)].get("report_types", {})
+    return get_message("report_redirect", language, report_type=names.get(report_type, report_type))
+
+def intent_key(question: str, language: str = DEFAULT_LANGUAGE) -> str:
+    """
+    English intent of a question: known words are translated through the language's intent_terms and the
+    rest kept as written, and case, punctuation, filler words, repeats and word order (the Indian languages
+    put the verb last) do not change the key
+    """
+    terms = INTENT_TERMS[normalize_language(language)]
+    words = []
+    for word in _words(question):
+        words.extend(terms.get(word, word).split())
+    return " ".join(sorted({w for w in words if w not in FILLER_WORDS}))
+
+def is_cacheable(question: str, language: str = DEFAULT_LANGUAGE) -> bool:
+    return (len(question.split()) <= MAX_CACHEABLE_WORDS and not re.search(r"\d", question)
+            and bool(intent_key(question, language)))
+
+class AnswerCache:
+    """Small in-process LRU in front of an SQLite table shared by every worker"""
+    def __init__(self, db_path: str = DB_PATH, ttl_hours: float = ANSWER_CACHE_TTL_HOURS,
+                 memory_size: int = ANSWER_CACHE_MEMORY_SIZE):
+        self.db_path = db_path
+        self.ttl = ttl_hours * 3600
+        self.memory_size = memory_size
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._schema_ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path)
+        if not self._schema_ready:
+            conn.execute('''CREATE TABLE IF NOT EXISTS answer_cache (
+                language TEXT NOT NULL,
+                user_type TEXT NOT NULL,
+                intent_key TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (language, user_type, intent_key)
+            ) WITHOUT ROWID''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_answer_cache_created_at ON answer_cache (created_at)")
+            self._schema_ready = True
+        return conn
+
+    def _remember(self, key: tuple, value: tuple):
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    def get(self, language: str, user_type: str, question: str) -> Optional[str]:
+        if not is_cacheable(question, language):
+            return None
+        key = (normalize_language(language), user_type, intent_key(question, language))
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry:
+                self._memory.move_to_end(key)
+        if entry and now - entry[1] < self.ttl:
+            return entry[0]
+
+        conn = self._connect()
+        try:
+            row = conn.execute("""
+                SELECT response, created_at FROM answer_cache
+                WHERE language = ? AND user_type = ? AND intent_key = ? AND created_at >= ?
+            """, key + (now - self.ttl,)).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        self._remember(key, row)
+        return row[0]
+
+    def put(self, language: str, user_type: str, question: str, response: str):
+        if not is_cacheable(question, language):
+            return
+        key = (normalize_language(language), user_type, intent_key(question, language))
+        now = time.time()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("""
+                    INSERT INTO answer_cache (language, user_type, intent_key, response, created_at) VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(language, user_type, intent_key) DO UPDATE SET response = excluded.response,
+                        created_at = excluded.created_at
+                """, key + (response, now))
+                conn.execute("DELETE FROM answer_cache WHERE created_at < ?", (now - self.ttl,))
+        finally:
+            conn.close()
+        self._remember(key, (response, now))
+
+answer_cache = AnswerCache()
@@ -1,20 +1,56 @@
-from fastapi import FastAPI, Request
+from fastapi import APIRouter, FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-from docx import Document
-from docx.shared import Inches
-from docx.enum.text import WD_ALIGN_PARAGRAPH
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+import logging
 import sqlite3
 import requests
 import os
 import datetime
+import tempfile
 from pathlib import Path
+from typing import Tuple
 from dotenv import load_dotenv
 
-# Load environment variables
+# Load environment variables before the modules below read their configuration
 load_dotenv()
 
+from monte_carlo import simulate_goal_success, summarize_goal_simulation
+import monte_carlo
+import finance_rules
+import report_rules
+import transactions
+import subscriptions
+import session_search
+import report_jobs
+import rate_limit
+import groq_client
+import localization
+import intent_classifier
+import knowledge_base
+import compression
+import session_export
+import history_codec
+import session_maintenance
+import session_shards
+import shared_cache
+
+logger = logging.getLogger(__name__)
+
+# "full" serves every endpoint; "chat" leaves out report generation, simulations and uploads so a chat
+# replica starts fast and never loads python-docx or the simulation pool
+SERVICE_PROFILE = os.getenv("FINANCEBOT_PROFILE", "full")
+# `python main.py` serves the app from FINANCEBOT_WORKERS pre-forked processes; "auto" uses one per available core
+FINANCEBOT_HOST = os.getenv("FINANCEBOT_HOST", "0.0.0.0")
+FINANCEBOT_PORT = int(os.getenv("FINANCEBOT_PORT", "8000"))
+FINANCEBOT_WORKERS = os.getenv("FINANCEBOT_WORKERS", "auto")
+# Granite reports for identical inputs are shared between workers for this long (0 disables)
+REPORT_CACHE_TTL_SECONDS = float(os.getenv("REPORT_CACHE_TTL_SECONDS", "900"))
+GRANITE_REPORT_URL = "http://localhost:8002/generate-report"
+
 app = FastAPI()
+# Heavy endpoints, registered on the app at the end of this module for the full profile only
+reports = APIRouter()
 
 # CORS setup for frontend-backend communication
 app.add_middleware(
@@ -24,6 +60,26 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Negotiated gzip/brotli responses, compressed request bodies and optional msgpack
+app.add_middleware(compression.BodyEncodingMiddleware)
+
+@app.middleware("http")
+async def rate_limit_middleware(request: Request, call_next):
+    """Per-tenant token buckets; LLM endpoints have a much smaller budget than cheap ones"""
+    client_ip = request.client.host if request.client else None
+    allowed, headers = await rate_limit.check_request_async(request.url.path, request.headers.get("x-api-key"),
+                                                            client_ip, request.headers.get("x-client-id"))
+    if not allowed:
+        return JSONResponse({"error": "Rate limit exceeded, please slow down.", "status": "error"},
+                            status_code=429, headers=headers)
+    response = await call_next(request)
+    response.headers.update(headers)
+    return response
+
+@app.exception_handler(rate_limit.Overloaded)
+async def overloaded_handler(request: Request, exc: rate_limit.Overloaded):
+    return JSONResponse({"error": str(exc), "status": "error"}, status_code=503,
+                        headers={"Retry-After": str(exc.retry_after)})
 
 
 
@@ -32,39 +88,9 @@ app.add_middleware(
 
 def is_finance_related(query: str) -> bool:
     """Check if query is related to finance, tax, savings, loans, or financial laws"""
-    finance_keywords = [
-        # Core financial terms
-        'finance', 'financial', 'money', 'budget', 'budgeting', 'income', 'expense', 'expenses',
-        'savings', 'save', 'saving', 'investment', 'invest', 'investing', 'portfolio',
-        'loan', 'loans', 'credit', 'debt', 'mortgage', 'interest', 'rate', 'rates',
-        
-        # Tax related
-        'tax', 'taxes', 'taxation', 'deduction', 'deductions', 'refund', 'irs',
-        'filing', 'return', 'exemption', 'taxable', 'income tax', 'gst', 'vat',
-        
-        # Banking and accounts
-        'bank', 'banking', 'account', 'checking', 'deposit', 'withdrawal',
-        'atm', 'card', 'payment', 'transaction', 'balance', 'statement',
-        
-        # Insurance and financial products
-        'insurance', 'policy', 'premium', 'claim', 'retirement', 'pension',
-        '401k', 'ira', 'mutual fund', 'etf', 'stock', 'stocks', 'bond', 'bonds',
-        
-        # Financial planning
-        'goal', 'goals', 'planning', 'wealth', 'asset', 'assets', 'liability',
-        'net worth', 'cash flow', 'emergency fund', 'financial plan',
-        
-        # Business finance
-        'business', 'startup', 'revenue', 'profit', 'loss', 'accounting',
-        'bookkeeping', 'invoice', 'payroll', 'entrepreneur',
-        
-        # Economic terms
-        'economy', 'economic', 'inflation', 'recession', 'market', 'currency',
-        'exchange', 'forex', 'commodity', 'real estate', 'property'
-    ]
-    
-    query_lower = query.lower()
-    return any(keyword in query_lower for keyword in finance_keywords)
+    # Score the question itself, not the reply-language instruction added for Indian languages
+    question = groq_client.LANGUAGE_PATTERN.sub("", query, count=1)
+    return intent_classifier.get_classifier().is_finance(question)
 
 def detect_report_request(query: str) -> str:
     """Detect if user is asking for a report and return report type"""
@@ -81,12 +107,22 @@ def detect_report_request(query: str) -> str:
             return report_type
     return None
 
-def generate_groq_financial_report(user_type: str, income: float, expenses: float, goal: str, goal_amount: float, chat_history: str) -> str:
+def generate_groq_financial_report(user_type: str, income: float, expenses: float, goal: str, goal_amount: float, chat_history: str, goal_simulation: dict = None, spending_breakdown: str = "", recurring_charges: str = "") -> str:
     """Generate comprehensive financial report using Groq API as fallback"""
     
     # Calculate key metrics
     savings = income - expenses
     savings_rate = (savings / income * 100) if income > 0 else 0
+    if goal_simulation is None and goal_amount > 0:
+        try:
+            goal_simulation = simulate_goal_success(goal_amount, income, expenses, seed=0)
+        except Exception:
+            goal_simulation = None
+    goal_outlook = summarize_goal_simulation(goal_simulation) if goal_simulation else "- No goal amount specified"
+    try:
+        reference_notes = knowledge_base.context_for(f"{goal} {user_type} savings budget", k=2, max_chars=800)
+    except Exception:
+        reference_notes = ""
     
     # Create detailed financial analysis prompt
     analysis_prompt = f"""
@@ -99,13 +135,20 @@ FINANCIAL SNAPSHOT:
 - Savings Rate: {savings_rate:.1f}%
 - Financial Goal: {goal}
 - Goal Amount: ${goal_amount:,.2f}
+- Spending by Category (from bank transactions): {spending_breakdown or "not available"}
+- Recurring Subscriptions: {recurring_charges or "none detected"}
+
+GOAL OUTLOOK (Monte Carlo simulation of returns and expense shocks):
+{goal_outlook}
+
+REFERENCE NOTES: {reference_notes or "none"}
 
 CHAT HISTORY: {chat_history[:500]}...
 
 Please provide a detailed analysis covering:
 1. Current Financial Health Assessment
-2. Savings and Spending Analysis
-3. Goal Achievement Strategy
+2. Savings and Spending Analysis (including recurring subscriptions worth cancelling)
+3. Goal Achievement Strategy (use the simulated probability of success)
 4. Risk Assessment and Recommendations
 5. Actionable Next Steps
 
@@ -113,24 +156,13 @@ Keep the report professional, specific, and actionable with concrete numbers and
     """.strip()
     
     try:
-        API_URL = "https://api.groq.com/openai/v1/chat/completions"
-        headers = {
-            "Authorization": f"Bearer {os.getenv('GROQ_API_KEY', 'your-groq-api-key-here')}",
-            "Content-Type": "application/json"
-        }
-        payload = {
-            "model": "llama3-8b-8192",
-            "messages": [
-                {"role": "system", "content": "You are an expert financial advisor specializing in comprehensive financial analysis and reporting. Provide detailed, specific, and actionable financial advice with concrete numbers and strategies."},
-                {"role": "user", "content": analysis_prompt}
-            ],
-            "max_tokens": 1500,
-            "temperature": 0.3  # Lower temperature for more consistent reports
-        }
-        
-        response = requests.post(API_URL, headers=headers, json=payload, timeout=30)
-        response.raise_for_status()
-        result = response.json()
+        messages = [
+            {"role": "system", "content": "You are an expert financial advisor specializing in comprehensive financial analysis and reporting. Provide detailed, specific, and actionable financial advice with concrete numbers and strategies."},
+            {"role": "user", "content": analysis_prompt}
+        ]
+        # Transaction data adds sections to the report, so it gets the larger budget
+        query_class = "report_detailed" if spending_breakdown or recurring_charges else "report"
+        result = groq_client.chat_completion(messages, query_class)
         
         if "choices" in result and len(result["choices"]) > 0:
             return result["choices"][0]["message"]["content"]
@@ -141,10 +173,11 @@ Keep the report professional, specific, and actionable with concrete numbers and
         return generate_structured_fallback_report(user_type, income, expenses, goal, goal_amount, savings)
 
 def generate_structured_fallback_report(user_type: str, income: float, expenses: float, goal: str, goal_amount: float, savings: float) -> str:
-    """Generate structured report when all AI services fail"""
+    """Generate structured report when all AI services fail, from the same rules as the Granite service"""
     
-    savings_rate = (savings / income * 100) if income > 0 else 0
-    months_to_goal = (goal_amount / savings) if savings > 0 else float('inf')
+    profile = report_rules.FinancialProfile(user_type=user_type, income=income, expenses=expenses, goal=goal,
+                                            goal_amount=goal_amount)
+    sections = report_rules.evaluate(profile)
     
     report = f"""
 📊 COMPREHENSIVE FINANCIAL REPORT - {user_type.upper()}
@@ -152,29 +185,23 @@ def generate_structured_fallback_report(user_type: str, income: float, expenses:
 💰 FINANCIAL SNAPSHOT
 Current Monthly Income: ${income:,.2f}
 Current Monthly Expenses: ${expenses:,.2f}
-Net Monthly Savings: ${savings:,.2f}
-Personal Savings Rate: {savings_rate:.1f}%
+Net Monthly Savings: ${profile.savings:,.2f}
+Personal Savings Rate: {profile.savings_rate:.1f}%
 
 🎯 GOAL ANALYSIS
 Target: {goal}
 Required Amount: ${goal_amount:,.2f}
-Time to Goal: {months_to_goal:.1f} months (at current savings rate)
+Time to Goal: {profile.months_to_goal:.1f} months (at current savings rate)
 
 📈 FINANCIAL HEALTH ASSESSMENT
-{"🟢 EXCELLENT" if savings_rate >= 20 else "🟡 GOOD" if savings_rate >= 10 else "🔴 NEEDS IMPROVEMENT"}
-- Your savings rate of {savings_rate:.1f}% is {"above average" if savings_rate >= 15 else "below recommended 20%"}
-- {"You're building wealth effectively" if savings > 0 else "Consider reducing expenses to increase savings"}
+{report_rules.health_rating(profile)}
+{chr(10).join(sections['analysis'])}
 
 💡 KEY RECOMMENDATIONS
-1. {"Continue current savings pattern" if savings > 0 else "Create a monthly budget to identify savings opportunities"}
-2. {"Consider emergency fund (3-6 months expenses)" if savings > 0 else "Focus on positive cash flow first"}
-3. {"Explore investment options for goal acceleration" if savings_rate > 15 else "Optimize expenses before investing"}
+{chr(10).join(sections['recommendations'])}
 
 📋 ACTION PLAN
-□ Track expenses for 30 days
-□ {"Increase savings by $" + f"{max(income*0.1 - savings, 0):.0f}" if savings < income*0.1 else "Maintain current savings level"}
-□ Review and adjust monthly budget
-□ {"Research investment options" if savings_rate > 10 else "Focus on debt reduction"}
+{chr(10).join(sections['actions'])}
 
 Report generated using structured analysis engine.
     """
@@ -183,6 +210,9 @@ Report generated using structured analysis engine.
 
 def create_word_report(user_type: str, income: float, expenses: float, goal: str, goal_amount: float, report_content: str, model_name: str) -> str:
     """Create a Word document from the financial report"""
+    # python-docx is only needed here; importing it lazily keeps it out of chat-only processes
+    from docx import Document
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
     
     # Create reports directory if it doesn't exist
     reports_dir = Path("reports")
@@ -263,71 +293,78 @@ def create_word_report(user_type: str, income: float, expenses: float, goal: str
     
     return str(filepath)
 
-def run_model(prompt: str, user_type: str) -> str:
+def run_model(prompt: str, user_type: str, language: str = "english") -> Tuple[str, bool]:
+    """(response, whether it is an answer generated by the LLM rather than a fixed or error message)"""
     # Check if query is finance-related
     if not is_finance_related(prompt):
-        return "I'm a specialized financial assistant. I can only help with questions related to finance, tax, savings, loans, investments, budgeting, and financial planning. Please ask me about financial topics!"
+        return localization.get_message("off_topic", language), False
     
     # Check if user is requesting a report
     report_type = detect_report_request(prompt)
     if report_type:
-        return f"I can help you generate a {report_type} financial report! Please use the 'Generate Report' button in the interface, or provide your financial data (income, expenses, goals) and I'll create a comprehensive analysis using IBM Granite AI."
+        return localization.report_redirect(report_type, language), False
     
-    # Groq API integration
-    API_URL = "https://api.groq.com/openai/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {os.getenv('GROQ_API_KEY', 'your-groq-api-key-here')}",
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "model": "llama3-8b-8192",
-        "messages": [
-            {"role": "system", "content": "You are a specialized financial assistant. You ONLY answer questions related to finance, tax, savings, loans, investments, budgeting, financial planning, banking, insurance, and financial laws. If asked about anything else, politely redirect the conversation back to financial topics. Provide helpful, accurate financial advice based on the user's profile."},
-            {"role": "user", "content": f"As a {user_type}, {prompt}"}
-        ],
-        "max_tokens": 256,
-        "temperature": 0.7
-    }
+    # Well-known questions are answered straight from the knowledge base; other answers are grounded in it
+    question = groq_client.LANGUAGE_PATTERN.sub("", prompt, count=1).strip()
+    context = ""
+    try:
+        if language == localization.DEFAULT_LANGUAGE:
+            faq = knowledge_base.faq_answer(question)
+            if faq:
+                return faq["text"], False
+        context = knowledge_base.context_for(question)
+    except Exception as e:
+        logger.warning(f"Knowledge base unavailable: {e}")
+    user_content = f"As a {user_type}, {prompt}"
+    if context:
+        user_content += f"\n\nReference notes (use them where relevant):\n{context}"
+    
+    # Groq API integration, with the answer length budgeted by query class
+    messages = [
+        {"role": "system", "content": "You are a specialized financial assistant. You ONLY answer questions related to finance, tax, savings, loans, investments, budgeting, financial planning, banking, insurance, and financial laws. If asked about anything else, politely redirect the conversation back to financial topics. Provide helpful, accurate financial advice based on the user's profile."},
+        {"role": "user", "content": user_content}
+    ]
+    query_class = groq_client.classify_query(prompt)
+    max_tokens, temperature = groq_client.token_budget(query_class, prompt)
     try:
-        response = requests.post(API_URL, headers=headers, json=payload, timeout=30)
-        response.raise_for_status()
-        result = response.json()
+        result = groq_client.chat_completion(messages, query_class, max_tokens, temperature)
         if "choices" in result and len(result["choices"]) > 0:
-            return result["choices"][0]["message"]["content"]
+            return result["choices"][0]["message"]["content"], True
         else:
-            return str(result)
+            return str(result), False
+    except rate_limit.Overloaded:
+        raise
     except requests.exceptions.HTTPError as e:
         try:
             err_json = e.response.json()
-            return f"AI model error: {err_json.get('error', str(e))}"
+            return f"AI model error: {err_json.get('error', str(e))}", False
         except Exception:
-            return f"AI model error: {e}"
+            return f"AI model error: {e}", False
     except Exception as e:
-        return f"AI model error: {e}"
+        return f"AI model error: {e}", False
 
 @app.post("/chat")
 async def chat(request: Request):
     data = await request.json()
     user_message = data.get("message", "")
     user_type = data.get("user_type", "student")
-    language = data.get("language", "english")
-    # Supported Indian languages
-    indian_languages = {
-        "hindi": "Hindi",
-        "bengali": "Bengali",
-        "tamil": "Tamil",
-        "telugu": "Telugu",
-        "marathi": "Marathi",
-        "gujarati": "Gujarati",
-        "kannada": "Kannada",
-        "malayalam": "Malayalam",
-        "punjabi": "Punjabi"
-    }
-    if language.lower() in indian_languages:
-        prompt = f"Reply in {indian_languages[language.lower()]}: {user_message}"
+    language = localization.normalize_language(data.get("language", "english"))
+    # Indian languages (every catalog language besides English) get a reply-language instruction
+    if language != localization.DEFAULT_LANGUAGE:
+        prompt = f"Reply in {localization.language_name(language)}: {user_message}"
     else:
         prompt = user_message
-    response = run_model(prompt, user_type)
+
+    # Common questions were probably answered before in this language
+    cached = await run_in_threadpool(localization.answer_cache.get, language, user_type, user_message)
+    if cached:
+        return {"response": cached, "cached": True}
+
+    # Off the event loop, so concurrent chats overlap and identical questions can share one Groq call
+    response, is_answer = await run_in_threadpool(run_model, prompt, user_type, language)
+    # Fixed messages and knowledge-base answers are cheap anyway; errors and odd payloads must not be replayed
+    if is_answer:
+        await run_in_threadpool(localization.answer_cache.put, language, user_type, user_message, response)
     return {"response": response}
 
 @app.post("/budget-summary")
@@ -335,14 +372,7 @@ async def budget_summary(request: Request):
     data = await request.json()
     income = data.get("income", 0)
     expenses = data.get("expenses", 0)
-    savings = income - expenses
-    if savings < 0:
-        summary = f"Your expenses exceed your income by ${-savings:.2f}. Consider reducing discretionary spending."
-    elif savings == 0:
-        summary = "You are breaking even. Try to save a small amount each month for emergencies."
-    else:
-        summary = f"You are saving ${savings:.2f} per month. Great job! Consider allocating some to your financial goals."
-    return {"summary": summary}
+    return {"summary": finance_rules.budget_summary(income, expenses)}
 
 @app.post("/goal-calculation")
 async def goal_calculation(request: Request):
@@ -351,16 +381,41 @@ async def goal_calculation(request: Request):
     income = data.get("income", 0)
     expenses = data.get("expenses", 0)
     months = data.get("months", 12)  # Default to 12 months if not provided
-    available = max(income - expenses, 0)
-    if months > 0:
-        monthly_needed = goal_amount / months
-    else:
-        monthly_needed = goal_amount
-    if available < monthly_needed:
-        msg = f"You need to save ${monthly_needed:.2f} per month, but only ${available:.2f} is available. Consider extending your timeline or reducing expenses."
-    else:
-        msg = f"You need to save ${monthly_needed:.2f} per month to reach your goal. You have enough available!"
-    return {"monthly_amount": monthly_needed, "message": msg}
+    return finance_rules.goal_calculation(goal_amount, income, expenses, months)
+
+@reports.post("/goal-simulation")
+async def goal_simulation(request: Request):
+    data = await request.json()
+    try:
+        goal_amount = float(data.get("goal_amount") or 0)
+        income = float(data.get("income") or 0)
+        expenses = float(data.get("expenses") or 0)
+        current_savings = float(data.get("current_savings") or 0)
+        months = int(data.get("months") or 12)
+        paths = int(data.get("paths") or monte_carlo.DEFAULT_PATHS)
+        seed = data.get("seed")
+        if seed is not None:
+            seed = int(seed)
+    except (TypeError, ValueError):
+        return JSONResponse({"error": "goal_amount, income, expenses, current_savings, months, paths and seed must be numbers.",
+                             "status": "error"}, status_code=400)
+    if goal_amount <= 0:
+        return {"error": "A positive goal_amount is required for simulation."}
+    try:
+        # NumPy work runs off the event loop; paths and months are capped by the simulator
+        simulation = await run_in_threadpool(
+            simulate_goal_success,
+            goal_amount,
+            income,
+            expenses,
+            months=min(max(months, 1), monte_carlo.MAX_MONTHS),
+            current_savings=current_savings,
+            n_paths=min(max(paths, 1), monte_carlo.MAX_PATHS),
+            seed=seed,
+        )
+        return {"simulation": simulation, "summary": summarize_goal_simulation(simulation)}
+    except Exception as e:
+        return {"error": f"Goal simulation failed: {e}"}
 
 @app.post("/spending-insights")
 async def spending_insights(request: Request):
@@ -368,11 +423,145 @@ async def spending_insights(request: Request):
     expenses = data.get("expenses", 0)
     # For demo, highlight if expenses are high compared to income
     income = data.get("income", 0)
-    if income > 0 and expenses/income > 0.7:
-        insights = "Your spending is more than 70% of your income. Review subscriptions, eating out, and impulse purchases."
-    else:
-        insights = "Your spending is within a healthy range. Keep tracking for overlooked expenses like small subscriptions or fees."
-    return {"insights": insights}
+    session_id = data.get("session_id")
+    if session_id:
+        summary = get_transaction_summary(session_id, data.get("months"))
+        if summary:
+            recurring = get_recurring_charges(session_id)
+            insights = describe_category_spending(summary, income)
+            recurring_text = subscriptions.describe_subscriptions(recurring)
+            if recurring_text:
+                insights += f" We found {recurring_text}. Cancel any you no longer use."
+            return {"insights": insights, "categories": summary["categories"], "subscriptions": recurring}
+    return {"insights": finance_rules.spending_insights(income, expenses)}
+
+def get_transaction_summary(session_id: int, months: int = None) -> dict:
+    """Category aggregates for a session's uploaded transactions, or None if there are none"""
+    try:
+        conn = transactions.get_connection()
+        summary = transactions.get_spending_summary(conn, session_id, months)
+        conn.close()
+        return summary if summary["total_spent"] > 0 else None
+    except Exception:
+        return None
+
+def get_recurring_charges(session_id: int) -> list:
+    """Recurring subscriptions detected in a session's transactions (updated incrementally)"""
+    try:
+        conn = transactions.get_connection()
+        recurring = subscriptions.update_subscriptions(conn, session_id)
+        conn.close()
+        return recurring
+    except Exception:
+        return []
+
+def describe_category_spending(summary: dict, income: float) -> str:
+    """Turn category aggregates into spending insights"""
+    income = income or summary["monthly_income"]
+    monthly_spending = summary["monthly_spending"]
+    top = list(summary["categories"].items())[:3]
+    lines = [f"Across {summary['months']} month(s) of transactions you spend about ${monthly_spending:,.2f} per month."]
+    if income > 0:
+        lines.append(f"That is {monthly_spending / income * 100:.0f}% of your monthly income.")
+    lines.append("Top categories: " + ", ".join(
+        f"{category.replace('_', ' ')} (${spent / max(summary['months'], 1):,.2f}/month, {spent / summary['total_spent'] * 100:.0f}%)"
+        for category, spent in top
+    ) + ".")
+    discretionary = sum(summary["categories"].get(c, 0) for c in ("dining", "shopping", "entertainment", "subscriptions"))
+    if discretionary / summary["total_spent"] > 0.3:
+        lines.append("Discretionary spending (dining, shopping, entertainment, subscriptions) is above 30% of your spending - that is the easiest place to cut back.")
+    return " ".join(lines)
+
+@app.get("/spending-summary/{session_id}")
+async def spending_summary(session_id: int, months: int = None, category: str = None):
+    """
+    Monthly burn, savings rate and category totals over the last N months, served from the monthly rollups
+    """
+    try:
+        conn = transactions.get_connection()
+        summary = transactions.get_spending_summary(conn, session_id, months, category)
+        conn.close()
+        return {"session_id": session_id, "summary": summary}
+    except Exception as e:
+        return {"error": str(e)}
+
+def import_statement(session_id: int, statement, fmt: str) -> dict:
+    """Categorize and store a spooled statement and refresh the session's subscriptions"""
+    conn = transactions.get_connection()
+    try:
+        result = transactions.ingest_transactions(conn, session_id, transactions.iter_statement_text(statement, fmt), fmt)
+        result["subscriptions"] = len(subscriptions.update_subscriptions(conn, session_id))
+        return result
+    finally:
+        conn.close()
+
+@reports.post("/upload-transactions/{session_id}")
+async def upload_transactions(session_id: int, request: Request):
+    """
+    Stream a bank statement (CSV or OFX) from the request body, categorize and store its transactions
+    """
+    fmt = request.query_params.get("format")
+    filename = request.query_params.get("filename", "")
+    try:
+        if not session_shards.session_exists(session_id):
+            return {"error": "Session not found."}
+
+        # Spool the body to disk beyond 1 MB so memory use stays constant for any statement size
+        with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as spool:
+            async for chunk in request.stream():
+                if fmt is None and chunk:
+                    fmt = transactions.detect_format(chunk, filename)
+                spool.write(chunk)
+            spool.seek(0)
+            # Parsing and inserting a statement of any size must not hold up the other requests
+            result = await run_in_threadpool(import_statement, session_id, spool, fmt or "csv")
+        return {"status": "Transactions imported.", "session_id": session_id, "format": fmt or "csv", **result}
+    except Exception as e:
+        return {"error": f"Error importing transactions: {e}"}
+
+def prepare_storage():
+    """Make sure search indexes and session shards exist before sessions are written"""
+    try:
+        conn = sqlite3.connect("financebot.db")
+        session_search.init_search_schema(conn)
+        history_codec.init_column(conn)
+        conn.close()
+        session_shards.init_shards()
+    except Exception as e:
+        logger.warning(f"Session search unavailable: {e}")
+    if rate_limit.RATE_LIMIT_ENABLED and rate_limit.RATE_LIMIT_BACKEND == "sqlite":
+        # Switch the bucket file to WAL once here rather than in every worker at its first request;
+        # the connection is closed again so no worker inherits it
+        rate_limit.SQLiteLimiter().close()
+
+@app.on_event("startup")
+async def startup_event():
+    """Make sure storage is ready and warm up shared state"""
+    prepare_storage()
+    if SERVICE_PROFILE == "full":
+        report_jobs.start_heartbeat()
+        session_maintenance.start_scheduler()
+    # Load the intent classifier and knowledge index now rather than on the first chat
+    intent_classifier.get_classifier()
+    try:
+        knowledge_base.get_index()
+    except Exception as e:
+        logger.warning(f"Knowledge base unavailable: {e}")
+
+@app.get("/search-sessions")
+async def search_sessions(q: str = "", user_type: str = None, min_income: float = None, max_income: float = None,
+                          start_date: str = None, end_date: str = None, limit: int = 20, cursor: str = None):
+    """
+    Full-text search over saved sessions (goal, user type and chat history) with filters and keyset pagination
+    """
+    try:
+        # Ranking scores every match, so a common word can take a while; keep it off the event loop
+        return await run_in_threadpool(
+            session_shards.search_sessions, q, user_type=user_type, min_income=min_income, max_income=max_income,
+            start_date=start_date, end_date=end_date, limit=limit, cursor=cursor
+        )
+    except Exception as e:
+        return {"error": f"Session search failed: {e}"}
 
 @app.post("/save-session")
 async def save_session(request: Request):
@@ -384,47 +573,148 @@ async def save_session(request: Request):
     goal = data.get("goal", "")
     goal_amount = data.get("goal_amount", 0)
     try:
-        conn = sqlite3.connect("financebot.db")
-        c = conn.cursor()
-        c.execute("""
-            INSERT INTO sessions (user_type, chat_history, income, expenses, goal, goal_amount)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (user_type, chat_history, income, expenses, goal, goal_amount))
-        conn.commit()
-        session_id = c.lastrowid
-        conn.close()
+        session_id = session_shards.save_session(user_type, chat_history, income, expenses, goal, goal_amount)
         return {"status": "Session saved.", "session_id": session_id}
     except Exception as e:
         return {"status": f"Error saving session: {e}"}
 @app.get("/get-session/{session_id}")
 async def get_session(session_id: int):
     try:
-        conn = sqlite3.connect("financebot.db")
-        c = conn.cursor()
-        c.execute("SELECT * FROM sessions WHERE id = ?", (session_id,))
-        row = c.fetchone()
-        conn.close()
-        if row:
-            keys = ["id", "user_type", "chat_history", "income", "expenses", "goal", "goal_amount", "created_at"]
-            session = dict(zip(keys, row))
+        session = session_shards.load_session(session_id)
+        if session:
             return {"session": session}
         else:
             return {"error": "Session not found."}
     except Exception as e:
         return {"error": str(e)}
 
-@app.post("/generate-comprehensive-report")
-async def generate_comprehensive_report(request: Request):
+def require_api_key(request: Request):
+    """
+    401 response unless the request carries one of FINANCEBOT_API_KEYS, None when it may go on. Bulk export,
+    import and maintenance touch every user's sessions, so without configured keys they are CLI-only.
+    """
+    if not rate_limit.is_known_key(request.headers.get("x-api-key")):
+        return JSONResponse({"error": "This endpoint requires a valid X-API-Key.", "status": "error"}, status_code=401)
+    return None
+
+@reports.get("/export-sessions")
+async def export_sessions(request: Request, format: str = "ndjson", after_id: int = 0, batch_size: int = session_export.DEFAULT_BATCH_SIZE,
+                          limit: int = None):
+    """
+    Stream sessions with id > after_id as NDJSON (one session per line) or columnar NDJSON (one batch per line)
+    """
+    denied = require_api_key(request)
+    if denied:
+        return denied
+    if format not in session_export.FORMATS:
+        return {"error": f"Unknown export format: {format}. Use one of {', '.join(session_export.FORMATS)}"}
+    batch_size = max(1, min(batch_size, session_export.MAX_BATCH_SIZE))
+
+    def generate():
+        # Batches are fetched from the threadpool, not necessarily on the same thread each time
+        if session_shards.enabled():
+            yield from session_export.encode_batches(session_shards.iter_batches(after_id, batch_size, limit), format)
+            return
+        conn = sqlite3.connect("financebot.db", check_same_thread=False)
+        try:
+            yield from session_export.export_lines(conn, format, after_id, batch_size, limit)
+        finally:
+            conn.close()
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+@reports.post("/import-sessions")
+async def import_sessions(request: Request, keep_ids: bool = False):
+    """
+    Import an NDJSON or columnar session export from the request body, streamed in batches
+    """
+    denied = require_api_key(request)
+    if denied:
+        return denied
+    if session_shards.enabled():
+        conn = None
+        importer = session_shards.ShardedImporter(keep_ids)
+    else:
+        conn = sqlite3.connect("financebot.db", check_same_thread=False)
+        importer = session_export.SessionImporter(conn, keep_ids)
+    splitter = session_export.LineSplitter()
+    try:
+        async for chunk in request.stream():
+            lines = splitter.feed(chunk)
+            if lines:
+                await run_in_threadpool(importer.add_lines, lines)
+        await run_in_threadpool(importer.add_lines, splitter.close())
+        await run_in_threadpool(importer.flush)
+        return {"status": "success", **importer.summary()}
+    except (UnicodeDecodeError, sqlite3.Error) as e:
+        return {"error": f"Import failed after {importer.imported} sessions: {e}", **importer.summary()}
+    finally:
+        if conn is None:
+            importer.close()
+        else:
+            conn.close()
+
+@reports.post("/maintenance/run")
+async def run_session_maintenance(request: Request, dry_run: bool = False):
+    """
+    Compress old chat histories, archive expired sessions, prune old reports and vacuum now
+    """
+    denied = require_api_key(request)
+    if denied:
+        return denied
+    try:
+        return {"status": "success", **await run_in_threadpool(session_maintenance.run_maintenance, "financebot.db", dry_run)}
+    except Exception as e:
+        return {"error": f"Maintenance failed: {e}"}
+
+@reports.get("/maintenance/stats")
+async def session_maintenance_stats(request: Request, limit: int = 10):
+    """
+    Database size and the most recent maintenance runs with the space they reclaimed
+    """
+    denied = require_api_key(request)
+    if denied:
+        return denied
+    conn = sqlite3.connect("financebot.db")
+    try:
+        return {"size": session_maintenance.database_size(conn),
+                "runs": session_maintenance.recent_runs(conn, max(1, min(limit, 100)))}
+    except Exception as e:
+        return {"error": str(e)}
+    finally:
+        conn.close()
+
+def request_granite_report(payload: dict, timeout: float) -> dict:
+    """
+    Granite /generate-report response, or None when the service answers with an error status.
+    Responses are kept in the shared cache, so every worker reuses a report generated for the same input.
+    """
+    key = shared_cache.make_key("granite-report", payload)
+    cached = shared_cache.get(key)
+    if cached is not None:
+        return cached
+    with rate_limit.upstream_slot("granite"):
+        response = requests.post(GRANITE_REPORT_URL, json=payload, timeout=timeout)
+    if response.status_code != 200:
+        return None
+    report_data = response.json()
+    # Structured fallbacks written after a Granite failure are not worth sharing
+    if not str(report_data.get("report", "")).startswith("[Granite Model Error]"):
+        shared_cache.put(key, report_data, REPORT_CACHE_TTL_SECONDS)
+    return report_data
+
+def build_comprehensive_report(data: dict) -> dict:
     """
     Generate comprehensive financial report using IBM Granite model
     """
-    data = await request.json()
     user_type = data.get("user_type", "student")
     income = data.get("income", 0)
     expenses = data.get("expenses", 0)
     goal = data.get("goal", "")
     goal_amount = data.get("goal_amount", 0)
     chat_history = data.get("chat_history", "")
+    summary = get_transaction_summary(data["session_id"]) if data.get("session_id") else None
+    spending_breakdown = transactions.format_category_breakdown(summary) if summary else ""
+    recurring_charges = subscriptions.describe_subscriptions(get_recurring_charges(data["session_id"])) if summary else ""
     
     # Prepare raw content for Granite model
     raw_content = f"""
@@ -433,22 +723,20 @@ income: {income}
 expenses: {expenses}
 goal: {goal}
 goal_amount: {goal_amount}
+spending_categories: {spending_breakdown}
+subscriptions: {recurring_charges}
 chat_history: {chat_history}
     """.strip()
     
     try:
-        # Try Granite report service first with shorter timeout
-        granite_response = requests.post(
-            "http://localhost:8002/generate-report",
-            json={
-                "raw_content": raw_content,
-                "report_type": "comprehensive_financial_analysis"
-            },
-            timeout=90  # Reduced timeout for faster fallback
-        )
+        # Try Granite report service first with shorter timeout; a busy Granite falls back to Groq
+        report_data = request_granite_report({
+            "raw_content": raw_content,
+            "report_type": "comprehensive_financial_analysis",
+            "decoding": data.get("decoding")
+        }, timeout=90)  # Reduced timeout for faster fallback
         
-        if granite_response.status_code == 200:
-            report_data = granite_response.json()
+        if report_data is not None:
             return {
                 "report": report_data.get("report", "Report generation failed"),
                 "model": "IBM Granite 3.0-1B",
@@ -456,7 +744,7 @@ chat_history: {chat_history}
             }
         else:
             # Fall back to Groq-powered structured report
-            fallback_report = generate_groq_financial_report(user_type, income, expenses, goal, goal_amount, chat_history)
+            fallback_report = generate_groq_financial_report(user_type, income, expenses, goal, goal_amount, chat_history, spending_breakdown=spending_breakdown, recurring_charges=recurring_charges)
             return {
                 "report": fallback_report,
                 "model": "Groq API (llama3-8b-8192) - Structured Analysis",
@@ -465,7 +753,7 @@ chat_history: {chat_history}
             
     except requests.exceptions.ReadTimeout:
         # Granite model is taking too long, use Groq fallback
-        fallback_report = generate_groq_financial_report(user_type, income, expenses, goal, goal_amount, chat_history)
+        fallback_report = generate_groq_financial_report(user_type, income, expenses, goal, goal_amount, chat_history, spending_breakdown=spending_breakdown, recurring_charges=recurring_charges)
         return {
             "report": fallback_report + "\n\n⚡ Note: Generated using fast AI analysis due to high demand on specialized models.",
             "model": "Groq API (llama3-8b-8192) - Fast Analysis",
@@ -473,31 +761,26 @@ chat_history: {chat_history}
         }
     except Exception as e:
         # Any other error, use Groq fallback
-        fallback_report = generate_groq_financial_report(user_type, income, expenses, goal, goal_amount, chat_history)
+        fallback_report = generate_groq_financial_report(user_type, income, expenses, goal, goal_amount, chat_history, spending_breakdown=spending_breakdown, recurring_charges=recurring_charges)
         return {
             "report": fallback_report + f"\n\n⚠️ Note: Fallback analysis used due to: {str(e)[:100]}",
             "model": "Groq API (llama3-8b-8192) - Fallback Analysis", 
             "status": "success"
         }
 
-@app.post("/analyze-my-finances")
-async def analyze_my_finances(request: Request):
+def build_session_analysis(session_id: int, refresh: bool = False) -> dict:
     """
     Analyze user's financial situation using session data and Granite AI
+    The Granite service returns its stored analysis while the session is unchanged, unless refresh is set
     """
-    data = await request.json()
-    session_id = data.get("session_id")
-    
-    if not session_id:
-        return {"error": "Session ID required for financial analysis"}
-    
     try:
         # Call the Granite analysis service
-        granite_response = requests.post(
-            "http://localhost:8002/analyze-session",
-            json={"session_id": session_id},
-            timeout=180
-        )
+        with rate_limit.upstream_slot("granite"):
+            granite_response = requests.post(
+                "http://localhost:8002/analyze-session",
+                json={"session_id": session_id, "refresh": refresh},
+                timeout=180
+            )
         
         if granite_response.status_code == 200:
             analysis_data = granite_response.json()
@@ -505,26 +788,30 @@ async def analyze_my_finances(request: Request):
                 "analysis": analysis_data.get("report", "Analysis failed"),
                 "session_data": analysis_data.get("session_data", {}),
                 "model": "IBM Granite 3.0-1B",
+                "cached": analysis_data.get("cached", False),
                 "status": "success"
             }
         else:
             return {"error": "Granite analysis service unavailable", "status": "error"}
             
+    except rate_limit.Overloaded:
+        raise
     except Exception as e:
         return {"error": f"Financial analysis failed: {str(e)}", "status": "error"}
 
-@app.post("/generate-word-report")
-async def generate_word_report(request: Request):
+def build_word_report(data: dict) -> dict:
     """
-    Generate comprehensive financial report as downloadable Word document
+    Generate comprehensive financial report content and save it as a Word document
     """
-    data = await request.json()
     user_type = data.get("user_type", "student")
     income = data.get("income", 0)
     expenses = data.get("expenses", 0)
     goal = data.get("goal", "")
     goal_amount = data.get("goal_amount", 0)
     chat_history = data.get("chat_history", "")
+    summary = get_transaction_summary(data["session_id"]) if data.get("session_id") else None
+    spending_breakdown = transactions.format_category_breakdown(summary) if summary else ""
+    recurring_charges = subscriptions.describe_subscriptions(get_recurring_charges(data["session_id"])) if summary else ""
     
     # First generate the report content using the same logic as the regular report
     raw_content = f"""
@@ -533,52 +820,188 @@ income: {income}
 expenses: {expenses}
 goal: {goal}
 goal_amount: {goal_amount}
+spending_categories: {spending_breakdown}
+subscriptions: {recurring_charges}
 chat_history: {chat_history}
     """.strip()
     
     try:
-        # Try Granite report service first with shorter timeout
-        granite_response = requests.post(
-            "http://localhost:8002/generate-report",
-            json={
-                "raw_content": raw_content,
-                "report_type": "comprehensive_financial_analysis"
-            },
-            timeout=90  # Reduced timeout for faster fallback
-        )
+        # Try Granite report service first with shorter timeout; a busy Granite falls back to Groq
+        report_data = request_granite_report({
+            "raw_content": raw_content,
+            "report_type": "comprehensive_financial_analysis",
+            "decoding": data.get("decoding")
+        }, timeout=90)  # Reduced timeout for faster fallback
         
-        if granite_response.status_code == 200:
-            report_data = granite_response.json()
+        if report_data is not None:
             report_content = report_data.get("report", "Report generation failed")
             model_name = "IBM Granite 3.0-1B"
         else:
             # Fall back to Groq-powered structured report
-            report_content = generate_groq_financial_report(user_type, income, expenses, goal, goal_amount, chat_history)
+            report_content = generate_groq_financial_report(user_type, income, expenses, goal, goal_amount, chat_history, spending_breakdown=spending_breakdown, recurring_charges=recurring_charges)
             model_name = "Groq API (llama3-8b-8192) - Structured Analysis"
             
     except requests.exceptions.ReadTimeout:
         # Granite model is taking too long, use Groq fallback
-        report_content = generate_groq_financial_report(user_type, income, expenses, goal, goal_amount, chat_history)
+        report_content = generate_groq_financial_report(user_type, income, expenses, goal, goal_amount, chat_history, spending_breakdown=spending_breakdown, recurring_charges=recurring_charges)
         model_name = "Groq API (llama3-8b-8192) - Fast Analysis"
     except Exception as e:
         # Any other error, use Groq fallback
-        report_content = generate_groq_financial_report(user_type, income, expenses, goal, goal_amount, chat_history)
+        report_content = generate_groq_financial_report(user_type, income, expenses, goal, goal_amount, chat_history, spending_breakdown=spending_breakdown, recurring_charges=recurring_charges)
         model_name = "Groq API (llama3-8b-8192) - Fallback Analysis"
     
     # Create Word document
     try:
         word_file_path = create_word_report(user_type, income, expenses, goal, goal_amount, report_content, model_name)
-        
-        # Return file for download
-        return FileResponse(
-            path=word_file_path,
-            filename=os.path.basename(word_file_path),
-            media_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-        )
-        
+        return {"report": report_content, "model": model_name, "docx_path": word_file_path, "status": "success"}
     except Exception as e:
         return {"error": f"Word document generation failed: {str(e)}", "status": "error"}
 
+def submit_report_job(kind: str, fn, *args) -> dict:
+    """Queue report generation and return the job ID for polling"""
+    try:
+        job_id = report_jobs.submit_job(kind, fn, *args)
+        return {"job_id": job_id, "status": "queued", "status_url": f"/report-jobs/{job_id}"}
+    except report_jobs.QueueFullError as e:
+        return JSONResponse({"error": str(e), "status": "error"}, status_code=503, headers={"Retry-After": "30"})
+
+@reports.post("/generate-comprehensive-report")
+async def generate_comprehensive_report(request: Request):
+    """
+    Generate comprehensive financial report; with {"async": true} return a job ID immediately instead
+    """
+    data = await request.json()
+    if data.get("async"):
+        return submit_report_job("comprehensive", build_comprehensive_report, data)
+    # Waiting for an upstream slot and for Granite blocks, so it must not happen on the event loop
+    return await run_in_threadpool(build_comprehensive_report, data)
+
+@reports.post("/analyze-my-finances")
+async def analyze_my_finances(request: Request):
+    """
+    Analyze a saved session with Granite AI; with {"async": true} return a job ID immediately instead
+    and with {"refresh": true} analyze again even if the session has not changed
+    """
+    data = await request.json()
+    session_id = data.get("session_id")
+    refresh = bool(data.get("refresh"))
+    
+    if not session_id:
+        return {"error": "Session ID required for financial analysis"}
+    
+    if data.get("async"):
+        return submit_report_job("analysis", build_session_analysis, session_id, refresh)
+    return await run_in_threadpool(build_session_analysis, session_id, refresh)
+
+@reports.post("/generate-word-report")
+async def generate_word_report(request: Request):
+    """
+    Generate comprehensive financial report as downloadable Word document; with {"async": true} return a job ID
+    """
+    data = await request.json()
+    if data.get("async"):
+        return submit_report_job("word", build_word_report, data)
+    result = await run_in_threadpool(build_word_report, data)
+    if result.get("status") == "error":
+        return result
+    
+    # Return file for download
+    return FileResponse(
+        path=result["docx_path"],
+        filename=os.path.basename(result["docx_path"]),
+        media_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+    )
+
+@reports.get("/report-jobs/{job_id}")
+async def get_report_job(job_id: str):
+    """
+    Poll a report job: status is queued, running, done or failed; finished jobs include the result
+    """
+    job = report_jobs.get_job(job_id)
+    if job is None:
+        return {"error": "Job not found or expired.", "status": "error"}
+    return job
+
+@reports.get("/report-jobs/{job_id}/docx")
+async def get_report_job_docx(job_id: str):
+    """
+    Download the Word document produced by a finished word report job
+    """
+    docx = report_jobs.get_job_docx(job_id)
+    if docx is None:
+        return {"error": "No Word document for this job (not finished, failed or expired).", "status": "error"}
+    filename, content = docx
+    return Response(
+        content=content,
+        media_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.post("/classify-intent")
+async def classify_intent(request: Request):
+    """
+    Batch-score queries with the local finance intent classifier
+    """
+    data = await request.json()
+    queries = data.get("queries", [])
+    if not isinstance(queries, list) or not all(isinstance(q, str) for q in queries):
+        return {"error": "queries must be a list of strings"}
+    classifier = intent_classifier.get_classifier()
+    threshold = data.get("threshold", classifier.threshold)
+    if isinstance(threshold, bool) or not isinstance(threshold, (int, float)) or not 0 <= threshold <= 1:
+        return {"error": "threshold must be a number between 0 and 1"}
+    threshold = float(threshold)
+    scores = classifier.score_batch(queries)
+    return {
+        "threshold": threshold,
+        "results": [{"query": q, "score": round(float(p), 4), "finance": bool(p >= threshold)} for q, p in zip(queries, scores)]
+    }
+
+@app.get("/llm-usage")
+async def llm_usage(hours: float = 24):
+    """
+    Groq requests, tokens and latency per query class over the last `hours`
+    """
+    conn = sqlite3.connect("financebot.db")
+    try:
+        return {"hours": hours, "classes": groq_client.usage_summary(conn, hours)}
+    except Exception as e:
+        return {"error": str(e)}
+    finally:
+        conn.close()
+
 @app.get("/health")
 async def health():
-    return {"status": "ok"}
+    return {"status": "ok", "profile": SERVICE_PROFILE, "pid": os.getpid()}
+
+@app.get("/cache-stats")
+async def cache_stats():
+    """Live entries per namespace in the cache shared by all workers"""
+    try:
+        return shared_cache.stats()
+    except Exception as e:
+        return {"error": str(e)}
+
+if SERVICE_PROFILE == "full":
+    app.include_router(reports)
+
+def worker_count(setting: str = FINANCEBOT_WORKERS) -> int:
+    """FINANCEBOT_WORKERS as a number; "auto" is the number of cores this process may run on"""
+    if setting == "auto":
+        try:
+            return len(os.sched_getaffinity(0))
+        except AttributeError:
+            return os.cpu_count() or 1
+    return max(1, int(setting))
+
+if __name__ == "__main__":
+    workers = worker_count()
+    if workers > 1:
+        import prefork
+        # Limiter buckets must be shared, or every worker would grant the full budget
+        if "RATE_LIMIT_BACKEND" not in os.environ:
+            rate_limit.RATE_LIMIT_BACKEND = "sqlite"
+        prefork.run(app, FINANCEBOT_HOST, FINANCEBOT_PORT, workers, preload=prepare_storage)
+    else:
+        import uvicorn
+        uvicorn.run(app, host=FINANCEBOT_HOST, port=FINANCEBOT_PORT)
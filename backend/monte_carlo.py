@@ -0,0 +1,135 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+# Simulation defaults
+DEFAULT_PATHS = 10_000
+DEFAULT_ANNUAL_RETURN = 0.06       # Expected annual return on saved money
+DEFAULT_ANNUAL_VOLATILITY = 0.10   # Annual standard deviation of returns
+DEFAULT_SHOCK_PROBABILITY = 0.05   # Chance of an unexpected expense in any month
+DEFAULT_SHOCK_SEVERITY = 0.5       # Mean shock size as a fraction of monthly expenses
+PERCENTILES = (5, 25, 50, 75, 95)
+# Upper bounds on request-controlled sizes: memory and CPU grow with paths x months
+MAX_PATHS = 100_000
+MAX_MONTHS = 600
+
+# Paths are split into fixed-size chunks so results only depend on the seed,
+# never on how many worker processes happen to run them
+CHUNK_PATHS = 25_000
+PARALLEL_MIN_PATHS = 50_000
+MAX_WORKERS = int(os.getenv("MONTE_CARLO_WORKERS", os.cpu_count() or 1))
+
+_executor = None
+
+def _get_executor() -> ProcessPoolExecutor:
+    """Create the shared process pool on first use"""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=MAX_WORKERS)
+    return _executor
+
+def _checkpoint_months(months: int) -> List[int]:
+    """Months at which percentile bands are reported (yearly plus the horizon)"""
+    checkpoints = list(range(12, months, 12))
+    checkpoints.append(months)
+    return checkpoints
+
+def _simulate_chunk(seed_seq: np.random.SeedSequence, n_paths: int, months: int, start_balance: float,
+                    monthly_savings: float, monthly_expenses: float, annual_return: float,
+                    annual_volatility: float, shock_probability: float, shock_severity: float,
+                    goal_amount: float) -> Dict[str, np.ndarray]:
+    """Simulate one chunk of paths, fully vectorized over paths and months"""
+    rng = np.random.default_rng(seed_seq)
+
+    monthly_mu = annual_return / 12
+    monthly_sigma = annual_volatility / np.sqrt(12)
+    growth = 1.0 + rng.normal(monthly_mu, monthly_sigma, size=(n_paths, months))
+
+    # Expense shocks: Bernoulli arrival with exponentially distributed size
+    shocks = rng.random((n_paths, months)) < shock_probability
+    shock_sizes = rng.exponential(max(shock_severity * monthly_expenses, 0.0), size=(n_paths, months))
+    contributions = monthly_savings - shocks * shock_sizes
+
+    # Closed form of W_t = W_{t-1} * g_t + c_t:  W_t = G_t * (W_0 + sum_{s<=t} c_s / G_s)
+    cumulative_growth = np.cumprod(growth, axis=1)
+    balances = cumulative_growth * (start_balance + np.cumsum(contributions / cumulative_growth, axis=1))
+
+    reached = balances >= goal_amount
+    hit = reached.any(axis=1)
+    # First month (1-based) the goal was reached; 0 for paths that never reached it
+    first_hit = np.where(hit, reached.argmax(axis=1) + 1, 0)
+
+    checkpoints = np.asarray(_checkpoint_months(months)) - 1
+    return {
+        "checkpoint_balances": balances[:, checkpoints],
+        "first_hit": first_hit,
+    }
+
+def _run_chunk(args) -> Dict[str, np.ndarray]:
+    return _simulate_chunk(*args)
+
+def simulate_goal_success(goal_amount: float, income: float, expenses: float, months: int = 12,
+                          current_savings: float = 0.0, n_paths: int = DEFAULT_PATHS, seed: Optional[int] = None,
+                          annual_return: float = DEFAULT_ANNUAL_RETURN,
+                          annual_volatility: float = DEFAULT_ANNUAL_VOLATILITY,
+                          shock_probability: float = DEFAULT_SHOCK_PROBABILITY,
+                          shock_severity: float = DEFAULT_SHOCK_SEVERITY) -> Dict[str, Any]:
+    """
+    Estimate the probability of reaching goal_amount within the given number of months.
+    Simulates investment return and expense-shock paths; the same seed always gives the same result.
+    """
+    months = min(max(int(months), 1), MAX_MONTHS)
+    n_paths = min(max(int(n_paths), 1), MAX_PATHS)
+    monthly_savings = income - expenses
+
+    seed_seq = np.random.SeedSequence(seed)
+    chunk_sizes = [CHUNK_PATHS] * (n_paths // CHUNK_PATHS)
+    if n_paths % CHUNK_PATHS:
+        chunk_sizes.append(n_paths % CHUNK_PATHS)
+
+    chunk_args = [
+        (child, size, months, current_savings, monthly_savings, expenses, annual_return,
+         annual_volatility, shock_probability, shock_severity, goal_amount)
+        for child, size in zip(seed_seq.spawn(len(chunk_sizes)), chunk_sizes)
+    ]
+
+    if n_paths >= PARALLEL_MIN_PATHS and MAX_WORKERS > 1 and len(chunk_args) > 1:
+        results = list(_get_executor().map(_run_chunk, chunk_args))
+    else:
+        results = [_run_chunk(args) for args in chunk_args]
+
+    checkpoint_balances = np.concatenate([r["checkpoint_balances"] for r in results])
+    first_hit = np.concatenate([r["first_hit"] for r in results])
+
+    hits = first_hit[first_hit > 0]
+    band_values = np.percentile(checkpoint_balances, PERCENTILES, axis=0)
+    bands = [
+        {"month": month, **{f"p{p}": round(float(band_values[i, j]), 2) for i, p in enumerate(PERCENTILES)}}
+        for j, month in enumerate(_checkpoint_months(months))
+    ]
+
+    return {
+        "probability": float(hits.size / n_paths),
+        "goal_amount": goal_amount,
+        "months": months,
+        "paths": n_paths,
+        "seed": seed_seq.entropy,
+        "median_months_to_goal": float(np.median(hits)) if hits.size else None,
+        "final_balance": bands[-1],
+        "bands": bands,
+    }
+
+def summarize_goal_simulation(simulation: Dict[str, Any]) -> str:
+    """Format a simulation result as report bullet points"""
+    final = simulation["final_balance"]
+    lines = [
+        f"• Probability of reaching the goal within {simulation['months']} months: {simulation['probability'] * 100:.1f}% "
+        f"({simulation['paths']:,} simulated scenarios)",
+        f"• Projected balance after {simulation['months']} months: ${final['p50']:,.2f} median "
+        f"(${final['p5']:,.2f} pessimistic - ${final['p95']:,.2f} optimistic)",
+    ]
+    if simulation["median_months_to_goal"] is not None:
+        lines.append(f"• Typical time to goal when reached: {simulation['median_months_to_goal']:.0f} months")
+    return '\n'.join(lines)
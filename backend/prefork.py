@@ -0,0 +1,94 @@
+"""
+Pre-forking launcher for the FastAPI services.
+The parent binds the listening socket and runs `preload` (for example loading a model), then forks the
+workers, so everything loaded before the fork is shared copy-on-write instead of loaded once per worker.
+Workers that exit are replaced; SIGINT/SIGTERM stop them all. POSIX only.
+
+The parent must not run torch or numpy computations before forking: thread pools started in the parent
+do not survive fork() and can deadlock the workers.
+"""
+import logging
+import os
+import signal
+import socket
+import time
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Respawning faster than this means the worker is crashing on startup
+MIN_WORKER_LIFETIME = 5.0
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+def _serve(app, sock: socket.socket, post_fork: Optional[Callable[[int], None]], index: int):
+    import uvicorn
+
+    if post_fork is not None:
+        post_fork(index)
+    config = uvicorn.Config(app, log_level="info")
+    uvicorn.Server(config).run(sockets=[sock])
+
+def run(app, host: str, port: int, workers: int, preload: Optional[Callable[[], None]] = None,
+        post_fork: Optional[Callable[[int], None]] = None):
+    """Serve `app` from `workers` forked processes sharing one socket; blocks until stopped"""
+    sock = bind_socket(host, port)
+    if preload is not None:
+        start = time.perf_counter()
+        preload()
+        logger.info(f"Preloaded in {time.perf_counter() - start:.1f}s; forking {workers} workers")
+
+    children = {}
+    stopping = False
+
+    def spawn(index: int):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            code = 0
+            try:
+                _serve(app, sock, post_fork, index)
+            except BaseException:
+                logger.exception(f"Worker {index} failed")
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = (index, time.monotonic())
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    for i in range(workers):
+        spawn(i)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        index, started = children.pop(pid, (None, 0.0))
+        if stopping or index is None:
+            continue
+        if time.monotonic() - started < MIN_WORKER_LIFETIME:
+            logger.error(f"Worker {index} (pid {pid}) exited during startup with status {status}; not restarting")
+            continue
+        logger.warning(f"Worker {index} (pid {pid}) exited with status {status}; restarting")
+        spawn(index)
+    sock.close()
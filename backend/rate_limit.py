@@ -0,0 +1,219 @@
+"""
+Per-tenant rate limiting and upstream admission control.
+Token buckets are keyed by API key (when it is one of FINANCEBOT_API_KEYS) or client IP, with separate
+budgets for cheap endpoints and LLM endpoints. A client holding a known key, such as the Streamlit frontend
+that serves every end user from one IP, can forward X-Client-Id to give each of its users their own budget.
+Bucket state lives in-process by default; set RATE_LIMIT_BACKEND=sqlite so several workers share one budget
+through RATE_LIMIT_DB, a WAL-mode file of its own so session writes and maintenance never hold it locked.
+The sqlite limiter blocks on disk I/O, so callers on the event loop go through check_request_async().
+Calls to Groq and Granite go through upstream_slot(), which caps concurrency per upstream and sheds
+load once too many callers are already waiting. Waiting for a slot blocks the thread, so it is only
+entered from sync code (the threadpool or report job workers), never directly from an async handler.
+"""
+import hashlib
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") != "0"
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_DB = os.getenv("RATE_LIMIT_DB", "ratelimit.db")
+
+# (requests per minute, burst) for each endpoint class
+BUDGETS = {
+    "cheap": (float(os.getenv("RATE_LIMIT_CHEAP_PER_MIN", "120")), float(os.getenv("RATE_LIMIT_CHEAP_BURST", "60"))),
+    "llm": (float(os.getenv("RATE_LIMIT_LLM_PER_MIN", "10")), float(os.getenv("RATE_LIMIT_LLM_BURST", "5"))),
+}
+
+# Endpoints that call Groq or Granite; everything else is cheap
+LLM_PATHS = {
+    "/chat",
+    "/generate-comprehensive-report",
+    "/generate-word-report",
+    "/analyze-my-finances",
+}
+EXEMPT_PATHS = {"/health"}
+
+API_KEYS = {k.strip() for k in os.getenv("FINANCEBOT_API_KEYS", "").split(",") if k.strip()}
+
+# In-process buckets are pruned once there are this many tenants
+MAX_BUCKETS = 10000
+
+class Overloaded(Exception):
+    """An upstream is at its concurrency cap with a full queue; retry after retry_after seconds"""
+    def __init__(self, upstream: str, retry_after: int):
+        super().__init__(f"{upstream} is busy, please retry in {retry_after} seconds")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+def endpoint_class(path: str):
+    """'llm', 'cheap', or None for paths that are never limited"""
+    if path in EXEMPT_PATHS:
+        return None
+    return "llm" if path in LLM_PATHS else "cheap"
+
+def is_known_key(api_key: str) -> bool:
+    return bool(api_key) and api_key in API_KEYS
+
+def tenant_key(api_key: str, client_ip: str, client_id: str = None) -> str:
+    """
+    Known API keys get their own budget (stored hashed), one per forwarded client id if the key holder
+    sends one; anything else is limited by client IP, since an unauthenticated client id could be rotated freely
+    """
+    if is_known_key(api_key):
+        tenant = "key:" + hashlib.sha256(api_key.encode()).hexdigest()[:16]
+        if client_id:
+            tenant += ":" + hashlib.sha256(client_id.encode()).hexdigest()[:16]
+        return tenant
+    return f"ip:{client_ip or 'unknown'}"
+
+def _refill(tokens: float, updated: float, now: float, rate: float, burst: float) -> float:
+    return min(burst, tokens + (now - updated) * rate)
+
+def _take(tokens: float, rate: float, cost: float) -> Tuple[bool, float, int]:
+    """(allowed, tokens left, seconds until the request would be allowed)"""
+    if tokens >= cost:
+        return True, tokens - cost, 0
+    return False, tokens, max(1, math.ceil((cost - tokens) / rate))
+
+class MemoryLimiter:
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def consume(self, bucket: str, per_minute: float, burst: float, cost: float = 1.0) -> Tuple[bool, float, int]:
+        rate = per_minute / 60.0
+        now = time.monotonic()
+        with self._lock:
+            if len(self._buckets) >= MAX_BUCKETS:
+                self._prune(now)
+            tokens, updated = self._buckets.get(bucket, (burst, now))
+            allowed, tokens, retry_after = _take(_refill(tokens, updated, now, rate, burst), rate, cost)
+            self._buckets[bucket] = (tokens, now)
+        return allowed, tokens, retry_after
+
+    def _prune(self, now: float):
+        """Drop buckets idle long enough to have refilled completely; they are equivalent to new ones"""
+        budgets = [burst / (per_minute / 60.0) for per_minute, burst in BUDGETS.values()]
+        idle = max(budgets)
+        self._buckets = {b: v for b, v in self._buckets.items() if now - v[1] < idle}
+
+class SQLiteLimiter:
+    """Buckets in a shared SQLite table so every worker process draws from the same budget"""
+    def __init__(self, db_path: str = RATE_LIMIT_DB):
+        # Transactions here last microseconds, so a long wait means something is wrong: fail open quickly
+        self._conn = sqlite3.connect(db_path, timeout=1, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        # Buckets refill on their own, so losing the last commits in a power cut costs nothing
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.execute('''CREATE TABLE IF NOT EXISTS rate_limit_buckets (
+            bucket TEXT PRIMARY KEY,
+            tokens REAL NOT NULL,
+            updated REAL NOT NULL
+        ) WITHOUT ROWID''')
+
+    def close(self):
+        self._conn.close()
+
+    def consume(self, bucket: str, per_minute: float, burst: float, cost: float = 1.0) -> Tuple[bool, float, int]:
+        rate = per_minute / 60.0
+        with self._lock:
+            # Wall clock, since monotonic time is not comparable across processes
+            now = time.time()
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+                row = self._conn.execute("SELECT tokens, updated FROM rate_limit_buckets WHERE bucket = ?", (bucket,)).fetchone()
+                tokens, updated = row if row else (burst, now)
+                allowed, tokens, retry_after = _take(_refill(tokens, updated, now, rate, burst), rate, cost)
+                self._conn.execute("""
+                    INSERT INTO rate_limit_buckets (bucket, tokens, updated) VALUES (?, ?, ?)
+                    ON CONFLICT(bucket) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated
+                """, (bucket, tokens, now))
+                self._conn.execute("COMMIT")
+            except sqlite3.OperationalError as e:
+                # A locked database should not take the API down with it: fail open
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+                logger.warning(f"Rate limiter unavailable: {e}")
+                return True, burst, 0
+        return allowed, tokens, retry_after
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+def get_limiter():
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = SQLiteLimiter() if RATE_LIMIT_BACKEND == "sqlite" else MemoryLimiter()
+    return _limiter
+
+def check_request(path: str, api_key: str, client_ip: str, client_id: str = None) -> Tuple[bool, dict]:
+    """Charge one request against the caller's budget; returns (allowed, response headers)"""
+    cls = endpoint_class(path)
+    if not RATE_LIMIT_ENABLED or cls is None:
+        return True, {}
+    per_minute, burst = BUDGETS[cls]
+    allowed, remaining, retry_after = get_limiter().consume(f"{tenant_key(api_key, client_ip, client_id)}:{cls}", per_minute, burst)
+    headers = {"X-RateLimit-Limit": str(int(per_minute)), "X-RateLimit-Remaining": str(int(remaining))}
+    if not allowed:
+        headers["Retry-After"] = str(retry_after)
+    return allowed, headers
+
+async def check_request_async(path: str, api_key: str, client_ip: str, client_id: str = None) -> Tuple[bool, dict]:
+    """check_request() for async code: the sqlite backend runs in the threadpool instead of on the event loop"""
+    if RATE_LIMIT_BACKEND != "sqlite":
+        return check_request(path, api_key, client_ip, client_id)
+    return await run_in_threadpool(check_request, path, api_key, client_ip, client_id)
+
+class UpstreamGate:
+    """At most `capacity` concurrent calls; callers beyond that wait, and beyond `max_queue` waiters are shed"""
+    def __init__(self, name: str, capacity: int, max_queue: int, wait_timeout: float, retry_after: int):
+        self.name = name
+        self.capacity = capacity
+        self.max_queue = max_queue
+        self.wait_timeout = wait_timeout
+        self.retry_after = retry_after
+        self._slots = threading.BoundedSemaphore(capacity)
+        self._lock = threading.Lock()
+        self._waiting = 0
+
+    @contextmanager
+    def slot(self):
+        with self._lock:
+            if self._waiting >= self.max_queue:
+                raise Overloaded(self.name, self.retry_after)
+            self._waiting += 1
+        try:
+            acquired = self._slots.acquire(timeout=self.wait_timeout)
+        finally:
+            with self._lock:
+                self._waiting -= 1
+        if not acquired:
+            raise Overloaded(self.name, self.retry_after)
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+UPSTREAMS = {
+    "groq": UpstreamGate("groq", int(os.getenv("GROQ_MAX_CONCURRENCY", "4")), int(os.getenv("GROQ_MAX_QUEUE", "16")),
+                         float(os.getenv("UPSTREAM_WAIT_TIMEOUT", "30")), int(os.getenv("UPSTREAM_RETRY_AFTER", "10"))),
+    # Granite runs on local CPU, so more than one generation at a time only slows every caller down
+    "granite": UpstreamGate("granite", int(os.getenv("GRANITE_MAX_CONCURRENCY", "1")), int(os.getenv("GRANITE_MAX_QUEUE", "4")),
+                            float(os.getenv("UPSTREAM_WAIT_TIMEOUT", "30")), int(os.getenv("UPSTREAM_RETRY_AFTER", "10"))),
+}
+
+def upstream_slot(name: str):
+    """Context manager holding one concurrency slot on the named upstream; raises Overloaded when shedding"""
+    return UPSTREAMS[name].slot()
@@ -0,0 +1,201 @@
+import datetime
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = "financebot.db"
+
+# Bounded worker pool: at most REPORT_WORKERS reports generate at once and MAX_PENDING_JOBS wait
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "2"))
+MAX_PENDING_JOBS = int(os.getenv("MAX_PENDING_JOBS", "20"))
+JOB_TTL_HOURS = float(os.getenv("REPORT_JOB_TTL_HOURS", "24"))
+# Every worker process heartbeats in report_workers; queued and running jobs of a worker silent for
+# WORKER_TIMEOUT seconds (stopped, crashed or restarted) are marked failed by the workers still alive
+WORKER_TIMEOUT = float(os.getenv("REPORT_WORKER_TIMEOUT", "30"))
+
+_executor = ThreadPoolExecutor(max_workers=REPORT_WORKERS, thread_name_prefix="report-job")
+_pending = 0
+_pending_lock = threading.Lock()
+# (pid, id) of this worker; a forked child gets its own id
+_worker = None
+_heartbeat_thread = None
+
+class QueueFullError(Exception):
+    pass
+
+def get_connection() -> sqlite3.Connection:
+    conn = sqlite3.connect(DB_PATH)
+    init_jobs_schema(conn)
+    return conn
+
+def init_jobs_schema(conn: sqlite3.Connection):
+    conn.execute('''CREATE TABLE IF NOT EXISTS report_jobs (
+        id TEXT PRIMARY KEY,
+        kind TEXT NOT NULL,
+        status TEXT NOT NULL,
+        result TEXT,
+        docx BLOB,
+        error TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        finished_at TIMESTAMP,
+        expires_at TIMESTAMP
+    )''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_report_jobs_expires_at ON report_jobs (expires_at)")
+    if "worker_id" not in {row[1] for row in conn.execute("PRAGMA table_info(report_jobs)")}:
+        conn.execute("ALTER TABLE report_jobs ADD COLUMN worker_id TEXT")
+    conn.execute('''CREATE TABLE IF NOT EXISTS report_workers (
+        id TEXT PRIMARY KEY,
+        pid INTEGER,
+        started_at REAL,
+        heartbeat_at REAL NOT NULL
+    )''')
+
+def worker_id() -> str:
+    global _worker
+    if _worker is None or _worker[0] != os.getpid():
+        _worker = (os.getpid(), uuid.uuid4().hex)
+    return _worker[1]
+
+def _utcnow() -> str:
+    return datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+
+def _expiry() -> str:
+    return (datetime.datetime.utcnow() + datetime.timedelta(hours=JOB_TTL_HOURS)).strftime("%Y-%m-%d %H:%M:%S")
+
+def submit_job(kind: str, fn: Callable[..., Dict[str, Any]], *args) -> str:
+    """Queue fn(*args) on the worker pool and return the job ID immediately"""
+    global _pending
+    with _pending_lock:
+        if _pending >= MAX_PENDING_JOBS:
+            raise QueueFullError(f"{_pending} report jobs are already queued; try again shortly")
+        _pending += 1
+
+    job_id = uuid.uuid4().hex
+    try:
+        conn = get_connection()
+        with conn:
+            conn.execute("DELETE FROM report_jobs WHERE expires_at < ?", (_utcnow(),))
+            conn.execute("INSERT INTO report_jobs (id, kind, status, created_at, worker_id) VALUES (?, ?, 'queued', ?, ?)",
+                         (job_id, kind, _utcnow(), worker_id()))
+        conn.close()
+        _executor.submit(_run_job, job_id, fn, args)
+    except Exception:
+        with _pending_lock:
+            _pending -= 1
+        raise
+    return job_id
+
+def _run_job(job_id: str, fn: Callable[..., Dict[str, Any]], args: tuple):
+    global _pending
+    conn = get_connection()
+    try:
+        with conn:
+            conn.execute("UPDATE report_jobs SET status = 'running' WHERE id = ?", (job_id,))
+        result = fn(*args)
+
+        # Word reports come back as a file on disk; keep the bytes with the job
+        docx = None
+        docx_path = result.pop("docx_path", None)
+        if docx_path:
+            with open(docx_path, "rb") as f:
+                docx = f.read()
+            result["filename"] = os.path.basename(docx_path)
+
+        status = "failed" if result.get("status") == "error" else "done"
+        with conn:
+            conn.execute("""
+                UPDATE report_jobs SET status = ?, result = ?, docx = ?, error = ?, finished_at = ?, expires_at = ?
+                WHERE id = ?
+            """, (status, json.dumps(result), docx, result.get("error"), _utcnow(), _expiry(), job_id))
+    except Exception as e:
+        with conn:
+            conn.execute("""
+                UPDATE report_jobs SET status = 'failed', error = ?, finished_at = ?, expires_at = ? WHERE id = ?
+            """, (str(e), _utcnow(), _expiry(), job_id))
+    finally:
+        conn.close()
+        with _pending_lock:
+            _pending -= 1
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Job status and, once finished, its result (without the DOCX bytes)"""
+    conn = get_connection()
+    row = conn.execute("""
+        SELECT id, kind, status, result, error, created_at, finished_at, expires_at, docx IS NOT NULL
+        FROM report_jobs WHERE id = ? AND (expires_at IS NULL OR expires_at >= ?)
+    """, (job_id, _utcnow())).fetchone()
+    conn.close()
+    if row is None:
+        return None
+    return {
+        "job_id": row[0],
+        "kind": row[1],
+        "status": row[2],
+        "result": json.loads(row[3]) if row[3] else None,
+        "error": row[4],
+        "created_at": row[5],
+        "finished_at": row[6],
+        "expires_at": row[7],
+        "has_docx": bool(row[8]),
+    }
+
+def get_job_docx(job_id: str) -> Optional[tuple]:
+    """(filename, bytes) of a finished Word report job"""
+    conn = get_connection()
+    row = conn.execute("SELECT result, docx FROM report_jobs WHERE id = ? AND docx IS NOT NULL AND expires_at >= ?",
+                       (job_id, _utcnow())).fetchone()
+    conn.close()
+    if row is None:
+        return None
+    return json.loads(row[0]).get("filename", f"financial_report_{job_id}.docx"), row[1]
+
+def heartbeat(conn: sqlite3.Connection):
+    now = time.time()
+    with conn:
+        conn.execute("""
+            INSERT INTO report_workers (id, pid, started_at, heartbeat_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET heartbeat_at = excluded.heartbeat_at
+        """, (worker_id(), os.getpid(), now, now))
+        conn.execute("DELETE FROM report_workers WHERE heartbeat_at < ?", (now - 10 * WORKER_TIMEOUT,))
+
+def fail_interrupted_jobs():
+    """Mark jobs left queued or running by a worker that is no longer alive as failed"""
+    conn = get_connection()
+    try:
+        heartbeat(conn)
+        with conn:
+            conn.execute("""
+                UPDATE report_jobs SET status = 'failed', error = 'Interrupted by a server restart', finished_at = ?,
+                    expires_at = ?
+                WHERE status IN ('queued', 'running') AND (worker_id IS NULL OR worker_id NOT IN (
+                    SELECT id FROM report_workers WHERE heartbeat_at >= ?
+                ))
+            """, (_utcnow(), _expiry(), time.time() - WORKER_TIMEOUT))
+    finally:
+        conn.close()
+
+def start_heartbeat():
+    """Heartbeat this worker and fail the jobs of dead workers now and every WORKER_TIMEOUT / 3 seconds"""
+    global _heartbeat_thread
+    if _heartbeat_thread is not None and _heartbeat_thread.is_alive():
+        return
+    fail_interrupted_jobs()
+
+    def loop():
+        while True:
+            time.sleep(WORKER_TIMEOUT / 3)
+            try:
+                fail_interrupted_jobs()
+            except sqlite3.Error as e:
+                logger.warning(f"Report worker heartbeat failed: {e}")
+
+    _heartbeat_thread = threading.Thread(target=loop, name="report-heartbeat", daemon=True)
+    _heartbeat_thread.start()
@@ -0,0 +1,156 @@
+"""
+Deterministic report sections shared by the Granite service (app1.py) and the FastAPI backend.
+A report's "key: value" raw content is parsed once into a FinancialProfile; every section
+(analysis, recommendations, action items) then comes from one pass over the RULES table, so the
+thresholds live in one place. Nothing here does I/O.
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+
+NUMERIC_FIELDS = ("income", "expenses", "goal_amount", "goal_months")
+
+class FinancialProfile:
+    """Typed report inputs with the derived ratios computed once"""
+    __slots__ = ("user_type", "income", "expenses", "goal", "goal_amount", "goal_months", "spending_categories",
+                 "subscriptions", "valid", "savings", "savings_rate", "expense_ratio")
+
+    def __init__(self, user_type: str = "general", income: float = 0.0, expenses: float = 0.0, goal: str = "",
+                 goal_amount: Optional[float] = None, goal_months: int = 12, spending_categories: str = "",
+                 subscriptions: str = "", valid: bool = True):
+        self.user_type = (user_type or "general").lower()
+        self.income = income
+        self.expenses = expenses
+        self.goal = goal or ""
+        self.goal_amount = goal_amount
+        self.goal_months = goal_months
+        self.spending_categories = spending_categories or ""
+        self.subscriptions = subscriptions or ""
+        self.valid = valid
+        self.savings = income - expenses
+        self.savings_rate = self.savings / income * 100 if income else 0.0
+        self.expense_ratio = expenses / income * 100 if income else 0.0
+
+    @classmethod
+    def parse(cls, raw_content: str) -> "FinancialProfile":
+        """Profile from "key: value" lines; unparseable income or expenses mark the profile invalid"""
+        fields = {}
+        for line in raw_content.strip().split("\n"):
+            if ":" in line:
+                key, value = line.split(":", 1)
+                fields[key.strip().lower()] = value.strip()
+
+        numbers, valid = {}, True
+        for name in NUMERIC_FIELDS:
+            value = fields.get(name)
+            if not value:
+                continue
+            try:
+                numbers[name] = float(value)
+            except ValueError:
+                if name in ("income", "expenses"):
+                    valid = False
+        return cls(
+            user_type=fields.get("user_type", "general"),
+            income=numbers.get("income", 0.0),
+            expenses=numbers.get("expenses", 0.0),
+            goal=fields.get("goal", ""),
+            goal_amount=numbers.get("goal_amount"),
+            goal_months=int(numbers.get("goal_months", 12)),
+            spending_categories=fields.get("spending_categories", ""),
+            subscriptions=fields.get("subscriptions", ""),
+            valid=valid,
+        )
+
+    @property
+    def analyzable(self) -> bool:
+        return self.valid and self.income != 0
+
+    @property
+    def months_to_goal(self) -> float:
+        return (self.goal_amount or 0) / self.savings if self.savings > 0 else float("inf")
+
+Predicate = Callable[[FinancialProfile], bool]
+
+def _always(p: FinancialProfile) -> bool:
+    return True
+
+# (section, guard, cases): when the guard holds, the first case whose predicate matches adds its
+# template, formatted with the profile as `p`. Templates may span several lines.
+RULES: List[Tuple[str, Predicate, Tuple[Tuple[Predicate, str], ...]]] = [
+    ("analysis", lambda p: not p.analyzable, (
+        (lambda p: not p.valid, "• Unable to analyze due to invalid financial data"),
+        (_always, "• Insufficient data for comprehensive analysis"),
+    )),
+    ("analysis", lambda p: p.analyzable, (
+        (lambda p: p.savings_rate > 20, "• Excellent savings rate: {p.savings_rate:.1f}% (Above recommended 20%)"),
+        (lambda p: p.savings_rate > 10, "• Good savings rate: {p.savings_rate:.1f}% (Above minimum 10%)"),
+        (lambda p: p.savings_rate > 0, "• Low savings rate: {p.savings_rate:.1f}% (Below recommended 10%)"),
+        (_always, "• Negative savings: {p.savings_rate:.1f}% (Expenses exceed income)"),
+    )),
+    ("analysis", lambda p: p.analyzable, (
+        (_always, "• Expense ratio: {p.expense_ratio:.1f}% of income"),
+    )),
+    ("analysis", lambda p: p.analyzable, (
+        (lambda p: p.expense_ratio > 80, "• High expense ratio - requires immediate attention"),
+        (lambda p: p.expense_ratio > 70, "• Moderate expense ratio - room for improvement"),
+        (_always, "• Healthy expense ratio - good financial discipline"),
+    )),
+
+    ("recommendations", lambda p: not p.valid, (
+        (_always, "• Ensure accurate financial data for better recommendations"),
+    )),
+    ("recommendations", lambda p: p.valid, (
+        (lambda p: p.income > p.expenses,
+         "• Continue maintaining positive cash flow\n• Consider increasing savings rate to 20% if possible"),
+        (_always, "• Urgent: Review and reduce monthly expenses\n• Create a detailed budget to track spending"),
+    )),
+    ("recommendations", lambda p: p.valid, (
+        (lambda p: p.user_type == "student",
+         "• Focus on building emergency fund (3-6 months expenses)\n• Consider part-time income opportunities\n"
+         "• Look into student-specific financial products"),
+        (lambda p: p.user_type == "professional",
+         "• Maximize employer retirement contributions\n• Consider diversifying income streams\n"
+         "• Review insurance coverage adequacy"),
+    )),
+    ("recommendations", lambda p: p.valid and (p.goal_amount or 0) > 0, (
+        (_always, "• To reach your goal in 1 year, save ${monthly_goal:.2f} monthly"),
+    )),
+    ("recommendations", lambda p: p.valid and p.savings_rate > 15, (
+        (_always, "• Explore investment options to reach your goal sooner"),
+    )),
+
+    ("actions", lambda p: p.valid and p.expenses >= p.income, (
+        (_always, "PRIORITY: Immediately reduce expenses or increase income"),
+    )),
+    ("actions", _always, (
+        (_always, "1. Set up automatic savings transfer for consistent saving habit\n"
+                  "2. Review and categorize all monthly expenses\n"
+                  "3. Create a monthly budget and stick to it\n"
+                  "4. Track progress toward financial goals weekly\n"
+                  "5. Review and update financial plan quarterly"),
+    )),
+    ("actions", lambda p: p.valid and bool(p.goal) and not p.goal_amount, (
+        (_always, "6. Define specific monetary target for your financial goal"),
+    )),
+]
+
+SECTIONS = ("analysis", "recommendations", "actions")
+
+def evaluate(profile: FinancialProfile) -> Dict[str, List[str]]:
+    """Lines of every section, from a single pass over RULES"""
+    sections = {name: [] for name in SECTIONS}
+    values = {"p": profile, "monthly_goal": (profile.goal_amount or 0) / 12}
+    for section, guard, cases in RULES:
+        if not guard(profile):
+            continue
+        for predicate, template in cases:
+            if predicate(profile):
+                sections[section].extend(template.format(**values).split("\n"))
+                break
+    return sections
+
+def health_rating(profile: FinancialProfile) -> str:
+    if profile.savings_rate > 20:
+        return "🟢 EXCELLENT"
+    if profile.savings_rate > 10:
+        return "🟡 GOOD"
+    return "🔴 NEEDS IMPROVEMENT"
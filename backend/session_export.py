@@ -0,0 +1,271 @@
+"""
+Bulk export and import of saved sessions.
+Export walks the sessions table by id (keyset pagination, one batch in memory at a time) and writes
+either NDJSON, one session per line, or columnar NDJSON, one line per batch holding a list per column.
+Import accepts both formats and inserts with executemany, one transaction per batch; a batch that hits
+a constraint is written again row by row, so only the offending sessions are skipped (and their ids reported).
+    python session_export.py export --format columnar -o sessions.ndjson
+    python session_export.py import sessions.ndjson --keep-ids
+"""
+import argparse
+import json
+import sqlite3
+import sys
+from typing import Any, Dict, Iterable, Iterator, List
+
+import history_codec
+
+DB_PATH = "financebot.db"
+COLUMNS = ["id", "user_type", "chat_history", "income", "expenses", "goal", "goal_amount", "created_at"]
+FORMATS = ("ndjson", "columnar")
+DEFAULT_BATCH_SIZE = 1000
+MAX_BATCH_SIZE = 10000
+# Import errors reported back to the caller; the rest are only counted
+MAX_REPORTED_ERRORS = 20
+
+def ensure_sessions_table(conn: sqlite3.Connection):
+    """The sessions table as database/setup.py creates it, so an export can be loaded into a new database"""
+    conn.execute('''CREATE TABLE IF NOT EXISTS sessions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_type TEXT,
+        chat_history TEXT,
+        income REAL,
+        expenses REAL,
+        goal TEXT,
+        goal_amount REAL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        chat_history_z BLOB
+    )''')
+    history_codec.init_column(conn)
+
+_SELECT = f"SELECT {', '.join(COLUMNS)}, chat_history_z FROM sessions"
+_CHAT = COLUMNS.index("chat_history")
+
+def _decoded(rows: List[tuple]) -> List[tuple]:
+    """Rows in COLUMNS order with compacted chat histories decompressed"""
+    return [row[:_CHAT] + (history_codec.decode(row[_CHAT], row[-1]),) + row[_CHAT + 1:-1] for row in rows]
+
+def rows_by_id(conn: sqlite3.Connection, ids: List[int]) -> List[tuple]:
+    placeholders = ", ".join("?" * len(ids))
+    return _decoded(conn.execute(f"{_SELECT} WHERE id IN ({placeholders}) ORDER BY id", ids).fetchall())
+
+def ndjson_lines(rows: List[tuple]) -> bytes:
+    return "".join(json.dumps(dict(zip(COLUMNS, row)), ensure_ascii=False) + "\n" for row in rows).encode("utf-8")
+
+def iter_batches(conn: sqlite3.Connection, after_id: int = 0, batch_size: int = DEFAULT_BATCH_SIZE,
+                 limit: int = None) -> Iterator[List[tuple]]:
+    """Rows of sessions with id > after_id in id order, batch_size rows at a time"""
+    history_codec.init_column(conn)
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = batch_size if remaining is None else min(batch_size, remaining)
+        rows = _decoded(conn.execute(f"{_SELECT} WHERE id > ? ORDER BY id LIMIT ?", (after_id, size)).fetchall())
+        if not rows:
+            return
+        yield rows
+        after_id = rows[-1][0]
+        if remaining is not None:
+            remaining -= len(rows)
+        if len(rows) < size:
+            return
+
+def export_lines(conn: sqlite3.Connection, fmt: str = "ndjson", after_id: int = 0,
+                 batch_size: int = DEFAULT_BATCH_SIZE, limit: int = None) -> Iterator[bytes]:
+    """Encoded export, one chunk of lines per batch"""
+    return encode_batches(iter_batches(conn, after_id, batch_size, limit), fmt)
+
+def encode_batches(batches: Iterable[List[tuple]], fmt: str = "ndjson") -> Iterator[bytes]:
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}. Use one of {', '.join(FORMATS)}")
+    for rows in batches:
+        if fmt == "columnar":
+            chunk = {"columns": COLUMNS, "rows": len(rows), "data": [list(col) for col in zip(*rows)]}
+            yield (json.dumps(chunk, ensure_ascii=False) + "\n").encode("utf-8")
+        else:
+            yield ndjson_lines(rows)
+
+def parse_line(line: str) -> List[Dict[str, Any]]:
+    """Sessions in one line of either export format"""
+    obj = json.loads(line)
+    if not isinstance(obj, dict):
+        raise ValueError("each line must be a JSON object")
+    if "columns" in obj and "data" in obj:
+        columns, data = obj["columns"], obj["data"]
+        if len(columns) != len(data) or len({len(col) for col in data}) > 1:
+            raise ValueError("columnar chunk has mismatched columns")
+        return [dict(zip(columns, values)) for values in zip(*data)]
+    return [obj]
+
+def _row(session: Dict[str, Any], keep_ids: bool) -> tuple:
+    values = (
+        session.get("user_type") or "student",
+        session.get("chat_history") or "",
+        float(session.get("income") or 0),
+        float(session.get("expenses") or 0),
+        session.get("goal") or "",
+        float(session.get("goal_amount") or 0),
+        session.get("created_at"),
+    )
+    if keep_ids:
+        return (int(session["id"]),) + values
+    return values
+
+def _insert_sql(keep_ids: bool) -> str:
+    if keep_ids:
+        # Re-importing an export updates the rows in place instead of duplicating them
+        return """
+            INSERT INTO sessions (id, user_type, chat_history, income, expenses, goal, goal_amount, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+            ON CONFLICT(id) DO UPDATE SET user_type = excluded.user_type, chat_history = excluded.chat_history,
+                income = excluded.income, expenses = excluded.expenses, goal = excluded.goal,
+                goal_amount = excluded.goal_amount, created_at = excluded.created_at, chat_history_z = NULL
+        """
+    return """
+        INSERT INTO sessions (user_type, chat_history, income, expenses, goal, goal_amount, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+    """
+
+class SessionImporter:
+    """Accumulates parsed sessions and writes them batch_size at a time, one transaction per batch"""
+    def __init__(self, conn: sqlite3.Connection, keep_ids: bool = False, batch_size: int = 5000):
+        self.conn = conn
+        self.keep_ids = keep_ids
+        self.batch_size = batch_size
+        self.sql = _insert_sql(keep_ids)
+        self.pending: List[tuple] = []
+        self.imported = 0
+        self.failed = 0
+        self.errors: List[str] = []
+        # Ids of sessions that could not be written (with keep_ids), up to MAX_REPORTED_ERRORS
+        self.skipped_ids: List[int] = []
+        self.line_number = 0
+
+    def _error(self, message: str, at_line: bool = True):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"line {self.line_number}: {message}" if at_line else message)
+
+    def add_line(self, line: str):
+        self.line_number += 1
+        if not line.strip():
+            return
+        try:
+            sessions = parse_line(line)
+        except (TypeError, ValueError) as e:
+            self._error(str(e))
+            return
+        for session in sessions:
+            try:
+                self.pending.append(_row(session, self.keep_ids))
+            except (KeyError, TypeError, ValueError) as e:
+                self._error(f"invalid session ({e!r})")
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def add_lines(self, lines: Iterable[str]):
+        for line in lines:
+            self.add_line(line)
+
+    def flush(self):
+        if not self.pending:
+            return
+        self._write(self.conn, self.pending)
+        self.pending = []
+
+    def _insert(self, conn: sqlite3.Connection, rows: List[tuple]):
+        with conn:
+            if self.keep_ids:
+                # Rows replaced in place must not be compacted, or their old chat text stays in the search index
+                history_codec.expand(conn, [row[0] for row in rows])
+            conn.executemany(self.sql, rows)
+
+    def _write(self, conn: sqlite3.Connection, rows: List[tuple]):
+        try:
+            self._insert(conn, rows)
+            self.imported += len(rows)
+        except sqlite3.IntegrityError:
+            # The whole batch was rolled back; write it again one row at a time to skip only the bad rows
+            for row in rows:
+                try:
+                    self._insert(conn, [row])
+                    self.imported += 1
+                except sqlite3.IntegrityError as e:
+                    self._skip(row, str(e))
+
+    def _skip(self, row: tuple, reason: str):
+        # Rows are written in batches, long after the line they came from was read
+        if self.keep_ids:
+            self._error(f"session {row[0]} rejected: {reason}", at_line=False)
+            if len(self.skipped_ids) < MAX_REPORTED_ERRORS:
+                self.skipped_ids.append(row[0])
+        else:
+            self._error(f"session rejected: {reason}", at_line=False)
+
+    def summary(self) -> dict:
+        summary = {"imported": self.imported, "failed": self.failed, "errors": self.errors}
+        if self.keep_ids:
+            summary["skipped_ids"] = self.skipped_ids
+        return summary
+
+def import_lines(conn: sqlite3.Connection, lines: Iterable[str], keep_ids: bool = False, batch_size: int = 5000) -> dict:
+    importer = SessionImporter(conn, keep_ids, batch_size)
+    for line in lines:
+        importer.add_line(line)
+    importer.flush()
+    return importer.summary()
+
+class LineSplitter:
+    """Splits a stream of byte chunks, which may break lines (and UTF-8 characters) anywhere, into lines"""
+    def __init__(self):
+        self._partial: List[bytes] = []
+
+    def feed(self, chunk: bytes) -> List[str]:
+        if b"\n" not in chunk:
+            # Long lines (a columnar batch, a long chat history) arrive over many chunks
+            self._partial.append(chunk)
+            return []
+        first, *lines, rest = chunk.split(b"\n")
+        lines.insert(0, b"".join(self._partial + [first]))
+        self._partial = [rest]
+        return [line.decode("utf-8") for line in lines]
+
+    def close(self) -> List[str]:
+        tail = b"".join(self._partial)
+        self._partial = []
+        return [tail.decode("utf-8")] if tail else []
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk session export/import")
+    parser.add_argument("--db", default=DB_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="Write sessions as NDJSON")
+    export.add_argument("--format", choices=FORMATS, default="ndjson")
+    export.add_argument("--after-id", type=int, default=0)
+    export.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    export.add_argument("-o", "--output", default="-", help="Output file (default stdout)")
+    imp = sub.add_parser("import", help="Read sessions from an export")
+    imp.add_argument("input", help="Export file, or - for stdin")
+    imp.add_argument("--keep-ids", action="store_true", help="Keep exported ids, updating existing sessions")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    try:
+        if args.command == "export":
+            f = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+            try:
+                for chunk in export_lines(conn, args.format, args.after_id, args.batch_size):
+                    f.write(chunk)
+            finally:
+                if f is not sys.stdout.buffer:
+                    f.close()
+        else:
+            ensure_sessions_table(conn)
+            f = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+            with f:
+                result = import_lines(conn, (line.rstrip("\n") for line in f), args.keep_ids)
+            print(json.dumps(result, indent=2))
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
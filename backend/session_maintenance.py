@@ -0,0 +1,322 @@
+"""
+Retention, compaction and archival for saved sessions and generated reports.
+One maintenance run:
+1. compresses the chat history of sessions older than SESSION_COMPRESS_AFTER_DAYS into chat_history_z,
+2. archives sessions older than SESSION_ARCHIVE_AFTER_DAYS to archive/sessions-*.ndjson.gz (the
+   session_export format, so an archive can be imported again) and deletes them with their transactions,
+3. deletes Word reports in reports/ older than REPORT_RETENTION_DAYS,
+4. returns free pages to the filesystem with an incremental VACUUM (databases not yet in incremental
+   auto-vacuum mode are skipped; convert them once with the `convert` command while the backend is stopped),
+on financebot.db and every session shard (archives of shard N are named shard-N-*.ndjson.gz),
+and records what it reclaimed in the maintenance_runs table. The backend runs it every
+SESSION_MAINTENANCE_INTERVAL_HOURS; with several workers only one of them runs it per interval.
+Compacted sessions stay readable everywhere and stay searchable: the search index keeps their chat text.
+    python session_maintenance.py run [--dry-run]
+    python session_maintenance.py convert
+"""
+import argparse
+import datetime
+import gzip
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import history_codec
+import session_export
+import session_shards
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = "financebot.db"
+ARCHIVE_DIR = Path(os.getenv("SESSION_ARCHIVE_DIR", "archive"))
+REPORTS_DIR = Path("reports")
+
+COMPRESS_AFTER_DAYS = float(os.getenv("SESSION_COMPRESS_AFTER_DAYS", "90"))
+# 0 keeps sessions forever
+ARCHIVE_AFTER_DAYS = float(os.getenv("SESSION_ARCHIVE_AFTER_DAYS", "730"))
+REPORT_RETENTION_DAYS = float(os.getenv("REPORT_RETENTION_DAYS", "30"))
+INTERVAL_HOURS = float(os.getenv("SESSION_MAINTENANCE_INTERVAL_HOURS", "24"))
+# Shorter histories gain little from compression
+MIN_COMPRESS_BYTES = 512
+BATCH_SIZE = 500
+# Free pages returned per incremental_vacuum step, so the write lock is released between steps
+VACUUM_STEP_PAGES = 2000
+
+# Tables holding per-session data that is deleted along with an archived session
+SESSION_CHILD_TABLES = ("transactions", "monthly_spending", "recurring_charge_clusters", "subscription_watermarks")
+
+def init_maintenance_schema(conn: sqlite3.Connection):
+    history_codec.init_column(conn)
+    with conn:
+        conn.execute('''CREATE TABLE IF NOT EXISTS maintenance_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            started_at REAL NOT NULL,
+            finished_at REAL,
+            stats TEXT
+        )''')
+
+def _cutoff(days: float) -> str:
+    return (datetime.datetime.utcnow() - datetime.timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+
+def database_size(conn: sqlite3.Connection) -> Dict[str, int]:
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    return {
+        "file_bytes": conn.execute("PRAGMA page_count").fetchone()[0] * page_size,
+        "free_bytes": conn.execute("PRAGMA freelist_count").fetchone()[0] * page_size,
+    }
+
+def probe_latency_ms(conn: sqlite3.Connection, repeat: int = 3) -> float:
+    """Best time of a full scan over sessions, the access pattern that row size slows down most"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute("SELECT COUNT(*), SUM(income) FROM sessions WHERE goal_amount >= 0").fetchone()
+        timings.append(time.perf_counter() - start)
+    return round(min(timings) * 1000, 3)
+
+def compress_histories(conn: sqlite3.Connection, days: float = COMPRESS_AFTER_DAYS, dry_run: bool = False) -> Dict[str, int]:
+    """Move long chat histories of old sessions into chat_history_z"""
+    cutoff, after_id = _cutoff(days), 0
+    stats = {"sessions": 0, "bytes_before": 0, "bytes_after": 0}
+    while True:
+        rows = conn.execute("""
+            SELECT id, chat_history FROM sessions
+            WHERE id > ? AND created_at < ? AND chat_history IS NOT NULL AND length(chat_history) >= ?
+            ORDER BY id LIMIT ?
+        """, (after_id, cutoff, MIN_COMPRESS_BYTES, BATCH_SIZE)).fetchall()
+        if not rows:
+            return stats
+        after_id = rows[-1][0]
+        updates = []
+        for session_id, text in rows:
+            blob = history_codec.encode(text)
+            stats["sessions"] += 1
+            stats["bytes_before"] += len(text.encode("utf-8"))
+            stats["bytes_after"] += len(blob)
+            updates.append((blob, session_id))
+        if not dry_run:
+            with conn:
+                conn.executemany("UPDATE sessions SET chat_history = NULL, chat_history_z = ? WHERE id = ?", updates)
+
+def archive_sessions(conn: sqlite3.Connection, days: float = ARCHIVE_AFTER_DAYS, archive_dir: Path = ARCHIVE_DIR,
+                     dry_run: bool = False, child_conn: sqlite3.Connection = None, label: str = "sessions") -> Dict[str, Any]:
+    """
+    Write expired sessions to a gzipped NDJSON archive, then delete them and their per-session data.
+    child_conn holds the per-session tables when they live in another database than the sessions (shards).
+    """
+    child_conn = child_conn or conn
+    stats = {"sessions": 0, "file": None}
+    if days <= 0:
+        return stats
+    cutoff = _cutoff(days)
+    expired = [row[0] for row in conn.execute("SELECT id FROM sessions WHERE created_at < ? ORDER BY id", (cutoff,))]
+    if not expired or dry_run:
+        stats["sessions"] = len(expired)
+        return stats
+
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    path = archive_dir / f"{label}-{datetime.datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.ndjson.gz"
+    tmp = path.with_name(path.name + ".tmp")
+    with gzip.open(tmp, "wb") as f:
+        for start in range(0, len(expired), BATCH_SIZE):
+            f.write(session_export.ndjson_lines(session_export.rows_by_id(conn, expired[start:start + BATCH_SIZE])))
+    # The archive must be complete on disk before anything is deleted
+    os.replace(tmp, path)
+
+    tables = {row[0] for row in child_conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    for start in range(0, len(expired), BATCH_SIZE):
+        batch = [(session_id,) for session_id in expired[start:start + BATCH_SIZE]]
+        with child_conn:
+            for table in SESSION_CHILD_TABLES:
+                if table in tables:
+                    child_conn.executemany(f"DELETE FROM {table} WHERE session_id = ?", batch)
+        with conn:
+            # Restores compacted chat text so the search triggers can remove it from the index
+            history_codec.expand(conn, [session_id for session_id, in batch])
+            conn.executemany("DELETE FROM sessions WHERE id = ?", batch)
+    stats.update(sessions=len(expired), file=str(path))
+    return stats
+
+def prune_reports(days: float = REPORT_RETENTION_DAYS, reports_dir: Path = REPORTS_DIR, dry_run: bool = False) -> Dict[str, int]:
+    stats = {"files": 0, "bytes": 0}
+    if days <= 0 or not reports_dir.is_dir():
+        return stats
+    cutoff = time.time() - days * 86400
+    for path in reports_dir.glob("*.docx"):
+        st = path.stat()
+        if st.st_mtime < cutoff:
+            stats["files"] += 1
+            stats["bytes"] += st.st_size
+            if not dry_run:
+                path.unlink(missing_ok=True)
+    return stats
+
+def incremental_vacuum(conn: sqlite3.Connection, dry_run: bool = False) -> Dict[str, Any]:
+    """Return free pages to the filesystem, if the database is in incremental auto-vacuum mode"""
+    mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+    if mode != 2:
+        # Only convert_to_incremental() changes the mode; a scheduled run must never rewrite a live database
+        return {"mode": mode, "skipped": True}
+    if not dry_run:
+        while conn.execute("PRAGMA freelist_count").fetchone()[0] > 0:
+            conn.execute(f"PRAGMA incremental_vacuum({VACUUM_STEP_PAGES})").fetchall()
+    return {"mode": mode, "skipped": False}
+
+def convert_to_incremental(conn: sqlite3.Connection) -> bool:
+    """
+    Switch a database to incremental auto-vacuum. This takes a full VACUUM, which rewrites the file and
+    blocks every writer until it is done, so it only runs from the command line. Returns False if already converted.
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        return False
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+    return True
+
+def convert_databases(db_path: str = DB_PATH) -> Dict[str, bool]:
+    """convert_to_incremental() on the database and every session shard"""
+    paths = [db_path] + [session_shards.shard_path(shard) for shard in session_shards.shards()[1:]]
+    converted = {}
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        conn = sqlite3.connect(path, timeout=30)
+        try:
+            converted[path] = convert_to_incremental(conn)
+        finally:
+            conn.close()
+    return converted
+
+def compact_database(conn: sqlite3.Connection, child_conn: sqlite3.Connection = None, dry_run: bool = False,
+                     label: str = "sessions") -> Dict[str, Any]:
+    """Compress, archive and vacuum the sessions of one database file, with its size and probe latency before and after"""
+    size_before, latency_before = database_size(conn), probe_latency_ms(conn)
+    stats = {
+        "compressed": compress_histories(conn, dry_run=dry_run),
+        "archived": archive_sessions(conn, dry_run=dry_run, child_conn=child_conn, label=label),
+    }
+    stats["vacuum"] = incremental_vacuum(conn, dry_run=dry_run)
+    size_after = database_size(conn)
+    stats.update(
+        size_before=size_before,
+        size_after=size_after,
+        reclaimed_bytes=size_before["file_bytes"] - size_after["file_bytes"],
+        probe_ms_before=latency_before,
+        probe_ms_after=probe_latency_ms(conn),
+    )
+    return stats
+
+def run_maintenance(db_path: str = DB_PATH, dry_run: bool = False, run_id: int = None) -> Dict[str, Any]:
+    """
+    One full maintenance pass over the database and, with SESSION_SHARDS set, every session shard;
+    returns what was (or, with dry_run, would be) reclaimed.
+    run_id is the maintenance_runs row claimed by the scheduler, otherwise a new row is recorded.
+    """
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        init_maintenance_schema(conn)
+        started = time.time()
+        stats = {"dry_run": dry_run, **compact_database(conn, dry_run=dry_run), "reports": prune_reports(dry_run=dry_run)}
+        if session_shards.enabled():
+            stats["shards"] = []
+            for shard in session_shards.shards()[1:]:
+                shard_conn = session_shards.connect(shard)
+                try:
+                    history_codec.init_column(shard_conn)
+                    shard_stats = compact_database(shard_conn, conn, dry_run, label=f"shard-{shard:03d}")
+                finally:
+                    shard_conn.close()
+                stats["shards"].append({"shard": shard, **shard_stats})
+                stats["reclaimed_bytes"] += shard_stats["reclaimed_bytes"]
+        stats["seconds"] = round(time.time() - started, 3)
+        if dry_run:
+            return stats
+        with conn:
+            if run_id is None:
+                conn.execute("INSERT INTO maintenance_runs (started_at, finished_at, stats) VALUES (?, ?, ?)",
+                             (started, time.time(), json.dumps(stats)))
+            else:
+                conn.execute("UPDATE maintenance_runs SET finished_at = ?, stats = ? WHERE id = ?",
+                             (time.time(), json.dumps(stats), run_id))
+        return stats
+    finally:
+        conn.close()
+
+def recent_runs(conn: sqlite3.Connection, limit: int = 10) -> List[Dict[str, Any]]:
+    init_maintenance_schema(conn)
+    rows = conn.execute("SELECT id, started_at, finished_at, stats FROM maintenance_runs ORDER BY id DESC LIMIT ?",
+                        (limit,)).fetchall()
+    return [{**json.loads(r[3] or "{}"), "id": r[0], "started_at": r[1], "finished_at": r[2]} for r in rows]
+
+def _claim_run(db_path: str, interval_hours: float) -> Optional[int]:
+    """The id of a newly started run for exactly one worker per interval, None for the others"""
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    try:
+        init_maintenance_schema(conn)
+        conn.execute("BEGIN IMMEDIATE")
+        last = conn.execute("SELECT MAX(started_at) FROM maintenance_runs").fetchone()[0]
+        if last is not None and time.time() - last < interval_hours * 3600:
+            conn.execute("ROLLBACK")
+            return None
+        # Recorded before the run starts so other workers see this interval as taken
+        run_id = conn.execute("INSERT INTO maintenance_runs (started_at) VALUES (?)", (time.time(),)).lastrowid
+        conn.execute("COMMIT")
+        return run_id
+    except sqlite3.OperationalError:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        return None
+    finally:
+        conn.close()
+
+_scheduler = None
+
+def start_scheduler(db_path: str = DB_PATH, interval_hours: float = INTERVAL_HOURS):
+    """Background thread that runs maintenance once per interval across all workers sharing the database"""
+    global _scheduler
+    if interval_hours <= 0 or _scheduler is not None:
+        return
+
+    def loop():
+        while True:
+            try:
+                run_id = _claim_run(db_path, interval_hours)
+                if run_id is not None:
+                    stats = run_maintenance(db_path, run_id=run_id)
+                    logger.info(f"Session maintenance reclaimed {stats['reclaimed_bytes']} bytes in {stats['seconds']}s")
+            except Exception:
+                logger.exception("Session maintenance failed")
+            # Check again well within the interval so a worker that died mid-interval is covered
+            time.sleep(min(interval_hours * 3600, 3600))
+
+    _scheduler = threading.Thread(target=loop, name="session-maintenance", daemon=True)
+    _scheduler.start()
+
+def main():
+    parser = argparse.ArgumentParser(description="Session retention and compaction")
+    parser.add_argument("--db", default=DB_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run", help="Compress, archive, prune reports and vacuum now")
+    run.add_argument("--dry-run", action="store_true", help="Report what would be reclaimed without changing anything")
+    sub.add_parser("history", help="Show recent maintenance runs")
+    sub.add_parser("convert", help="Switch every database file to incremental auto-vacuum (full VACUUM; stop the backend first)")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        print(json.dumps(run_maintenance(args.db, args.dry_run), indent=2))
+    elif args.command == "convert":
+        print(json.dumps(convert_databases(args.db), indent=2))
+    else:
+        conn = sqlite3.connect(args.db)
+        try:
+            print(json.dumps(recent_runs(conn), indent=2))
+        finally:
+            conn.close()
+
+if __name__ == "__main__":
+    main()
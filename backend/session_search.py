@@ -0,0 +1,179 @@
+import base64
+import json
+import re
+import sqlite3
+from typing import Dict, Any, List, Optional
+
+import history_codec
+
+MAX_PAGE_SIZE = 100
+
+_QUERY_TERM = re.compile(r'"([^"]+)"|(\S+)')
+
+# Compacted sessions (chat_history_z set) keep their chat text in the index: the triggers leave them alone,
+# and history_codec.expand() restores the text before such a row is rewritten or deleted
+_TRIGGERS = {
+    "sessions_fts_insert": """
+        CREATE TRIGGER sessions_fts_insert AFTER INSERT ON sessions BEGIN
+            INSERT INTO sessions_fts (rowid, goal, user_type, chat_history)
+            VALUES (new.id, new.goal, new.user_type, new.chat_history);
+        END
+    """,
+    "sessions_fts_delete": """
+        CREATE TRIGGER sessions_fts_delete AFTER DELETE ON sessions WHEN old.chat_history_z IS NULL BEGIN
+            INSERT INTO sessions_fts (sessions_fts, rowid, goal, user_type, chat_history)
+            VALUES ('delete', old.id, old.goal, old.user_type, old.chat_history);
+        END
+    """,
+    "sessions_fts_update": """
+        CREATE TRIGGER sessions_fts_update AFTER UPDATE OF goal, user_type, chat_history ON sessions
+        WHEN old.chat_history_z IS NULL AND new.chat_history_z IS NULL BEGIN
+            INSERT INTO sessions_fts (sessions_fts, rowid, goal, user_type, chat_history)
+            VALUES ('delete', old.id, old.goal, old.user_type, old.chat_history);
+            INSERT INTO sessions_fts (rowid, goal, user_type, chat_history)
+            VALUES (new.id, new.goal, new.user_type, new.chat_history);
+        END
+    """,
+}
+
+def init_search_schema(conn: sqlite3.Connection):
+    """Create the FTS5 index over sessions, its sync triggers and the filter indexes"""
+    history_codec.init_column(conn)
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sessions_fts'").fetchone()
+    triggers = dict(conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'sessions_fts_%'"))
+    with conn:
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_created_at ON sessions (created_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_user_type ON sessions (user_type, created_at)")
+        # External-content table: the text lives only in sessions, FTS stores just the index
+        conn.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS sessions_fts USING fts5(
+                goal, user_type, chat_history,
+                content='sessions', content_rowid='id', tokenize='porter unicode61'
+            )
+        """)
+        # Triggers from before compaction are replaced; they dropped compacted chat text from the index
+        outdated = [name for name in _TRIGGERS if "chat_history_z" not in triggers.get(name, "chat_history_z")]
+        for name, sql in _TRIGGERS.items():
+            if name in outdated:
+                conn.execute(f"DROP TRIGGER {name}")
+            if name in outdated or name not in triggers:
+                conn.execute(sql)
+        if not exists:
+            # Index sessions saved before full-text search existed
+            conn.execute("INSERT INTO sessions_fts (sessions_fts) VALUES ('rebuild')")
+        if not exists or outdated:
+            _index_compacted(conn)
+
+def _index_compacted(conn: sqlite3.Connection):
+    """Add the chat text of compacted sessions, which 'rebuild' and the old triggers indexed as NULL"""
+    after_id = 0
+    while True:
+        rows = conn.execute("""
+            SELECT id, goal, user_type, chat_history_z FROM sessions
+            WHERE id > ? AND chat_history_z IS NOT NULL ORDER BY id LIMIT 500
+        """, (after_id,)).fetchall()
+        if not rows:
+            return
+        after_id = rows[-1][0]
+        conn.executemany("""
+            INSERT INTO sessions_fts (sessions_fts, rowid, goal, user_type, chat_history) VALUES ('delete', ?, ?, ?, NULL)
+        """, [row[:3] for row in rows])
+        conn.executemany("INSERT INTO sessions_fts (rowid, goal, user_type, chat_history) VALUES (?, ?, ?, ?)",
+                         [row[:3] + (history_codec.decode(None, row[3]),) for row in rows])
+
+def build_match_query(text: str) -> str:
+    """Turn free text into a safe FTS5 query: every word or "quoted phrase" must match"""
+    terms = []
+    for phrase, word in _QUERY_TERM.findall(text):
+        term = (phrase or word).replace('"', '')
+        if term.strip():
+            terms.append(f'"{term}"')
+    return " ".join(terms)
+
+def encode_cursor(values: List[Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def decode_cursor(cursor: str) -> Optional[List[Any]]:
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        return None
+
+def search_sessions(conn: sqlite3.Connection, query: str = "", user_type: str = None, min_income: float = None,
+                    max_income: float = None, start_date: str = None, end_date: str = None, limit: int = 20,
+                    cursor: str = None) -> Dict[str, Any]:
+    """
+    Search sessions by text and filters. Text queries are ranked with bm25 (best first) over every match;
+    filter-only queries are newest first. Pages are fetched with keyset pagination via the returned next_cursor.
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    match = build_match_query(query or "")
+    after = decode_cursor(cursor) if cursor else None
+
+    conditions = []
+    params = []
+    if user_type:
+        conditions.append("s.user_type = ?")
+        params.append(user_type.lower())
+    if min_income is not None:
+        conditions.append("s.income >= ?")
+        params.append(min_income)
+    if max_income is not None:
+        conditions.append("s.income <= ?")
+        params.append(max_income)
+    if start_date:
+        conditions.append("s.created_at >= ?")
+        params.append(start_date)
+    if end_date:
+        # Dates without a time cover the whole day
+        conditions.append("s.created_at < date(?, '+1 day')" if len(end_date) == 10 else "s.created_at <= ?")
+        params.append(end_date)
+
+    filters = "".join(f" AND {condition}" for condition in conditions)
+    if match:
+        # Every match is scored, but ORDER BY ... LIMIT keeps only the best page in memory
+        sql = f"""
+            WITH candidates AS (
+                SELECT s.id, s.user_type, s.goal, s.goal_amount, s.income, s.expenses, s.created_at,
+                       bm25(sessions_fts) AS score
+                FROM sessions_fts JOIN sessions s ON s.id = sessions_fts.rowid
+                WHERE sessions_fts MATCH ?{filters}
+            )
+            SELECT * FROM candidates
+        """
+        params.insert(0, match)
+        if after:
+            sql += " WHERE score > ? OR (score = ? AND id > ?)"
+            params.extend([after[0], after[0], after[1]])
+        sql += " ORDER BY score, id LIMIT ?"
+    else:
+        sql = f"""
+            SELECT s.id, s.user_type, s.goal, s.goal_amount, s.income, s.expenses, s.created_at, NULL
+            FROM sessions s WHERE 1 = 1{filters}
+        """
+        if after:
+            sql += " AND (s.created_at < ? OR (s.created_at = ? AND s.id < ?))"
+            params.extend([after[0], after[0], after[1]])
+        sql += " ORDER BY s.created_at DESC, s.id DESC LIMIT ?"
+    params.append(limit + 1)
+
+    rows = conn.execute(sql, params).fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    # Snippets are only built for the rows on this page
+    snippets = {}
+    if match and rows:
+        placeholders = ",".join("?" * len(rows))
+        snippets = dict(conn.execute(f"""
+            SELECT rowid, snippet(sessions_fts, -1, '[', ']', '...', 12) FROM sessions_fts
+            WHERE sessions_fts MATCH ? AND rowid IN ({placeholders})
+        """, [match] + [row[0] for row in rows]).fetchall())
+
+    keys = ["id", "user_type", "goal", "goal_amount", "income", "expenses", "created_at", "score"]
+    results = [dict(zip(keys, row), snippet=snippets.get(row[0])) for row in rows]
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        next_cursor = encode_cursor([last[7], last[0]] if match else [last[6], last[0]])
+    return {"results": results, "next_cursor": next_cursor}
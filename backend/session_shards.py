@@ -0,0 +1,235 @@
+"""
+Sharded session storage.
+With SESSION_SHARDS=N (N > 0) new sessions are written to one of N SQLite files under SESSION_SHARD_DIR,
+so up to N sessions can be written at the same time instead of queueing behind the single writer of
+financebot.db. Session ids encode their shard in the bits above SHARD_ID_SHIFT:
+    id = shard << SHARD_ID_SHIFT | per-shard sequence
+so a point lookup opens the right file straight from the id, and ids stay below 2**53 for JSON clients.
+Shard 0 is financebot.db itself: sessions saved before sharding keep their ids and stay readable, and
+the transactions, reports and jobs tables stay there for all sessions. The shard count can be raised
+later; existing ids keep routing to the shard that holds them.
+Queries over all sessions (search, export, maintenance) run on every shard in parallel and merge.
+    python session_shards.py init
+    python session_shards.py stats
+"""
+import argparse
+import heapq
+import json
+import os
+import random
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import history_codec
+import session_export
+import session_search
+
+DB_PATH = "financebot.db"
+SESSION_SHARDS = int(os.getenv("SESSION_SHARDS", "0"))
+SHARD_DIR = Path(os.getenv("SESSION_SHARD_DIR", "shards"))
+SHARD_ID_SHIFT = 44
+# Largest shard number whose ids are still exact in a double (2**53)
+MAX_SHARDS = (1 << (53 - SHARD_ID_SHIFT)) - 1
+
+if SESSION_SHARDS > MAX_SHARDS:
+    raise ValueError(f"SESSION_SHARDS must be at most {MAX_SHARDS}")
+
+def enabled() -> bool:
+    return SESSION_SHARDS > 0
+
+def shard_of(session_id: int) -> int:
+    return int(session_id) >> SHARD_ID_SHIFT
+
+def shard_path(shard: int) -> str:
+    return DB_PATH if shard == 0 else str(SHARD_DIR / f"sessions-{shard:03d}.db")
+
+def shards() -> List[int]:
+    """Every shard that can hold sessions, financebot.db (shard 0) included"""
+    return list(range(SESSION_SHARDS + 1))
+
+def pick_shard() -> int:
+    """Shard for a new session; uniform, so writes spread evenly over the shard files"""
+    return random.randint(1, SESSION_SHARDS) if enabled() else 0
+
+def init_shard(conn: sqlite3.Connection, shard: int):
+    """Sessions table, search index and id sequence of one shard"""
+    if shard != 0:
+        # Set before the first table is created, so session maintenance never has to convert the file
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    session_export.ensure_sessions_table(conn)
+    session_search.init_search_schema(conn)
+    if shard == 0:
+        return
+    # WAL lets readers of a shard (search, export) run alongside its writer
+    conn.execute("PRAGMA journal_mode = WAL")
+    base = shard << SHARD_ID_SHIFT
+    with conn:
+        # AUTOINCREMENT continues from sqlite_sequence, so every insert gets an id in this shard's range
+        conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = 'sessions' AND seq < ?", (base, base))
+        conn.execute("""
+            INSERT INTO sqlite_sequence (name, seq)
+            SELECT 'sessions', ? WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'sessions')
+        """, (base,))
+
+def init_shards():
+    if not enabled():
+        return
+    SHARD_DIR.mkdir(parents=True, exist_ok=True)
+    for shard in shards()[1:]:
+        conn = sqlite3.connect(shard_path(shard))
+        try:
+            init_shard(conn, shard)
+        finally:
+            conn.close()
+
+def connect(shard: int, **kwargs) -> sqlite3.Connection:
+    return sqlite3.connect(shard_path(shard), timeout=30, **kwargs)
+
+def save_session(user_type: str, chat_history: str, income: float, expenses: float, goal: str,
+                 goal_amount: float) -> int:
+    conn = connect(pick_shard())
+    try:
+        with conn:
+            cursor = conn.execute("""
+                INSERT INTO sessions (user_type, chat_history, income, expenses, goal, goal_amount)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (user_type, chat_history, income, expenses, goal, goal_amount))
+        return cursor.lastrowid
+    finally:
+        conn.close()
+
+def load_session(session_id: int) -> Optional[Dict[str, Any]]:
+    shard = shard_of(session_id)
+    if shard > SESSION_SHARDS:
+        return None
+    conn = connect(shard)
+    try:
+        return history_codec.load_session(conn, session_id)
+    finally:
+        conn.close()
+
+def session_exists(session_id: int) -> bool:
+    shard = shard_of(session_id)
+    if shard > SESSION_SHARDS:
+        return False
+    conn = connect(shard)
+    try:
+        return conn.execute("SELECT 1 FROM sessions WHERE id = ?", (session_id,)).fetchone() is not None
+    finally:
+        conn.close()
+
+def fan_out(fn: Callable[[sqlite3.Connection], Any]) -> List[Any]:
+    """fn(conn) on every shard in parallel, results in shard order"""
+    def run(shard: int):
+        conn = connect(shard)
+        try:
+            return fn(conn)
+        finally:
+            conn.close()
+    if not enabled():
+        return [run(0)]
+    with ThreadPoolExecutor(max_workers=len(shards()), thread_name_prefix="session-shard") as pool:
+        return list(pool.map(run, shards()))
+
+def search_sessions(query: str = "", limit: int = 20, cursor: str = None, **filters) -> Dict[str, Any]:
+    """
+    session_search.search_sessions over all shards. Each shard returns its best page after the same
+    cursor and the pages are merged on the same (score, id) or (created_at, id) keyset, so pagination
+    works unchanged. bm25 scores use per-shard term statistics, which differ little once shards are large.
+    """
+    pages = fan_out(lambda conn: session_search.search_sessions(conn, query, limit=limit, cursor=cursor, **filters))
+    if len(pages) == 1:
+        return pages[0]
+    limit = max(1, min(int(limit), session_search.MAX_PAGE_SIZE))
+    text = bool(session_search.build_match_query(query or ""))
+    if text:
+        merged = heapq.merge(*(p["results"] for p in pages), key=lambda r: (r["score"], r["id"]))
+    else:
+        merged = heapq.merge(*(p["results"] for p in pages), key=lambda r: (r["created_at"], r["id"]), reverse=True)
+    results = list(merged)
+    page = results[:limit]
+    next_cursor = None
+    if len(results) > limit or any(p["next_cursor"] for p in pages):
+        last = page[-1]
+        next_cursor = session_search.encode_cursor([last["score"], last["id"]] if text else [last["created_at"], last["id"]])
+    return {"results": page, "next_cursor": next_cursor}
+
+def iter_batches(after_id: int = 0, batch_size: int = session_export.DEFAULT_BATCH_SIZE,
+                 limit: int = None) -> Iterator[List[tuple]]:
+    """session_export.iter_batches over all shards, merged into one id-ordered stream"""
+    conns = [connect(shard, check_same_thread=False) for shard in shards()]
+    try:
+        streams = [(row for rows in session_export.iter_batches(conn, after_id, batch_size, limit) for row in rows)
+                   for conn in conns]
+        batch, remaining = [], limit
+        for row in heapq.merge(*streams, key=lambda row: row[0]):
+            batch.append(row)
+            if remaining is not None:
+                remaining -= 1
+            if len(batch) == batch_size or remaining == 0:
+                yield batch
+                batch = []
+            if remaining == 0:
+                return
+        if batch:
+            yield batch
+    finally:
+        for conn in conns:
+            conn.close()
+
+class ShardedImporter(session_export.SessionImporter):
+    """SessionImporter that writes each session to its shard: by id with keep_ids, otherwise spread evenly"""
+    def __init__(self, keep_ids: bool = False, batch_size: int = 5000):
+        super().__init__(None, keep_ids, batch_size)
+        self.conns: Dict[int, sqlite3.Connection] = {}
+
+    def _conn(self, shard: int) -> sqlite3.Connection:
+        if shard not in self.conns:
+            self.conns[shard] = connect(shard, check_same_thread=False)
+        return self.conns[shard]
+
+    def flush(self):
+        if not self.pending:
+            return
+        if self.keep_ids:
+            by_shard: Dict[int, List[tuple]] = {}
+            for row in self.pending:
+                by_shard.setdefault(shard_of(row[0]), []).append(row)
+            for shard, rows in by_shard.items():
+                if shard > SESSION_SHARDS:
+                    for row in rows:
+                        self._skip(row, f"belongs to shard {shard}, beyond SESSION_SHARDS={SESSION_SHARDS}")
+                else:
+                    self._write(self._conn(shard), rows)
+        else:
+            self._write(self._conn(pick_shard()), self.pending)
+        self.pending = []
+
+    def close(self):
+        for conn in self.conns.values():
+            conn.close()
+        self.conns = {}
+
+def shard_stats() -> List[Dict[str, Any]]:
+    def stats(conn: sqlite3.Connection):
+        count, first, last = conn.execute("SELECT COUNT(*), MIN(id), MAX(id) FROM sessions").fetchone()
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        return {"sessions": count, "min_id": first, "max_id": last,
+                "bytes": conn.execute("PRAGMA page_count").fetchone()[0] * page_size}
+    return [{"shard": shard, "path": shard_path(shard), **s} for shard, s in zip(shards(), fan_out(stats))]
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharded session storage")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("init", help="Create the SESSION_SHARDS shard files")
+    sub.add_parser("stats", help="Sessions and size per shard")
+    args = parser.parse_args()
+
+    if args.command == "init":
+        init_shards()
+    print(json.dumps(shard_stats(), indent=2))
+
+if __name__ == "__main__":
+    main()
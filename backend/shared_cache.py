@@ -0,0 +1,95 @@
+"""
+Cache shared by every worker process of the backend.
+Entries live in their own SQLite file (SHARED_CACHE_DB, default cache.db) in WAL mode, so a Groq answer
+or Granite report fetched by one worker is served by all the others, and the cache survives restarts
+without contending with writes to financebot.db. Values are JSON; each entry expires after its TTL and
+the oldest entries are dropped beyond SHARED_CACHE_MAX_ENTRIES. SHARED_CACHE=0 disables it.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+SHARED_CACHE_ENABLED = os.getenv("SHARED_CACHE", "1") != "0"
+SHARED_CACHE_DB = os.getenv("SHARED_CACHE_DB", "cache.db")
+MAX_ENTRIES = int(os.getenv("SHARED_CACHE_MAX_ENTRIES", "10000"))
+# Expired and surplus entries are purged once every PURGE_EVERY writes
+PURGE_EVERY = 200
+
+_local = threading.local()
+_writes = 0
+_writes_lock = threading.Lock()
+
+def _connection() -> sqlite3.Connection:
+    """One connection per thread, opened again in a forked worker"""
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.pid != os.getpid():
+        conn = sqlite3.connect(SHARED_CACHE_DB, timeout=5)
+        conn.execute("PRAGMA journal_mode = WAL")
+        # The cache can be rebuilt, so commits need not wait for the disk
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute('''CREATE TABLE IF NOT EXISTS cache_entries (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )''')
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_entries_expires_at ON cache_entries (expires_at)")
+        _local.conn, _local.pid = conn, os.getpid()
+    return conn
+
+def make_key(namespace: str, payload: Any) -> str:
+    return f"{namespace}:{hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()}"
+
+def get(key: str) -> Optional[Any]:
+    if not SHARED_CACHE_ENABLED:
+        return None
+    try:
+        row = _connection().execute("SELECT value FROM cache_entries WHERE key = ? AND expires_at > ?",
+                                    (key, time.time())).fetchone()
+    except sqlite3.Error as e:
+        # A busy or broken cache must never fail the request
+        logger.warning(f"Shared cache read failed: {e}")
+        return None
+    return json.loads(row[0]) if row else None
+
+def put(key: str, value: Any, ttl: float):
+    global _writes
+    if not SHARED_CACHE_ENABLED or ttl <= 0:
+        return
+    try:
+        conn = _connection()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?)",
+                         (key, json.dumps(value), time.time() + ttl))
+        with _writes_lock:
+            _writes += 1
+            due = _writes % PURGE_EVERY == 0
+        if due:
+            purge()
+    except sqlite3.Error as e:
+        logger.warning(f"Shared cache write failed: {e}")
+
+def purge():
+    """Drop expired entries, then the ones closest to expiry beyond MAX_ENTRIES"""
+    conn = _connection()
+    with conn:
+        conn.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (time.time(),))
+        conn.execute("""
+            DELETE FROM cache_entries WHERE key IN (
+                SELECT key FROM cache_entries ORDER BY expires_at DESC LIMIT -1 OFFSET ?
+            )
+        """, (MAX_ENTRIES,))
+
+def stats() -> Dict[str, Any]:
+    if not SHARED_CACHE_ENABLED:
+        return {"enabled": False}
+    rows = dict(_connection().execute("""
+        SELECT substr(key, 1, instr(key, ':') - 1), COUNT(*) FROM cache_entries WHERE expires_at > ? GROUP BY 1
+    """, (time.time(),)).fetchall())
+    return {"enabled": True, "path": SHARED_CACHE_DB, "entries": rows}
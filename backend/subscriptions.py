@@ -0,0 +1,295 @@
+import datetime
+import itertools
+import math
+import sqlite3
+from operator import itemgetter
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+# (name, period in days, charges per year)
+CADENCES = (
+    ("weekly", 7.0, 52),
+    ("biweekly", 14.0, 26),
+    ("monthly", 30.44, 12),
+    ("quarterly", 91.31, 4),
+    ("yearly", 365.25, 1),
+)
+PERIOD_TOLERANCE = 0.2        # Mean interval may be within 20% of the cadence period
+MAX_INTERVAL_VARIATION = 0.12  # Coefficient of variation allowed across intervals
+MAX_INTERVAL_JITTER_DAYS = 5.0  # ...but never more than 5 days, or any four purchases a year apart look yearly
+AMOUNT_TOLERANCE = 0.02       # Charges within 2% (or 5 cents) of a cluster's mean amount belong to it
+# Three charges leave only two intervals, which random one-off purchases match far too often
+MIN_CHARGES = 4
+# ...except for yearly plans, which rarely have four charges, as long as both intervals are close to a year
+MIN_YEARLY_CHARGES = 3
+YEARLY_PERIOD_TOLERANCE = 0.01
+# Recurring but not something to cancel: rent, bills, premiums, EMIs and money moved between accounts
+EXCLUDED_CATEGORIES = ("housing", "utilities", "insurance", "loan_payments", "fees", "cash", "transfers", "income")
+_EXCLUDED_SQL = ", ".join(f"'{c}'" for c in EXCLUDED_CATEGORIES)
+
+class ChargeCluster:
+    """Running statistics for one merchant/amount cluster; O(1) to update with a new charge"""
+    __slots__ = ("id", "dirty", "merchant", "count", "amount_sum", "first_day", "last_day",
+                 "interval_count", "interval_sum", "interval_sumsq")
+
+    def __init__(self, merchant: str, day: int, amount: float):
+        self.id = None
+        self.dirty = True
+        self.merchant = merchant
+        self.count = 1
+        self.amount_sum = amount
+        self.first_day = day
+        self.last_day = day
+        self.interval_count = 0
+        self.interval_sum = 0.0
+        self.interval_sumsq = 0.0
+
+    @property
+    def mean_amount(self) -> float:
+        return self.amount_sum / self.count
+
+    def accepts(self, amount: float) -> bool:
+        mean = self.mean_amount
+        return abs(amount - mean) <= max(AMOUNT_TOLERANCE * mean, 0.05)
+
+    def add(self, day: int, amount: float):
+        interval = day - self.last_day
+        if interval > 0:
+            self.interval_count += 1
+            self.interval_sum += interval
+            self.interval_sumsq += interval * interval
+        self.count += 1
+        self.amount_sum += amount
+        self.last_day = day
+        self.dirty = True
+
+    def cadence(self) -> Optional[Tuple[str, float, int]]:
+        """Return the matching (name, period, charges per year), or None if the charges are not regular"""
+        if self.count < MIN_YEARLY_CHARGES or self.interval_count == 0:
+            return None
+        mean = self.interval_sum / self.interval_count
+        variance = max(self.interval_sumsq / self.interval_count - mean * mean, 0.0)
+        if self.count < MIN_CHARGES:
+            name, period, per_year = CADENCES[-1]
+            # mean +/- standard deviation bounds every interval when there are only two of them
+            if abs(mean - period) + variance ** 0.5 <= YEARLY_PERIOD_TOLERANCE * period:
+                return name, period, per_year
+            return None
+        if variance ** 0.5 > min(MAX_INTERVAL_VARIATION * mean, MAX_INTERVAL_JITTER_DAYS):
+            return None
+        for name, period, per_year in CADENCES:
+            if abs(mean - period) <= PERIOD_TOLERANCE * period:
+                return name, period, per_year
+        return None
+
+def _amount_bucket(amount: float) -> int:
+    """Log-scale bucket roughly AMOUNT_TOLERANCE wide, so a charge only needs to be compared with nearby clusters"""
+    return int(math.log(max(amount, 1.0)) / math.log(1 + AMOUNT_TOLERANCE))
+
+class SubscriptionDetector:
+    """Clusters outflows by merchant and amount in one pass over (merchant, date)-sorted charges"""
+
+    def __init__(self, clusters: Dict[str, List[ChargeCluster]] = None):
+        self.clusters = clusters or {}
+        self._buckets = {}
+        # Bucket each cluster is filed under, by id(cluster)
+        self._bucket_of = {}
+        for merchant_clusters in self.clusters.values():
+            for cluster in merchant_clusters:
+                self._index(cluster)
+
+    def _index(self, cluster: ChargeCluster):
+        key = (cluster.merchant, _amount_bucket(cluster.mean_amount))
+        self._buckets.setdefault(key, []).append(cluster)
+        self._bucket_of[id(cluster)] = key
+
+    def _reindex(self, cluster: ChargeCluster):
+        """File the cluster under the bucket of its current mean, which drifts as charges are added"""
+        key = (cluster.merchant, _amount_bucket(cluster.mean_amount))
+        old = self._bucket_of[id(cluster)]
+        if key != old:
+            self._buckets[old].remove(cluster)
+            self._buckets.setdefault(key, []).append(cluster)
+            self._bucket_of[id(cluster)] = key
+
+    def add_charge(self, merchant: str, day: int, amount: float) -> bool:
+        """Add a charge; returns False if it predates the merchant's history (needs a rebuild)"""
+        bucket = _amount_bucket(amount)
+        for key in ((merchant, bucket), (merchant, bucket - 1), (merchant, bucket + 1)):
+            for cluster in self._buckets.get(key, ()):
+                if cluster.accepts(amount):
+                    if day < cluster.last_day:
+                        return False
+                    cluster.add(day, amount)
+                    self._reindex(cluster)
+                    return True
+        cluster = ChargeCluster(merchant, day, amount)
+        self.clusters.setdefault(merchant, []).append(cluster)
+        self._index(cluster)
+        return True
+
+    def add_charges(self, charges: Iterable[Tuple[str, int, float]]) -> set:
+        """Add (merchant, day, amount) charges; returns merchants that need a rebuild"""
+        stale = set()
+        for merchant, day, amount in charges:
+            if merchant not in stale and not self.add_charge(merchant, day, amount):
+                stale.add(merchant)
+        return stale
+
+    def subscriptions(self, as_of_day: int = None) -> List[Dict[str, Any]]:
+        """Recurring charges with cadence and annualized cost, most expensive first"""
+        clusters = (cluster for merchant_clusters in self.clusters.values() for cluster in merchant_clusters)
+        return _describe_clusters(clusters, as_of_day)
+
+def _describe_clusters(clusters: Iterable[ChargeCluster], as_of_day: int = None) -> List[Dict[str, Any]]:
+    results = []
+    for cluster in clusters:
+        cadence = cluster.cadence()
+        if cadence is None:
+            continue
+        name, period, per_year = cadence
+        results.append({
+            "merchant": cluster.merchant,
+            "cadence": name,
+            "amount": round(cluster.mean_amount, 2),
+            "annual_cost": round(cluster.mean_amount * per_year, 2),
+            "charges": cluster.count,
+            "first_charge": datetime.date.fromordinal(cluster.first_day).isoformat(),
+            "last_charge": datetime.date.fromordinal(cluster.last_day).isoformat(),
+            # Still active if the next charge is not more than one period overdue
+            "active": as_of_day is None or as_of_day - cluster.last_day <= 2 * period,
+        })
+    results.sort(key=lambda item: item["annual_cost"], reverse=True)
+    return results
+
+def init_subscriptions_schema(conn: sqlite3.Connection):
+    """Create the tables holding persisted detector state"""
+    conn.execute('''CREATE TABLE IF NOT EXISTS recurring_charge_clusters (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id INTEGER NOT NULL,
+        merchant TEXT NOT NULL,
+        charge_count INTEGER NOT NULL,
+        amount_sum REAL NOT NULL,
+        first_day INTEGER NOT NULL,
+        last_day INTEGER NOT NULL,
+        interval_count INTEGER NOT NULL,
+        interval_sum REAL NOT NULL,
+        interval_sumsq REAL NOT NULL,
+        cadence TEXT
+    )''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_recurring_clusters_merchant ON recurring_charge_clusters (session_id, merchant)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_recurring_clusters_cadence ON recurring_charge_clusters (session_id) WHERE cadence IS NOT NULL")
+    conn.execute('''CREATE TABLE IF NOT EXISTS subscription_watermarks (
+        session_id INTEGER PRIMARY KEY,
+        last_transaction_id INTEGER NOT NULL
+    )''')
+
+_CLUSTER_COLUMNS = "id, merchant, charge_count, amount_sum, first_day, last_day, interval_count, interval_sum, interval_sumsq"
+
+def _cluster_from_row(row: Tuple) -> ChargeCluster:
+    cluster = ChargeCluster(row[1], row[4], 0.0)
+    (cluster.id, _, cluster.count, cluster.amount_sum, cluster.first_day, cluster.last_day,
+     cluster.interval_count, cluster.interval_sum, cluster.interval_sumsq) = row
+    cluster.dirty = False
+    return cluster
+
+def _load_clusters(conn: sqlite3.Connection, session_id: int, merchant: str) -> List[ChargeCluster]:
+    rows = conn.execute(f"""
+        SELECT {_CLUSTER_COLUMNS} FROM recurring_charge_clusters WHERE session_id = ? AND merchant = ? ORDER BY id
+    """, (session_id, merchant))
+    return [_cluster_from_row(row) for row in rows]
+
+def _save_clusters(conn: sqlite3.Connection, session_id: int, clusters: List[ChargeCluster]):
+    for c in clusters:
+        if not c.dirty:
+            continue
+        c.dirty = False
+        cadence = c.cadence()
+        values = (c.count, c.amount_sum, c.first_day, c.last_day, c.interval_count, c.interval_sum, c.interval_sumsq,
+                  cadence[0] if cadence else None)
+        if c.id is None:
+            c.id = conn.execute("""
+                INSERT INTO recurring_charge_clusters (session_id, merchant, charge_count, amount_sum, first_day,
+                                                       last_day, interval_count, interval_sum, interval_sumsq, cadence)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (session_id, c.merchant) + values).lastrowid
+        else:
+            conn.execute("""
+                UPDATE recurring_charge_clusters SET charge_count = ?, amount_sum = ?, first_day = ?, last_day = ?,
+                    interval_count = ?, interval_sum = ?, interval_sumsq = ?, cadence = ?
+                WHERE id = ?
+            """, values + (c.id,))
+
+def _iter_charges(cursor: Iterable[Tuple[str, str, float]]) -> Iterable[Tuple[str, int, float]]:
+    to_day = datetime.date.fromisoformat
+    for merchant, posted_date, amount in cursor:
+        yield merchant, to_day(posted_date).toordinal(), amount
+
+def update_subscriptions(conn: sqlite3.Connection, session_id: int) -> List[Dict[str, Any]]:
+    """
+    Fold transactions imported since the last run into the session's detector state and return its subscriptions.
+    New transactions are read in one (merchant, date)-sorted pass and only the merchants they touch are updated;
+    a merchant's history is rescanned only if new charges predate it. Charges in EXCLUDED_CATEGORIES are skipped.
+    """
+    init_subscriptions_schema(conn)
+    row = conn.execute("SELECT last_transaction_id FROM subscription_watermarks WHERE session_id = ?",
+                       (session_id,)).fetchone()
+    watermark = row[0] if row else 0
+    latest_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM transactions WHERE session_id = ?",
+                             (session_id,)).fetchone()[0]
+
+    if latest_id > watermark:
+        new_charges = conn.execute(f"""
+            SELECT merchant, posted_date, -amount FROM transactions
+            WHERE session_id = ? AND id > ? AND id <= ? AND amount < 0 AND IFNULL(category, '') NOT IN ({_EXCLUDED_SQL})
+            ORDER BY merchant, posted_date
+        """, (session_id, watermark, latest_id))
+        with conn:
+            for merchant, charges in itertools.groupby(_iter_charges(new_charges), key=itemgetter(0)):
+                detector = SubscriptionDetector({merchant: _load_clusters(conn, session_id, merchant)})
+                if detector.add_charges(charges):
+                    # Out-of-order charges: replay this merchant's full history
+                    conn.execute("DELETE FROM recurring_charge_clusters WHERE session_id = ? AND merchant = ?",
+                                 (session_id, merchant))
+                    detector = SubscriptionDetector()
+                    detector.add_charges(_iter_charges(conn.execute(f"""
+                        SELECT merchant, posted_date, -amount FROM transactions
+                        WHERE session_id = ? AND merchant = ? AND id <= ? AND amount < 0
+                            AND IFNULL(category, '') NOT IN ({_EXCLUDED_SQL})
+                        ORDER BY posted_date
+                    """, (session_id, merchant, latest_id))))
+                _save_clusters(conn, session_id, detector.clusters.get(merchant, []))
+            conn.execute("""
+                INSERT INTO subscription_watermarks (session_id, last_transaction_id) VALUES (?, ?)
+                ON CONFLICT (session_id) DO UPDATE SET last_transaction_id = excluded.last_transaction_id
+            """, (session_id, latest_id))
+
+    return list_subscriptions(conn, session_id)
+
+def list_subscriptions(conn: sqlite3.Connection, session_id: int) -> List[Dict[str, Any]]:
+    """
+    Subscriptions from the stored detector state. Clusters of merchants in EXCLUDED_CATEGORIES, stored before
+    those were skipped, are left out.
+    """
+    init_subscriptions_schema(conn)
+    rows = conn.execute(f"""
+        SELECT {_CLUSTER_COLUMNS} FROM recurring_charge_clusters WHERE session_id = ? AND cadence IS NOT NULL
+            AND merchant NOT IN (
+                SELECT merchant FROM transactions WHERE session_id = ? AND category IN ({_EXCLUDED_SQL})
+            )
+    """, (session_id, session_id))
+    clusters = [_cluster_from_row(row) for row in rows]
+    last_date = conn.execute("SELECT MAX(posted_date) FROM transactions WHERE session_id = ?",
+                             (session_id,)).fetchone()[0]
+    as_of_day = datetime.date.fromisoformat(last_date).toordinal() if last_date else None
+    return _describe_clusters(clusters, as_of_day)
+
+def describe_subscriptions(subscriptions: List[Dict[str, Any]], limit: int = 5) -> str:
+    """Short summary of active subscriptions for insights and report content"""
+    active = [s for s in subscriptions if s["active"]]
+    if not active:
+        return ""
+    total = sum(s["annual_cost"] for s in active)
+    listed = ", ".join(
+        f"{s['merchant'].title()} ${s['amount']:,.2f} {s['cadence']}" for s in active[:limit]
+    )
+    return f"{len(active)} recurring charge(s) costing ${total:,.2f} per year: {listed}"
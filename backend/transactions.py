@@ -0,0 +1,402 @@
+import csv
+import datetime
+import io
+import re
+import sqlite3
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
+
+DB_PATH = "financebot.db"
+
+# Rows are written in batches so arbitrarily large statements use constant memory
+INSERT_BATCH_SIZE = 1000
+
+# Merchant prefixes are matched against the normalized description (upper case, no digits/punctuation)
+MERCHANT_PREFIXES = {
+    "groceries": ["WALMART", "KROGER", "SAFEWAY", "WHOLE FOODS", "ALDI", "TRADER JOE", "COSTCO", "BIGBASKET",
+                  "DMART", "RELIANCE FRESH", "MORE SUPERMARKET", "BLINKIT", "ZEPTO"],
+    "dining": ["STARBUCKS", "MCDONALD", "DOMINOS", "PIZZA HUT", "KFC", "SUBWAY", "CHIPOTLE", "SWIGGY", "ZOMATO",
+               "DUNKIN", "BURGER KING", "CAFE COFFEE DAY"],
+    "transport": ["UBER", "LYFT", "OLA", "RAPIDO", "SHELL", "CHEVRON", "EXXON", "BP ", "INDIAN OIL", "HPCL",
+                  "BPCL", "IRCTC", "METRO"],
+    "subscriptions": ["NETFLIX", "SPOTIFY", "HULU", "DISNEY", "HOTSTAR", "YOUTUBE PREMIUM", "APPLE COM BILL",
+                      "AMAZON PRIME", "PRIME VIDEO", "ADOBE", "MICROSOFT", "DROPBOX", "GOOGLE STORAGE"],
+    "shopping": ["AMAZON", "FLIPKART", "MYNTRA", "TARGET", "BEST BUY", "IKEA", "EBAY", "AJIO", "MEESHO"],
+    "utilities": ["COMCAST", "VERIZON", "AT T", "T MOBILE", "AIRTEL", "JIO", "BSNL", "VODAFONE", "TATA POWER",
+                  "ADANI ELECTRICITY", "BESCOM", "PG E"],
+    "health": ["CVS", "WALGREENS", "APOLLO", "PHARMEASY", "NETMEDS", "TATA MG"],
+    "entertainment": ["AMC", "PVR", "INOX", "BOOKMYSHOW", "STEAM", "PLAYSTATION", "XBOX"],
+    "travel": ["AIRBNB", "MAKEMYTRIP", "GOIBIBO", "EXPEDIA", "BOOKING COM", "INDIGO", "AIR INDIA", "DELTA",
+               "UNITED AIRLINES", "MARRIOTT", "HILTON"],
+}
+
+# Keyword patterns for descriptions that no merchant prefix recognizes
+CATEGORY_PATTERNS = {
+    "housing": r"\b(RENT|MORTGAGE|LANDLORD|HOUSING SOCIETY|MAINTENANCE CHARGES)\b",
+    "utilities": r"\b(ELECTRIC|ELECTRICITY|WATER BILL|GAS BILL|INTERNET|BROADBAND|MOBILE RECHARGE|POSTPAID)\b",
+    "insurance": r"\b(INSURANCE|LIC|PREMIUM|POLICY)\b",
+    "loan_payments": r"\b(EMI|LOAN|CREDIT CARD PAYMENT|CC PAYMENT|AUTOPAY)\b",
+    "fees": r"\b(FEE|FEES|CHARGE|PENALTY|OVERDRAFT|INTEREST CHARGED)\b",
+    "cash": r"\b(ATM|CASH WITHDRAWAL|CASH WDL)\b",
+    "transfers": r"\b(TRANSFER|NEFT|IMPS|RTGS|UPI|ZELLE|VENMO)\b",
+    "dining": r"\b(RESTAURANT|CAFE|COFFEE|PIZZA|BAKERY|DINER|BAR|GRILL)\b",
+    "groceries": r"\b(GROCERY|GROCERIES|SUPERMARKET|MART|KIRANA)\b",
+    "health": r"\b(PHARMACY|HOSPITAL|CLINIC|DENTAL|MEDICAL)\b",
+    "education": r"\b(TUITION|SCHOOL|COLLEGE|UNIVERSITY|COURSE|UDEMY|COURSERA)\b",
+}
+
+CSV_DATE_COLUMNS = {"date", "posted date", "posting date", "transaction date", "txn date", "value date"}
+CSV_DESCRIPTION_COLUMNS = {"description", "merchant", "name", "payee", "details", "narration", "memo", "particulars"}
+CSV_AMOUNT_COLUMNS = {"amount", "transaction amount", "amt"}
+CSV_DEBIT_COLUMNS = {"debit", "withdrawal", "withdrawal amt", "withdrawal amount", "debit amount"}
+CSV_CREDIT_COLUMNS = {"credit", "deposit", "deposit amt", "deposit amount", "credit amount"}
+
+DATE_FORMATS = ["%Y-%m-%d", "%m/%d/%Y", "%d/%m/%Y", "%d-%m-%Y", "%m/%d/%y", "%d/%m/%y", "%d %b %Y", "%d-%b-%Y",
+                "%b %d, %Y", "%Y/%m/%d"]
+
+_NON_ALPHA = re.compile(r"[^A-Z ]+")
+_SPACES = re.compile(r"\s+")
+_OFX_TOKEN = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<]*)")
+
+def normalize_merchant(description: str) -> str:
+    """Upper-case a description and strip digits, punctuation and repeated spaces"""
+    return _SPACES.sub(" ", _NON_ALPHA.sub(" ", description.upper())).strip()
+
+class TransactionCategorizer:
+    """Precompiled rule index: merchant prefix trie first, then a single combined regex"""
+
+    def __init__(self, merchant_prefixes: Dict[str, List[str]] = None, category_patterns: Dict[str, str] = None):
+        self._trie = {}
+        for category, prefixes in (merchant_prefixes or MERCHANT_PREFIXES).items():
+            for prefix in prefixes:
+                node = self._trie
+                for char in normalize_merchant(prefix) + (" " if prefix.endswith(" ") else ""):
+                    node = node.setdefault(char, {})
+                node[None] = category
+
+        # One alternation with a named group per category, so a description is scanned once
+        patterns = category_patterns or CATEGORY_PATTERNS
+        self._pattern_groups = {f"c{i}": category for i, category in enumerate(patterns)}
+        self._regex = re.compile("|".join(f"(?P<c{i}>{pattern})" for i, pattern in enumerate(patterns.values())))
+
+    def match_prefix(self, merchant: str) -> Optional[str]:
+        """Return the category of the longest known merchant prefix, if any"""
+        node = self._trie
+        category = None
+        for char in merchant + " ":
+            node = node.get(char)
+            if node is None:
+                break
+            category = node.get(None, category)
+        return category
+
+    def categorize(self, description: str, amount: float) -> Tuple[str, str]:
+        """Return (normalized merchant, category) for a transaction"""
+        merchant = normalize_merchant(description)
+        category = self.match_prefix(merchant)
+        if category is None:
+            match = self._regex.search(merchant)
+            if match:
+                category = self._pattern_groups[match.lastgroup]
+        if category is None:
+            category = "income" if amount > 0 else "other"
+        return merchant, category
+
+_categorizer = TransactionCategorizer()
+
+def parse_amount(value: str) -> Optional[float]:
+    """Parse amounts like '$1,234.50', '(45.00)', '-12' or '12.00 DR'"""
+    if value is None:
+        return None
+    text = value.strip().upper()
+    if not text:
+        return None
+    negative = (text.startswith("(") and text.endswith(")")) or text.startswith("-") or text.endswith(" DR")
+    digits = re.sub(r"[^0-9.]", "", text.replace(" DR", "").replace(" CR", ""))
+    if not digits or digits == ".":
+        return None
+    amount = float(digits)
+    return -amount if negative else amount
+
+def parse_date(value: str) -> Optional[str]:
+    """Normalize a statement date to ISO format (YYYY-MM-DD)"""
+    text = (value or "").strip()
+    if not text:
+        return None
+    # OFX dates look like 20240131120000[-5:EST]
+    if text[:8].isdigit():
+        try:
+            return datetime.datetime.strptime(text[:8], "%Y%m%d").date().isoformat()
+        except ValueError:
+            pass
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(text, fmt).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+def _find_column(header: List[str], names: set) -> Optional[int]:
+    for i, column in enumerate(header):
+        if column in names:
+            return i
+    return None
+
+def iter_csv_transactions(lines: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """Stream transactions out of a bank CSV export, one row at a time"""
+    reader = csv.reader(lines)
+    columns = None
+    for row in reader:
+        if columns is None:
+            # Skip any preamble until a row that looks like the header
+            header = [cell.strip().lower() for cell in row]
+            date_col = _find_column(header, CSV_DATE_COLUMNS)
+            desc_col = _find_column(header, CSV_DESCRIPTION_COLUMNS)
+            amount_col = _find_column(header, CSV_AMOUNT_COLUMNS)
+            debit_col = _find_column(header, CSV_DEBIT_COLUMNS)
+            credit_col = _find_column(header, CSV_CREDIT_COLUMNS)
+            if date_col is not None and desc_col is not None and (amount_col is not None or debit_col is not None):
+                columns = (date_col, desc_col, amount_col, debit_col, credit_col)
+            continue
+
+        date_col, desc_col, amount_col, debit_col, credit_col = columns
+        if len(row) <= max(c for c in columns if c is not None):
+            continue
+        posted_date = parse_date(row[date_col])
+        if posted_date is None:
+            continue
+        if amount_col is not None:
+            amount = parse_amount(row[amount_col])
+        else:
+            debit = parse_amount(row[debit_col]) or 0.0
+            credit = parse_amount(row[credit_col]) if credit_col is not None else None
+            amount = (credit or 0.0) - abs(debit)
+        if amount is None:
+            continue
+        yield {"posted_date": posted_date, "description": row[desc_col].strip(), "amount": amount}
+
+def iter_ofx_transactions(chunks: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """Stream <STMTTRN> records out of an OFX (SGML or XML) statement read in text chunks"""
+    buffer = ""
+    current = None
+    for chunk in chunks:
+        buffer += chunk
+        # The last tag's value may continue in the next chunk, so keep it buffered
+        cut = buffer.rfind("<")
+        complete, buffer = (buffer[:cut], buffer[cut:]) if cut >= 0 else (buffer, "")
+        for transaction, current in _iter_ofx_tokens(complete, current):
+            if transaction:
+                yield transaction
+    for transaction, current in _iter_ofx_tokens(buffer, current):
+        if transaction:
+            yield transaction
+    if current:
+        transaction = _ofx_record(current)
+        if transaction:
+            yield transaction
+
+def _iter_ofx_tokens(text: str, current: Optional[Dict[str, str]]):
+    """Apply the tags in text to the open record, yielding (finished transaction, open record) pairs"""
+    for closing, tag, value in _OFX_TOKEN.findall(text):
+        tag = tag.upper()
+        if tag == "STMTTRN":
+            # A new record implicitly closes an unterminated one (common in SGML OFX)
+            transaction = _ofx_record(current) if current else None
+            current = None if closing else {}
+            yield transaction, current
+        elif current is not None and not closing:
+            current[tag] = value.strip()
+    yield None, current
+
+def _ofx_record(fields: Dict[str, str]) -> Optional[Dict[str, Any]]:
+    posted_date = parse_date(fields.get("DTPOSTED", ""))
+    amount = parse_amount(fields.get("TRNAMT", ""))
+    if posted_date is None or amount is None:
+        return None
+    description = fields.get("NAME") or fields.get("MEMO") or fields.get("PAYEE") or ""
+    return {"posted_date": posted_date, "description": description, "amount": amount}
+
+def detect_format(first_chunk: bytes, filename: str = "") -> str:
+    """Guess whether a statement is OFX or CSV"""
+    head = first_chunk[:1024].lstrip().upper()
+    if filename.lower().endswith((".ofx", ".qfx")) or head.startswith(b"OFXHEADER") or b"<OFX>" in head:
+        return "ofx"
+    return "csv"
+
+def init_transactions_schema(conn: sqlite3.Connection):
+    """Create the transactions table and its indexes if needed"""
+    conn.execute('''CREATE TABLE IF NOT EXISTS transactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id INTEGER NOT NULL,
+        posted_date TEXT NOT NULL,
+        description TEXT,
+        merchant TEXT,
+        amount REAL NOT NULL,
+        category TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_transactions_session_date ON transactions (session_id, posted_date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_transactions_session_category ON transactions (session_id, category)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_transactions_session_merchant ON transactions (session_id, merchant, posted_date)")
+    # Per-session, per-month, per-category rollup kept up to date on every insert
+    conn.execute('''CREATE TABLE IF NOT EXISTS monthly_spending (
+        session_id INTEGER NOT NULL,
+        month TEXT NOT NULL,
+        category TEXT NOT NULL,
+        spent REAL NOT NULL DEFAULT 0,
+        received REAL NOT NULL DEFAULT 0,
+        transaction_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (session_id, month, category)
+    ) WITHOUT ROWID''')
+
+def get_connection() -> sqlite3.Connection:
+    conn = sqlite3.connect(DB_PATH)
+    init_transactions_schema(conn)
+    return conn
+
+def ingest_transactions(conn: sqlite3.Connection, session_id: int, text: Iterable[str], fmt: str = "csv",
+                        categorizer: TransactionCategorizer = None) -> Dict[str, Any]:
+    """Parse, categorize and store a statement in batches; returns ingestion stats"""
+    categorizer = categorizer or _categorizer
+    parser = iter_ofx_transactions if fmt == "ofx" else iter_csv_transactions
+
+    batch = []
+    count = 0
+    categories = {}
+    with conn:
+        for transaction in parser(text):
+            merchant, category = categorizer.categorize(transaction["description"], transaction["amount"])
+            batch.append((session_id, transaction["posted_date"], transaction["description"], merchant,
+                          transaction["amount"], category))
+            categories[category] = categories.get(category, 0) + 1
+            if len(batch) >= INSERT_BATCH_SIZE:
+                _insert_batch(conn, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            _insert_batch(conn, batch)
+            count += len(batch)
+    return {"imported": count, "categories": categories}
+
+def _insert_batch(conn: sqlite3.Connection, batch: List[Tuple]):
+    conn.executemany("""
+        INSERT INTO transactions (session_id, posted_date, description, merchant, amount, category)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, batch)
+
+    # Fold the batch into the monthly rollup in the same database transaction
+    rollup = {}
+    for session_id, posted_date, _, _, amount, category in batch:
+        key = (session_id, posted_date[:7], category)
+        spent, received, count = rollup.get(key, (0.0, 0.0, 0))
+        if amount < 0:
+            spent -= amount
+        else:
+            received += amount
+        rollup[key] = (spent, received, count + 1)
+    conn.executemany("""
+        INSERT INTO monthly_spending (session_id, month, category, spent, received, transaction_count)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (session_id, month, category) DO UPDATE SET
+            spent = spent + excluded.spent,
+            received = received + excluded.received,
+            transaction_count = transaction_count + excluded.transaction_count
+    """, [key + values for key, values in rollup.items()])
+
+def rebuild_monthly_spending(conn: sqlite3.Connection, session_id: int = None) -> int:
+    """Recompute the monthly rollup from raw transactions (for backfills); returns rows written"""
+    where, params = ("WHERE session_id = ?", (session_id,)) if session_id is not None else ("", ())
+    with conn:
+        conn.execute(f"DELETE FROM monthly_spending {where}", params)
+        cursor = conn.execute(f"""
+            INSERT INTO monthly_spending (session_id, month, category, spent, received, transaction_count)
+            SELECT session_id, substr(posted_date, 1, 7), category,
+                   SUM(CASE WHEN amount < 0 THEN -amount ELSE 0 END),
+                   SUM(CASE WHEN amount >= 0 THEN amount ELSE 0 END),
+                   COUNT(*)
+            FROM transactions {where}
+            GROUP BY session_id, substr(posted_date, 1, 7), category
+        """, params)
+    return cursor.rowcount
+
+def _shift_month(month: str, offset: int) -> str:
+    """Move a YYYY-MM string by offset months"""
+    year, mon = int(month[:4]), int(month[5:7])
+    index = year * 12 + (mon - 1) + offset
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+def get_spending_summary(conn: sqlite3.Connection, session_id: int, months: int = None,
+                         category: str = None) -> Dict[str, Any]:
+    """
+    Category totals, monthly burn and savings rate for a session, read from the monthly rollup.
+    months limits the window to the last N months ending at the session's latest month of data.
+    """
+    where = "session_id = ?"
+    params = [session_id]
+    if months:
+        latest = conn.execute("SELECT MAX(month) FROM monthly_spending WHERE session_id = ?", (session_id,)).fetchone()[0]
+        if latest:
+            where += " AND month >= ?"
+            params.append(_shift_month(latest, -(int(months) - 1)))
+    if category:
+        where += " AND category = ?"
+        params.append(category)
+
+    rows = conn.execute(f"""
+        SELECT month, category, spent, received FROM monthly_spending WHERE {where} ORDER BY month
+    """, params).fetchall()
+
+    categories = {}
+    by_month = {}
+    for month, row_category, spent, received in rows:
+        if spent > 0:
+            categories[row_category] = categories.get(row_category, 0) + spent
+        month_spent, month_received = by_month.get(month, (0.0, 0.0))
+        by_month[month] = (month_spent + spent, month_received + received)
+
+    month_count = len(by_month)
+    total_spent = sum(categories.values())
+    total_income = sum(received for _, received in by_month.values())
+    return {
+        "months": month_count,
+        "total_spent": total_spent,
+        "total_income": total_income,
+        "monthly_spending": total_spent / month_count if month_count else 0,
+        "monthly_income": total_income / month_count if month_count else 0,
+        "savings_rate": (total_income - total_spent) / total_income * 100 if total_income > 0 else None,
+        "monthly": [
+            {"month": month, "spent": round(spent, 2), "received": round(received, 2)}
+            for month, (spent, received) in by_month.items()
+        ],
+        "categories": dict(sorted(categories.items(), key=lambda item: item[1], reverse=True)),
+    }
+
+def format_category_breakdown(summary: Dict[str, Any], limit: int = 6) -> str:
+    """One-line category breakdown for prompts and raw report content"""
+    total = summary["total_spent"]
+    if not total:
+        return ""
+    parts = [
+        f"{category.replace('_', ' ').title()} ${spent / max(summary['months'], 1):,.2f}/month ({spent / total * 100:.0f}%)"
+        for category, spent in list(summary["categories"].items())[:limit]
+    ]
+    return ", ".join(parts)
+
+def iter_statement_text(binary_file, fmt: str, encoding: str = "utf-8") -> Iterable[str]:
+    """Decode an uploaded statement as CSV lines or fixed-size OFX text chunks"""
+    text = io.TextIOWrapper(binary_file, encoding=encoding, errors="replace", newline="")
+    if fmt == "ofx":
+        return iter(lambda: text.read(64 * 1024), "")
+    return text
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Transaction store maintenance")
+    parser.add_argument("command", choices=["rebuild"], help="rebuild: recompute monthly spending rollups")
+    parser.add_argument("--session-id", type=int, default=None, help="Only rebuild this session")
+    args = parser.parse_args()
+
+    conn = get_connection()
+    rows = rebuild_monthly_spending(conn, args.session_id)
+    conn.close()
+    print(f"Rebuilt {rows} monthly spending rows")
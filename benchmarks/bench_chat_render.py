@@ -0,0 +1,44 @@
+"""Per-rerun cost of rendering and serializing chat history: full rebuild vs the incremental ChatLog"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "frontend"))
+
+from chat_view import ChatLog, PAGE_SIZE, render_message
+
+MESSAGE = "Consider putting 20% of your salary into a recurring deposit and keep an emergency fund of six months. " * 2
+
+def full_rebuild(history):
+    """What every rerun used to do: render each message, then join the history for reports"""
+    blocks = [render_message(sender, msg) for sender, msg in history]
+    serialized = "\n".join([f"{sender}: {msg}" for sender, msg in history])
+    return blocks, serialized
+
+def incremental(log: ChatLog, sender: str, msg: str):
+    """One new message per rerun: append, emit the visible window, read the cached history"""
+    log.append(sender, msg)
+    return log.window_html(PAGE_SIZE), log.serialized
+
+def per_call_ms(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, nargs="+", default=[1_000, 10_000])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    for count in args.messages:
+        history = [("You" if i % 2 == 0 else "Bot", f"{i} {MESSAGE}") for i in range(count)]
+        log = ChatLog(history)
+        before = per_call_ms(lambda: full_rebuild(history), args.repeat)
+        after = per_call_ms(lambda: incremental(log, "You", MESSAGE), args.repeat)
+        print(f"{count:>7,} messages: full rebuild {before:8.3f} ms/rerun   incremental {after:8.3f} ms/rerun")
+
+if __name__ == "__main__":
+    main()
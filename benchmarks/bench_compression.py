@@ -0,0 +1,71 @@
+"""Bytes on the wire and encode/decode time per body encoding, for typical report and session payloads"""
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+import compression
+
+def chat_history(turns: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    questions = ["How much should I save each month?", "Is a SIP better than an FD?", "How do I reduce my EMI?",
+                 "What is a good emergency fund?", "Should I prepay my home loan?"]
+    lines = []
+    for _ in range(turns):
+        lines.append(f"You: {rng.choice(questions)}")
+        lines.append("Bot: " + " ".join(rng.choice(["Aim", "to", "save", "20%", "of", "income,", "keep", "an",
+                                                    "emergency", "fund", "and", "invest", "the", "rest."])
+                                        for _ in range(60)))
+    return "\n".join(lines)
+
+def payloads():
+    report = open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "README.md"), encoding="utf-8").read()
+    yield "report response", {"report": report, "model": "IBM Granite 3.0-1B", "status": "success"}
+    for turns in (20, 200):
+        yield f"session ({turns} turns)", {"session": {"id": 1, "user_type": "student", "income": 3000.0,
+                                                        "expenses": 2100.0, "goal": "laptop", "goal_amount": 1200.0,
+                                                        "chat_history": chat_history(turns)}}
+
+def encoders():
+    yield "json", lambda o: json.dumps(o).encode(), lambda b: json.loads(b)
+    yield "json+gzip", lambda o: compression.compress(json.dumps(o).encode(), "gzip"), lambda b: json.loads(gzip.decompress(b))
+    if compression.brotli is not None:
+        br = compression.brotli
+        yield "json+br", lambda o: compression.compress(json.dumps(o).encode(), "br"), lambda b: json.loads(br.decompress(b))
+    if compression.msgpack is not None:
+        mp = compression.msgpack
+        yield "msgpack", lambda o: mp.packb(o, use_bin_type=True), lambda b: mp.unpackb(b, raw=False)
+        yield "msgpack+gzip", lambda o: compression.compress(mp.packb(o, use_bin_type=True), "gzip"), \
+            lambda b: mp.unpackb(gzip.decompress(b), raw=False)
+
+def best_us(fn, arg, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(arg)
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    for name, payload in payloads():
+        raw = len(json.dumps(payload).encode())
+        print(f"{name}: {raw:,} bytes as plain JSON")
+        for label, encode, decode in encoders():
+            body = encode(payload)
+            print(f"  {label:<13} {len(body):>9,} bytes ({len(body) / raw:6.1%})  "
+                  f"encode {best_us(encode, payload, args.repeat):8.1f} us  decode {best_us(decode, body, args.repeat):8.1f} us")
+        missing = [m for m in ("brotli", "msgpack") if getattr(compression, m) is None]
+        if missing:
+            print(f"  (install {' and '.join(missing)} to include them)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Tokens/sec of Granite report generation per decoding mode, and whether each mode reproduces the
+baseline output. Runs greedy decoding so speculative modes must match standard decoding token for token.
+Needs torch, transformers and the Granite weights (downloaded on first run).
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+import app1
+
+PROMPTS = [
+    "user_type: student\nincome: 1200\nexpenses: 950\ngoal: emergency fund\ngoal_amount: 3000",
+    "user_type: professional\nincome: 8500\nexpenses: 6100\ngoal: house down payment\ngoal_amount: 60000\n"
+    "spending_categories: Rent $2,400.00 (39%), Food $900.00 (15%), Transport $450.00 (7%)",
+    "user_type: professional\nincome: 5000\nexpenses: 5400\ngoal: pay off credit card\ngoal_amount: 7000",
+]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--modes", nargs="+", default=["standard", "prompt_lookup", "assisted"],
+                        choices=app1.DECODING_MODES)
+    parser.add_argument("--repeat", type=int, default=2)
+    args = parser.parse_args()
+
+    if not app1.load_granite_model():
+        sys.exit("Could not load the Granite model")
+    if "assisted" in args.modes and app1.load_draft_model() is None:
+        print("Skipping assisted decoding: set GRANITE_DRAFT_MODEL_ID to a draft model sharing Granite's tokenizer")
+        args.modes.remove("assisted")
+    # Standard decoding is the reference every other mode is compared against, so it always runs first
+    modes = ["standard"] + [m for m in args.modes if m != "standard"]
+
+    full_prompts = [f"Notes: {app1.knowledge_context(p)}\nAnalyze: {p[:200]}... Report:" for p in PROMPTS]
+    # Warm up kernels and caches
+    app1.granite_generate(full_prompts[0], "standard", sample=False)
+
+    baseline = {}
+    for mode in modes:
+        tokens = seconds = 0
+        matches = 0
+        for prompt in full_prompts:
+            for _ in range(args.repeat):
+                text, n, elapsed = app1.granite_generate(prompt, mode, sample=False)
+                tokens += n
+                seconds += elapsed
+            if mode == "standard":
+                baseline[prompt] = text
+            matches += text == baseline[prompt]
+        print(f"{mode:<14} {tokens / seconds:7.1f} tokens/s  "
+              f"outputs identical to standard: {matches}/{len(full_prompts)}")
+
+if __name__ == "__main__":
+    main()
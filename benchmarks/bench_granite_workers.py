@@ -0,0 +1,79 @@
+"""
+Startup time and resident memory of pre-forked Granite workers for each weight loading mode.
+Starts `python app1.py` with GRANITE_WORKERS=N, waits for /health and then reads each worker's
+/proc/<pid>/smaps_rollup: USS (private pages) is what one more worker costs, PSS splits shared pages
+between the processes using them. Linux only; needs torch, transformers and the Granite weights.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+import requests
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+
+def memory_kb(pid: int) -> dict:
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return {"rss": fields["Rss"], "pss": fields["Pss"],
+            "uss": fields["Private_Clean"] + fields["Private_Dirty"]}
+
+def children(pid: int):
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(p) for p in f.read().split()]
+
+def measure(load_mode: str, workers: int, port: int, timeout: float) -> dict:
+    env = {**os.environ, "GRANITE_LOAD_MODE": load_mode, "GRANITE_WORKERS": str(workers),
+           "GRANITE_PORT": str(port), "GRANITE_HOST": "127.0.0.1"}
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "app1.py"], cwd=BACKEND_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            if proc.poll() is not None or time.perf_counter() - start > timeout:
+                raise RuntimeError(f"app1.py did not become healthy ({load_mode}, {workers} workers)")
+            try:
+                if requests.get(f"http://127.0.0.1:{port}/health", timeout=1).ok:
+                    break
+            except requests.RequestException:
+                time.sleep(0.2)
+        startup = time.perf_counter() - start
+        # Give every forked worker time to finish starting uvicorn
+        time.sleep(2)
+        pids = children(proc.pid) if workers > 1 else [proc.pid]
+        usage = [memory_kb(pid) for pid in pids]
+        parent = memory_kb(proc.pid) if workers > 1 else {"rss": 0, "pss": 0, "uss": 0}
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+    return {
+        "startup_s": startup,
+        "workers": len(usage),
+        "uss_mb": sum(u["uss"] for u in usage) / len(usage) / 1024,
+        "pss_mb": sum(u["pss"] for u in usage) / len(usage) / 1024,
+        "total_pss_mb": (sum(u["pss"] for u in usage) + parent["pss"]) / 1024,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--load-modes", nargs="+", default=["pretrained", "mmap"])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--port", type=int, default=8092)
+    parser.add_argument("--timeout", type=float, default=600)
+    args = parser.parse_args()
+
+    for load_mode in args.load_modes:
+        for workers in args.workers:
+            r = measure(load_mode, workers, args.port, args.timeout)
+            print(f"{load_mode:<10} {workers} workers  startup {r['startup_s']:6.1f}s "
+                  f"({r['startup_s'] / workers:5.1f}s per worker)  per-worker USS {r['uss_mb']:7.0f} MB  "
+                  f"PSS {r['pss_mb']:7.0f} MB  total PSS {r['total_pss_mb']:7.0f} MB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Offline accuracy and latency of the finance intent classifier against the old keyword gate"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+import intent_classifier
+
+def keyword_gate(query: str) -> bool:
+    """The substring keyword check /chat used before the classifier"""
+    finance_keywords = [
+        # Core financial terms
+        'finance', 'financial', 'money', 'budget', 'budgeting', 'income', 'expense', 'expenses',
+        'savings', 'save', 'saving', 'investment', 'invest', 'investing', 'portfolio',
+        'loan', 'loans', 'credit', 'debt', 'mortgage', 'interest', 'rate', 'rates',
+        
+        # Tax related
+        'tax', 'taxes', 'taxation', 'deduction', 'deductions', 'refund', 'irs',
+        'filing', 'return', 'exemption', 'taxable', 'income tax', 'gst', 'vat',
+        
+        # Banking and accounts
+        'bank', 'banking', 'account', 'checking', 'deposit', 'withdrawal',
+        'atm', 'card', 'payment', 'transaction', 'balance', 'statement',
+        
+        # Insurance and financial products
+        'insurance', 'policy', 'premium', 'claim', 'retirement', 'pension',
+        '401k', 'ira', 'mutual fund', 'etf', 'stock', 'stocks', 'bond', 'bonds',
+        
+        # Financial planning
+        'goal', 'goals', 'planning', 'wealth', 'asset', 'assets', 'liability',
+        'net worth', 'cash flow', 'emergency fund', 'financial plan',
+        
+        # Business finance
+        'business', 'startup', 'revenue', 'profit', 'loss', 'accounting',
+        'bookkeeping', 'invoice', 'payroll', 'entrepreneur',
+        
+        # Economic terms
+        'economy', 'economic', 'inflation', 'recession', 'market', 'currency',
+        'exchange', 'forex', 'commodity', 'real estate', 'property'
+    ]
+    
+    query_lower = query.lower()
+    return any(keyword in query_lower for keyword in finance_keywords)
+
+def report(name: str, predicted, labels):
+    predicted = np.asarray(predicted, dtype=bool)
+    tp = np.sum(predicted & labels)
+    precision = tp / max(predicted.sum(), 1)
+    recall = tp / max(labels.sum(), 1)
+    # Off-topic queries that would have gone to Groq, and finance queries that would have been refused
+    wasted = np.sum(predicted & ~labels)
+    refused = np.sum(~predicted & labels)
+    print(f"{name:<12} accuracy {np.mean(predicted == labels):6.1%}  precision {precision:6.1%}  recall {recall:6.1%}  "
+          f"wasted upstream calls {wasted:3d}  refused finance questions {refused:3d}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--eval-file", default=str(intent_classifier.DATA_DIR / "finance_intents_eval.tsv"))
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    classifier = intent_classifier.FinanceIntentClassifier.load()
+    load_ms = (time.perf_counter() - start) * 1000
+
+    examples = intent_classifier.load_examples(args.eval_file)
+    texts = [text for _, text in examples]
+    labels = np.array([label for label, _ in examples], dtype=bool)
+    print(f"{len(examples)} held-out queries, model loaded in {load_ms:.1f} ms\n")
+    report("keywords", [keyword_gate(t) for t in texts], labels)
+    report("classifier", classifier.predict_batch(texts), labels)
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for text in texts:
+            classifier.score(text)
+    single_us = (time.perf_counter() - start) / (args.repeat * len(texts)) * 1e6
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        classifier.score_batch(texts)
+    batch_us = (time.perf_counter() - start) / (args.repeat * len(texts)) * 1e6
+    print(f"\nscore(): {single_us:.1f} us/query   score_batch(): {batch_us:.1f} us/query")
+
+if __name__ == "__main__":
+    main()
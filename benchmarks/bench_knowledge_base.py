@@ -0,0 +1,66 @@
+"""Search latency and recall of the knowledge index, flat scan vs IVF, on a synthetic corpus"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+import knowledge_base
+
+TOPICS = ["emergency fund", "credit card debt", "home loan", "index fund", "term insurance", "income tax",
+          "retirement corpus", "mutual fund SIP", "fixed deposit", "gold", "budget", "car loan"]
+WORDS = ("save invest repay interest rate monthly yearly return risk tenure premium deduction salary expense "
+         "inflation goal corpus withdraw compound liquidity emi principal balance allocation rebalance").split()
+
+def write_corpus(directory: Path, documents: int, seed: int = 0):
+    rng = random.Random(seed)
+    for d in range(documents):
+        topic = rng.choice(TOPICS)
+        sections = [f"# {topic.title()} notes {d}"]
+        for s in range(3):
+            body = " ".join(rng.choice(WORDS) for _ in range(120))
+            sections.append(f"## {topic} part {s}\n{topic} {body}")
+        (directory / f"doc{d}.md").write_text("\n\n".join(sections), encoding="utf-8")
+
+def time_queries(index, queries, nprobe):
+    start = time.perf_counter()
+    results = [[h["text"] for h in index.search(q, k=5, nprobe=nprobe)] for q in queries]
+    return (time.perf_counter() - start) / len(queries) * 1e6, results
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--documents", type=int, default=3000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    queries = [f"{rng.choice(TOPICS)} {' '.join(rng.sample(WORDS, 4))}" for _ in range(args.queries)]
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus, index_dir = Path(tmp) / "knowledge", Path(tmp) / "index"
+        corpus.mkdir()
+        write_corpus(corpus, args.documents)
+
+        start = time.perf_counter()
+        meta = knowledge_base.build_index(corpus, index_dir, ivf_lists=0)
+        print(f"{meta['chunks']} chunks, flat build {time.perf_counter() - start:.1f}s")
+        flat_us, exact = time_queries(knowledge_base.KnowledgeIndex(index_dir), queries, 0)
+        print(f"flat      {flat_us:8.1f} us/query")
+
+        lists = int(np.sqrt(meta["chunks"]))
+        start = time.perf_counter()
+        knowledge_base.build_index(corpus, index_dir, ivf_lists=lists)
+        print(f"IVF build with {lists} lists {time.perf_counter() - start:.1f}s")
+        index = knowledge_base.KnowledgeIndex(index_dir)
+        for nprobe in (1, 4, 8):
+            us, approx = time_queries(index, queries, nprobe)
+            recall = np.mean([len(set(a) & set(e)) / max(len(e), 1) for a, e in zip(approx, exact)])
+            print(f"IVF n={nprobe:<3} {us:8.1f} us/query  recall@5 {recall:.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""Benchmark the Monte Carlo goal simulator (target: 100k paths in under a second on a multi-core box)"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from monte_carlo import simulate_goal_success
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--paths", type=int, nargs="+", default=[10_000, 50_000, 100_000])
+    parser.add_argument("--months", type=int, default=120)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    # Warm up the process pool so pool start-up is not counted
+    simulate_goal_success(50_000, 5_000, 3_500, months=args.months, n_paths=100_000, seed=1)
+
+    for n_paths in args.paths:
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            result = simulate_goal_success(50_000, 5_000, 3_500, months=args.months, n_paths=n_paths, seed=42)
+            timings.append(time.perf_counter() - start)
+        # The simulator clamps n_paths to MAX_PATHS, so report what actually ran
+        print(f"{result['paths']:>9,} paths x {args.months} months: best {min(timings):.3f}s  "
+              f"probability={result['probability']:.3f}")
+
+if __name__ == "__main__":
+    main()
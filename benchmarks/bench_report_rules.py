@@ -0,0 +1,46 @@
+"""Latency floor of the structured fallback report: parse once, evaluate the rule table, render"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+import report_rules
+
+def raw_contents(n: int, seed: int = 0):
+    rng = random.Random(seed)
+    for _ in range(n):
+        income = rng.randint(500, 20000)
+        yield (f"user_type: {rng.choice(['student', 'professional', 'general'])}\n"
+               f"income: {income}\nexpenses: {rng.randint(100, int(income * 1.3))}\n"
+               f"goal: {rng.choice(['laptop', 'car', 'house', ''])}\ngoal_amount: {rng.choice(['', rng.randint(1000, 90000)])}\n"
+               f"chat_history: {'x' * 400}")
+
+def best_of(repeat: int, fn) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--reports", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    contents = list(raw_contents(args.reports))
+    profiles = [report_rules.FinancialProfile.parse(c) for c in contents]
+
+    parse = best_of(args.repeat, lambda: [report_rules.FinancialProfile.parse(c) for c in contents])
+    evaluate = best_of(args.repeat, lambda: [report_rules.evaluate(p) for p in profiles])
+    render = best_of(args.repeat, lambda: ["\n".join("\n".join(lines) for lines in report_rules.evaluate(
+        report_rules.FinancialProfile.parse(c)).values()) for c in contents])
+    for name, seconds in (("parse", parse), ("evaluate", evaluate), ("parse + evaluate + join", render)):
+        print(f"{name:<24} {seconds / args.reports * 1e6:7.2f} us/report")
+
+if __name__ == "__main__":
+    main()
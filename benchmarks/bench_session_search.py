@@ -0,0 +1,81 @@
+"""Benchmark full-text session search latency on a large synthetic sessions table"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+import session_search
+
+GOALS = ["Emergency Fund", "Car", "House down payment", "Wedding", "Vacation", "Retirement", "Laptop",
+         "Education loan payoff", "Credit card debt", "Start a business"]
+PHRASES = ["How should I budget my salary?", "Is a SIP better than a fixed deposit?", "How do I reduce my taxes?",
+           "Should I pay off my education loan early?", "What is a good emergency fund size?",
+           "How much should I invest in mutual funds?", "Explain the 50/30/20 rule",
+           "How can I improve my credit score?", "Is term insurance worth it?", "How do I save for a house?"]
+
+def populate(conn, count: int, seed: int = 3):
+    rng = random.Random(seed)
+    conn.execute('''CREATE TABLE sessions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_type TEXT,
+        chat_history TEXT,
+        income REAL,
+        expenses REAL,
+        goal TEXT,
+        goal_amount REAL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''')
+    session_search.init_search_schema(conn)
+    batch = []
+    for i in range(count):
+        chat = "\n".join(f"You: {rng.choice(PHRASES)}\nBot: Here is some advice about {rng.choice(GOALS).lower()}."
+                         for _ in range(rng.randint(1, 4)))
+        income = rng.randrange(500, 20000)
+        created = f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} {rng.randint(0, 23):02d}:00:00"
+        batch.append((rng.choice(["student", "professional"]), chat, income, income * rng.uniform(0.3, 1.1),
+                      rng.choice(GOALS), rng.randrange(1000, 100000), created))
+        if len(batch) == 10000:
+            conn.executemany("""INSERT INTO sessions (user_type, chat_history, income, expenses, goal, goal_amount,
+                                created_at) VALUES (?, ?, ?, ?, ?, ?, ?)""", batch)
+            batch = []
+    if batch:
+        conn.executemany("""INSERT INTO sessions (user_type, chat_history, income, expenses, goal, goal_amount,
+                            created_at) VALUES (?, ?, ?, ?, ?, ?, ?)""", batch)
+    conn.commit()
+
+def timed(label, fn, repeat=20):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    elapsed = (time.perf_counter() - start) / repeat * 1000
+    print(f"{label:<55} {elapsed:8.2f} ms  ({len(result['results'])} results)")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sessions", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, "bench.db"))
+        start = time.perf_counter()
+        populate(conn, args.sessions)
+        print(f"indexed {args.sessions:,} sessions in {time.perf_counter() - start:.1f}s")
+
+        timed("rare phrase", lambda: session_search.search_sessions(conn, '"term insurance" wedding'))
+        timed("common term, top 20", lambda: session_search.search_sessions(conn, "budget"), repeat=3)
+        page = timed("filters only (professional, income 5k-6k)", lambda: session_search.search_sessions(
+            conn, user_type="professional", min_income=5000, max_income=6000))
+        timed("filters only, next page", lambda: session_search.search_sessions(
+            conn, user_type="professional", min_income=5000, max_income=6000, cursor=page["next_cursor"]))
+        timed("date range", lambda: session_search.search_sessions(conn, start_date="2024-03-01", end_date="2024-03-02"))
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Session write throughput versus SESSION_SHARDS.
+Several writer processes save sessions the way /save-session does, one transaction per session, through
+session_shards.save_session. SESSION_SHARDS=0 is the unsharded baseline (every write goes to financebot.db);
+1 shard isolates the effect of WAL mode, more shards add parallel writers.
+"""
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+import session_export
+import session_search
+import session_shards
+
+CHAT = "You: How should I budget my salary?\nBot: Start with the 50/30/20 rule and automate your savings.\n" * 4
+
+def configure(shards: int):
+    session_shards.SESSION_SHARDS = shards
+    session_shards.SHARD_DIR = Path("shards")
+
+def writer(shards: int, count: int, start_barrier, results):
+    configure(shards)
+    start_barrier.wait()
+    start = time.perf_counter()
+    for i in range(count):
+        session_shards.save_session("professional", CHAT, 5000 + i, 3200, "House down payment", 500000)
+    results.put(time.perf_counter() - start)
+
+def measure(shards: int, writers: int, count: int) -> float:
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        conn = sqlite3.connect(session_shards.DB_PATH)
+        session_export.ensure_sessions_table(conn)
+        session_search.init_search_schema(conn)
+        conn.close()
+        configure(shards)
+        session_shards.init_shards()
+
+        start_barrier = multiprocessing.Barrier(writers + 1)
+        results = multiprocessing.Queue()
+        procs = [multiprocessing.Process(target=writer, args=(shards, count, start_barrier, results))
+                 for _ in range(writers)]
+        for p in procs:
+            p.start()
+        start_barrier.wait()
+        start = time.perf_counter()
+        for p in procs:
+            p.join()
+        elapsed = time.perf_counter() - start
+        os.chdir("/")
+        if any(p.exitcode for p in procs):
+            raise RuntimeError("a writer process failed")
+        return writers * count / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--shards", default="0,1,2,4,8")
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--sessions", type=int, default=500, help="Sessions saved by each writer")
+    args = parser.parse_args()
+
+    print(f"{args.writers} writers x {args.sessions} sessions")
+    baseline = None
+    for shards in [int(n) for n in args.shards.split(",")]:
+        rate = measure(shards, args.writers, args.sessions)
+        baseline = baseline or rate
+        print(f"shards={shards:<3} {rate:10.0f} sessions/s  ({rate / baseline:.2f}x)")
+
+if __name__ == "__main__":
+    main()
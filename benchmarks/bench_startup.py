@@ -0,0 +1,82 @@
+"""
+Import-time profile and cold start of the backend.
+Prints the slowest imports of `main` (from python -X importtime) and the time from launching uvicorn to
+the first /health response for each FINANCEBOT_PROFILE.
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+def import_profile(module: str, env: dict) -> list:
+    """(cumulative us, self us, depth, module) for every import made by `import module`"""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=BACKEND_DIR,
+                         env=env, capture_output=True, text=True)
+    if out.returncode:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1])
+    rows = []
+    for line in out.stderr.splitlines():
+        m = IMPORTTIME_LINE.match(line)
+        if m:
+            rows.append((int(m.group(2)), int(m.group(1)), len(m.group(3)) // 2, m.group(4)))
+    return rows
+
+def cold_start(profile: str, port: int, workdir: str, timeout: float = 60) -> float:
+    env = {**os.environ, "FINANCEBOT_PROFILE": profile, "PYTHONPATH": BACKEND_DIR}
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+                            cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with status {proc.returncode}")
+            try:
+                if requests.get(f"http://127.0.0.1:{port}/health", timeout=0.5).ok:
+                    return time.perf_counter() - start
+            except requests.RequestException:
+                time.sleep(0.01)
+        raise RuntimeError("backend did not become healthy")
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--module", default="main", help="Module to profile (main or app1)")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--profiles", nargs="+", default=["full", "chat"])
+    parser.add_argument("--port", type=int, default=8097)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    rows = import_profile(args.module, dict(os.environ))
+    end = next(i for i, r in enumerate(rows) if r[3] == args.module and r[2] == 0)
+    # importtime prints children before their parent, so the module's own imports directly precede it
+    start = max((i + 1 for i in range(end) if rows[i][2] == 0), default=0)
+    print(f"import {args.module}: {rows[end][0] / 1000:.0f} ms; slowest direct imports:")
+    for cumulative, own, depth, name in sorted((r for r in rows[start:end] if r[2] == 1), reverse=True)[:args.top]:
+        print(f"  {cumulative / 1000:7.1f} ms  {name}")
+    print("heavy stacks loaded: " + (", ".join(m for m in ("torch", "transformers", "docx")
+                                                if any(r[3] == m for r in rows)) or "none"))
+
+    if args.module != "main":
+        return
+    # A scratch working directory so the benchmark does not touch the real database
+    with tempfile.TemporaryDirectory() as workdir:
+        subprocess.run([sys.executable, os.path.join(BACKEND_DIR, "..", "database", "setup.py")], cwd=workdir,
+                       stdout=subprocess.DEVNULL, check=True)
+        cold_start("full", args.port, workdir)  # builds the knowledge index once
+        for profile in args.profiles:
+            timings = [cold_start(profile, args.port, workdir) for _ in range(args.runs)]
+            print(f"cold start ({profile} profile): best {min(timings):.2f}s of {args.runs}")
+
+if __name__ == "__main__":
+    main()
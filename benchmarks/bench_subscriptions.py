@@ -0,0 +1,79 @@
+"""Benchmark the recurring-subscription detector on large transaction histories"""
+import argparse
+import datetime
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+import transactions
+import subscriptions
+
+SUBSCRIPTIONS = [("NETFLIX COM", 15.49, 30), ("SPOTIFY", 9.99, 30), ("GYM MEMBERSHIP", 40.0, 30),
+                 ("ICLOUD STORAGE", 2.99, 30), ("AMAZON PRIME", 139.0, 365), ("WEEKLY MEAL KIT", 59.0, 7)]
+
+def generate_rows(session_id: int, count: int, start: datetime.date, seed: int):
+    """Random one-off purchases mixed with a handful of true subscriptions"""
+    rng = random.Random(seed)
+    merchants = [f"STORE {i:05d}" for i in range(5000)]
+    days = max(count // 200, 365)
+    rows = []
+    for merchant, amount, period in SUBSCRIPTIONS:
+        for day in range(0, days, period):
+            rows.append((session_id, (start + datetime.timedelta(days=day)).isoformat(), merchant, merchant,
+                         -amount, "subscriptions"))
+    while len(rows) < count:
+        day = start + datetime.timedelta(days=rng.randrange(days))
+        merchant = rng.choice(merchants)
+        rows.append((session_id, day.isoformat(), merchant, merchant, -round(rng.uniform(3, 300), 2), "other"))
+    rows.sort(key=lambda row: row[1])
+    return rows
+
+def insert(conn, rows):
+    with conn:
+        conn.executemany("""
+            INSERT INTO transactions (session_id, posted_date, description, merchant, amount, category)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, rows)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--transactions", type=int, default=1_000_000)
+    parser.add_argument("--increment", type=int, default=1_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, "bench.db"))
+        transactions.init_transactions_schema(conn)
+
+        rows = generate_rows(1, args.transactions, datetime.date(2015, 1, 1), seed=7)
+        start = time.perf_counter()
+        insert(conn, rows)
+        print(f"inserted {len(rows):,} transactions in {time.perf_counter() - start:.2f}s")
+
+        start = time.perf_counter()
+        found = subscriptions.update_subscriptions(conn, 1)
+        full = time.perf_counter() - start
+        planted = {merchant for merchant, _, _ in SUBSCRIPTIONS}
+        detected = {item["merchant"] for item in found} & planted
+        print(f"full scan:   {full:.2f}s ({len(rows) / full:,.0f} transactions/s)")
+        false_positives = len(found) - len(detected)
+        print(f"detected {len(detected)}/{len(planted)} planted subscriptions, "
+              f"{false_positives} flagged among random one-off purchases")
+        # Random purchases spread over 5000 merchants should almost never look recurring
+        assert false_positives <= max(len(planted) // 2, 1), "detector flags random purchases as subscriptions"
+
+        last = datetime.date.fromisoformat(rows[-1][1])
+        new_rows = generate_rows(1, args.increment, last + datetime.timedelta(days=1), seed=8)
+        insert(conn, new_rows)
+        start = time.perf_counter()
+        subscriptions.update_subscriptions(conn, 1)
+        print(f"incremental: {time.perf_counter() - start:.3f}s for {len(new_rows):,} new transactions")
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,8 @@ import sqlite3
 def init_db():
     conn = sqlite3.connect('financebot.db')
     c = conn.cursor()
+    # Lets session maintenance return free pages without a full VACUUM; only takes effect on a new file
+    c.execute("PRAGMA auto_vacuum = INCREMENTAL")
     c.execute('''CREATE TABLE IF NOT EXISTS sessions (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         user_type TEXT,
@@ -11,7 +13,8 @@ def init_db():
         expenses REAL,
         goal TEXT,
         goal_amount REAL,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        chat_history_z BLOB
     )''')
     conn.commit()
     conn.close()
@@ -0,0 +1,77 @@
+import gzip
+import json
+import os
+import uuid
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Backend location and timeouts (seconds), configurable through the environment
+BACKEND_URL = os.getenv("FINANCEBOT_BACKEND_URL", "http://localhost:8000").rstrip("/")
+DEFAULT_TIMEOUT = float(os.getenv("FINANCEBOT_TIMEOUT", "30"))
+REPORT_TIMEOUT = float(os.getenv("FINANCEBOT_REPORT_TIMEOUT", "120"))
+CACHE_TTL = int(os.getenv("FINANCEBOT_CACHE_TTL", "300"))
+# Identifies this frontend to the backend rate limiter; without it all users share the server's IP budget
+API_KEY = os.getenv("FINANCEBOT_API_KEY", "")
+# Request bodies at least this large (e.g. reports carrying the whole chat history) are sent gzipped
+COMPRESS_MIN_BYTES = int(os.getenv("FINANCEBOT_COMPRESS_MIN_BYTES", "2048"))
+
+@st.cache_resource
+def get_http_session() -> requests.Session:
+    """One keep-alive connection pool shared by every script rerun and browser session"""
+    session = requests.Session()
+    # Only idempotent requests (GET) are retried; POSTs are never replayed
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=Retry(total=2, backoff_factor=0.2))
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    if API_KEY:
+        session.headers["X-API-Key"] = API_KEY
+    return session
+
+def client_headers() -> dict:
+    """
+    Per-browser-session id; with API_KEY set the backend gives each one its own rate-limit budget instead of
+    one budget for every user of this frontend (it ignores the id without a known key)
+    """
+    if "client_id" not in st.session_state:
+        st.session_state["client_id"] = uuid.uuid4().hex
+    return {"X-Client-Id": st.session_state["client_id"]}
+
+def post(path: str, payload: dict, timeout: float = DEFAULT_TIMEOUT) -> requests.Response:
+    body = json.dumps(payload).encode()
+    headers = {"Content-Type": "application/json", **client_headers()}
+    if len(body) >= COMPRESS_MIN_BYTES:
+        body = gzip.compress(body, compresslevel=6)
+        headers["Content-Encoding"] = "gzip"
+    # Responses are decompressed by requests, which advertises gzip (and br when brotli is installed)
+    return get_http_session().post(f"{BACKEND_URL}{path}", data=body, headers=headers, timeout=timeout)
+
+def get(path: str, timeout: float = DEFAULT_TIMEOUT, params: dict = None) -> requests.Response:
+    return get_http_session().get(f"{BACKEND_URL}{path}", params=params, headers=client_headers(), timeout=timeout)
+
+def chat(message: str, user_type: str, language: str) -> str:
+    data = post("/chat", {"message": message, "user_type": user_type, "language": language}).json()
+    # Rate-limited or shed requests come back as {"error": ...}
+    return data.get("response") or f"⚠️ {data.get('error', 'Unknown error')}"
+
+# Deterministic calls are memoized on their inputs so reruns do not hit the backend again
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def get_session(session_id: int) -> dict:
+    return get(f"/get-session/{session_id}").json()
+
+def save_session(save_data: dict) -> dict:
+    return post("/save-session", save_data).json()
+
+# Reports run as background jobs on the backend; submit returns a job ID to poll
+def submit_report_job(path: str, payload: dict) -> dict:
+    return post(path, {**payload, "async": True}).json()
+
+def get_report_job(job_id: str) -> dict:
+    return get(f"/report-jobs/{job_id}").json()
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def get_report_job_docx(job_id: str) -> bytes:
+    resp = get(f"/report-jobs/{job_id}/docx", timeout=REPORT_TIMEOUT)
+    resp.raise_for_status()
+    return resp.content
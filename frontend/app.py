@@ -1,6 +1,14 @@
 import streamlit as st
-import requests
+import sys
+import time
 from datetime import datetime
+from pathlib import Path
+import api_client
+from chat_view import ChatLog, PAGE_SIZE
+
+# Budgeting rules are shared with the backend and evaluated in-process
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+import finance_rules
 
 # Page configuration
 st.set_page_config(
@@ -91,8 +99,46 @@ with st.sidebar:
     
 
 # Initialize chat history
-if "chat_history" not in st.session_state:
-    st.session_state["chat_history"] = []
+if "chat_log" not in st.session_state:
+    st.session_state["chat_log"] = ChatLog()
+    st.session_state["chat_visible"] = PAGE_SIZE
+chat_log = st.session_state["chat_log"]
+
+# Background report jobs by kind ("comprehensive", "word", "analysis"); polled until they finish,
+# then the finished job is kept in report_results so later reruns do not fetch it again
+POLL_INTERVAL = 2
+if "report_jobs" not in st.session_state:
+    st.session_state["report_jobs"] = {}
+    st.session_state["report_results"] = {}
+jobs_pending = False
+
+def submit_report_job(kind: str, path: str, payload: dict):
+    resp = api_client.submit_report_job(path, payload)
+    if "job_id" in resp:
+        st.session_state["report_jobs"][kind] = resp["job_id"]
+        st.session_state["report_results"].pop(kind, None)
+    else:
+        st.markdown(f'<div class="warning-card">Could not queue the report: {resp.get("error", "Unknown error")}</div>', unsafe_allow_html=True)
+
+def poll_report_job(kind: str, label: str):
+    """Finished job for this kind, or None while it is still queued or running (or none was submitted)"""
+    global jobs_pending
+    job_id = st.session_state["report_jobs"].get(kind)
+    if not job_id:
+        return st.session_state["report_results"].get(kind)
+    job = api_client.get_report_job(job_id)
+    if job.get("status") in ("queued", "running"):
+        jobs_pending = True
+        st.markdown(f'<div class="info-card">⏳ {label} is {job["status"]}... this page refreshes automatically.</div>', unsafe_allow_html=True)
+        return None
+    if job.get("status") != "done":
+        # Show a failure once, then forget the job so the button can be used again
+        del st.session_state["report_jobs"][kind]
+        st.markdown(f'<div class="warning-card">{label} failed: {job.get("error", "Unknown error")}</div>', unsafe_allow_html=True)
+        return None
+    del st.session_state["report_jobs"][kind]
+    st.session_state["report_results"][kind] = job
+    return job
 
 # Main content area with tabs
 tab1, tab2, tab3, tab4 = st.tabs(["💬 Chat", "💰 Budget & Goals", "📊 AI Reports", "💾 Sessions"])
@@ -106,28 +152,27 @@ with tab1:
 
     if st.button("📤 Send Message", use_container_width=True) and user_input:
         with st.spinner("🤔 Thinking..."):
-            response = requests.post(
-                "http://localhost:8000/chat",
-                json={"message": user_input, "user_type": user_type.lower(), "language": language_api}
-            ).json()["response"]
-            st.session_state["chat_history"].append(("You", user_input))
-            st.session_state["chat_history"].append(("Bot", response))
+            response = api_client.chat(user_input, user_type.lower(), language_api)
+            chat_log.append("You", user_input)
+            chat_log.append("Bot", response)
 
     st.markdown('</div>', unsafe_allow_html=True)
     
     # Chat history with cards
-    if st.session_state["chat_history"]:
+    if len(chat_log):
         st.markdown('<div class="card">', unsafe_allow_html=True)
         st.subheader("💬 Conversation History")
         
-        for sender, msg in st.session_state["chat_history"]:
-            if sender == "You":
-                st.markdown(f'<div class="chat-message user-message"><strong>👤 You:</strong> {msg}</div>', unsafe_allow_html=True)
-            else:
-                st.markdown(f'<div class="chat-message bot-message"><strong>🤖 Assistant:</strong> {msg}</div>', unsafe_allow_html=True)
+        # Only the most recent window is emitted; older messages are paged in on request
+        hidden = len(chat_log) - st.session_state["chat_visible"]
+        if hidden > 0 and st.button(f"⬆️ Show older messages ({hidden} hidden)"):
+            st.session_state["chat_visible"] += PAGE_SIZE
+            st.rerun()
+        st.markdown(chat_log.window_html(st.session_state["chat_visible"]), unsafe_allow_html=True)
         
         if st.button("🗑️ Clear Chat History"):
-            st.session_state["chat_history"] = []
+            chat_log.clear()
+            st.session_state["chat_visible"] = PAGE_SIZE
             st.rerun()
             
         st.markdown('</div>', unsafe_allow_html=True)
@@ -154,8 +199,9 @@ with tab2:
         
         col1, col2, col3, col4 = st.columns(4)
         
-        savings = income - expenses
-        savings_rate = (savings / income * 100) if income > 0 else 0
+        metrics = finance_rules.savings_metrics(income, expenses)
+        savings = metrics["savings"]
+        savings_rate = metrics["savings_rate"]
         
         with col1:
             st.markdown(f'<div class="metric-card"><h4>💵 Income</h4><h3>${income:,.2f}</h3></div>', unsafe_allow_html=True)
@@ -173,38 +219,26 @@ with tab2:
         
         st.markdown('</div>', unsafe_allow_html=True)
     
-    # Action buttons
+    # Analysis updates live as the inputs change - no backend round trip needed
     st.markdown('<div class="card">', unsafe_allow_html=True)
     st.subheader("🔍 Financial Analysis")
     
     col1, col2, col3 = st.columns(3)
     
     with col1:
-        if st.button("📊 Get Budget Summary", use_container_width=True):
-            with st.spinner("Analyzing your budget..."):
-                summary = requests.post(
-                    "http://localhost:8000/budget-summary",
-                    json={"income": income, "expenses": expenses}
-                ).json()["summary"]
-                st.markdown(f'<div class="success-card">{summary}</div>', unsafe_allow_html=True)
+        st.markdown("**📊 Budget Summary**")
+        summary = finance_rules.budget_summary(income, expenses)
+        st.markdown(f'<div class="success-card">{summary}</div>', unsafe_allow_html=True)
 
     with col2:
-        if st.button("🎯 Calculate Goal Savings", use_container_width=True):
-            with st.spinner("Calculating savings needed..."):
-                result = requests.post(
-                    "http://localhost:8000/goal-calculation",
-                    json={"goal": goal, "goal_amount": goal_amount, "income": income, "expenses": expenses}
-                ).json()["monthly_amount"]
-                st.markdown(f'<div class="info-card">You need to save: <strong>${result:.2f} per month</strong> for your goal.</div>', unsafe_allow_html=True)
+        st.markdown("**🎯 Goal Savings**")
+        result = finance_rules.goal_calculation(goal_amount, income, expenses)["monthly_amount"]
+        st.markdown(f'<div class="info-card">You need to save: <strong>${result:.2f} per month</strong> for your goal.</div>', unsafe_allow_html=True)
 
     with col3:
-        if st.button("💡 Spending Insights", use_container_width=True):
-            with st.spinner("Analyzing spending patterns..."):
-                insights = requests.post(
-                    "http://localhost:8000/spending-insights",
-                    json={"income": income, "expenses": expenses}
-                ).json()["insights"]
-                st.markdown(f'<div class="warning-card">{insights}</div>', unsafe_allow_html=True)
+        st.markdown("**💡 Spending Insights**")
+        insights = finance_rules.spending_insights(income, expenses)
+        st.markdown(f'<div class="warning-card">{insights}</div>', unsafe_allow_html=True)
     
     st.markdown('</div>', unsafe_allow_html=True)
 
@@ -243,7 +277,7 @@ with tab3:
     # Handle online report generation
     if generate_report:
         if income > 0 or expenses > 0 or goal:
-            chat_history_str = "\n".join([f"{sender}: {msg}" for sender, msg in st.session_state["chat_history"]])
+            chat_history_str = chat_log.serialized
             report_data = {
                 "user_type": user_type.lower(),
                 "income": income,
@@ -253,28 +287,29 @@ with tab3:
                 "chat_history": chat_history_str
             }
             
-            with st.spinner("🧠 Generating comprehensive financial analysis..."):
-                try:
-                    resp = requests.post("http://localhost:8000/generate-comprehensive-report", json=report_data, timeout=120).json()
-                    if resp.get("status") == "success":
-                        st.markdown('<div class="success-card"><h4>📊 Comprehensive Financial Report Generated!</h4></div>', unsafe_allow_html=True)
-                        st.markdown('<div class="card">', unsafe_allow_html=True)
-                        st.text_area("📋 Report Content", resp["report"], height=400)
-                        st.markdown(f'<div class="info-card">Generated by: <strong>{resp.get("model", "AI Assistant")}</strong></div>', unsafe_allow_html=True)
-                        st.markdown('</div>', unsafe_allow_html=True)
-                    else:
-                        st.markdown(f'<div class="warning-card">Report generation failed: {resp.get("error", "Unknown error")}</div>', unsafe_allow_html=True)
-                except requests.exceptions.ReadTimeout:
-                    st.markdown('<div class="warning-card">⏱️ Report generation is taking longer than expected. Please try again - the system will use a faster analysis method.</div>', unsafe_allow_html=True)
-                except Exception as e:
-                    st.markdown(f'<div class="warning-card">Error connecting to AI report service: {e}</div>', unsafe_allow_html=True)
+            try:
+                submit_report_job("comprehensive", "/generate-comprehensive-report", report_data)
+            except Exception as e:
+                st.markdown(f'<div class="warning-card">Error connecting to AI report service: {e}</div>', unsafe_allow_html=True)
         else:
             st.markdown('<div class="warning-card">Please provide some financial data (income, expenses, or goals) to generate a meaningful report.</div>', unsafe_allow_html=True)
 
+    try:
+        job = poll_report_job("comprehensive", "Comprehensive report")
+        if job:
+            resp = job["result"]
+            st.markdown('<div class="success-card"><h4>📊 Comprehensive Financial Report Generated!</h4></div>', unsafe_allow_html=True)
+            st.markdown('<div class="card">', unsafe_allow_html=True)
+            st.text_area("📋 Report Content", resp["report"], height=400)
+            st.markdown(f'<div class="info-card">Generated by: <strong>{resp.get("model", "AI Assistant")}</strong></div>', unsafe_allow_html=True)
+            st.markdown('</div>', unsafe_allow_html=True)
+    except Exception as e:
+        st.markdown(f'<div class="warning-card">Error connecting to AI report service: {e}</div>', unsafe_allow_html=True)
+
     # Handle Word document download
     if download_report:
         if income > 0 or expenses > 0 or goal:
-            chat_history_str = "\n".join([f"{sender}: {msg}" for sender, msg in st.session_state["chat_history"]])
+            chat_history_str = chat_log.serialized
             report_data = {
                 "user_type": user_type.lower(),
                 "income": income,
@@ -284,35 +319,30 @@ with tab3:
                 "chat_history": chat_history_str
             }
             
-            with st.spinner("📝 Generating downloadable Word report..."):
-                try:
-                    # Make request to get Word document
-                    response = requests.post(
-                        "http://localhost:8000/generate-word-report", 
-                        json=report_data, 
-                        timeout=120
-                    )
-                    
-                    if response.status_code == 200:
-                        # Create download button
-                        st.markdown('<div class="success-card"><h4>📄 Word Report Generated Successfully!</h4></div>', unsafe_allow_html=True)
-                        st.download_button(
-                            label="💾 Download Financial Report.docx",
-                            data=response.content,
-                            file_name=f"financial_report_{user_type.lower()}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.docx",
-                            mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-                            use_container_width=True
-                        )
-                        st.markdown('<div class="info-card">✅ Your comprehensive financial report is ready for download!</div>', unsafe_allow_html=True)
-                    else:
-                        st.markdown('<div class="warning-card">Failed to generate Word document. Please try again.</div>', unsafe_allow_html=True)
-                        
-                except requests.exceptions.ReadTimeout:
-                    st.markdown('<div class="warning-card">⏱️ Document generation is taking longer than expected. Please try again.</div>', unsafe_allow_html=True)
-                except Exception as e:
-                    st.markdown(f'<div class="warning-card">Error generating Word document: {e}</div>', unsafe_allow_html=True)
+            try:
+                submit_report_job("word", "/generate-word-report", report_data)
+            except Exception as e:
+                st.markdown(f'<div class="warning-card">Error generating Word document: {e}</div>', unsafe_allow_html=True)
         else:
             st.markdown('<div class="warning-card">Please provide some financial data (income, expenses, or goals) to generate a meaningful report.</div>', unsafe_allow_html=True)
+
+    try:
+        job = poll_report_job("word", "Word report")
+        if job:
+            if "docx" not in job:
+                # Downloaded once; the job (and its file) expire on the backend
+                job["docx"] = api_client.get_report_job_docx(job["job_id"])
+            st.markdown('<div class="success-card"><h4>📄 Word Report Generated Successfully!</h4></div>', unsafe_allow_html=True)
+            st.download_button(
+                label="💾 Download Financial Report.docx",
+                data=job["docx"],
+                file_name=f"financial_report_{user_type.lower()}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.docx",
+                mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+                use_container_width=True
+            )
+            st.markdown('<div class="info-card">✅ Your comprehensive financial report is ready for download!</div>', unsafe_allow_html=True)
+    except Exception as e:
+        st.markdown(f'<div class="warning-card">Error generating Word document: {e}</div>', unsafe_allow_html=True)
     
     st.markdown('</div>', unsafe_allow_html=True)
 
@@ -325,7 +355,7 @@ with tab4:
     st.subheader("💾 Save Current Session")
     
     if st.button("🔒 Save Current Session", use_container_width=True):
-        chat_history_str = "\n".join([f"{sender}: {msg}" for sender, msg in st.session_state["chat_history"]])
+        chat_history_str = chat_log.serialized
         save_data = {
             "user_type": user_type.lower(),
             "chat_history": chat_history_str,
@@ -337,7 +367,7 @@ with tab4:
         
         with st.spinner("Saving session..."):
             try:
-                resp = requests.post("http://localhost:8000/save-session", json=save_data).json()
+                resp = api_client.save_session(save_data)
                 if "session_id" in resp:
                     st.markdown(f'<div class="success-card"><h4>✅ Session Saved Successfully!</h4><p>Session ID: <strong>{resp["session_id"]}</strong></p><p>Keep this ID to load your session later.</p></div>', unsafe_allow_html=True)
                 else:
@@ -359,7 +389,7 @@ with tab4:
             try:
                 session_id = int(session_id_input)
                 with st.spinner("Loading session..."):
-                    resp = requests.get(f"http://localhost:8000/get-session/{session_id}").json()
+                    resp = api_client.get_session(session_id)
                     if "session" in resp:
                         session = resp["session"]
                         st.markdown(f'''
@@ -386,18 +416,21 @@ with tab4:
         if st.button("🧠 Analyze Saved Session", use_container_width=True) and session_id_input:
             try:
                 session_id = int(session_id_input)
-                with st.spinner("🧠 Generating AI analysis of your financial session..."):
-                    resp = requests.post("http://localhost:8000/analyze-my-finances", json={"session_id": session_id}, timeout=120).json()
-                    if resp.get("status") == "success":
-                        st.markdown('<div class="success-card"><h4>🧠 AI Financial Analysis Complete!</h4></div>', unsafe_allow_html=True)
-                        st.text_area("🔍 Financial Analysis", resp["analysis"], height=400)
-                        st.markdown(f'<div class="info-card">Analysis by: <strong>{resp.get("model", "AI Assistant")}</strong></div>', unsafe_allow_html=True)
-                    else:
-                        st.markdown(f'<div class="warning-card">Analysis failed: {resp.get("error", "Unknown error")}</div>', unsafe_allow_html=True)
+                submit_report_job("analysis", "/analyze-my-finances", {"session_id": session_id})
             except ValueError:
                 st.markdown('<div class="warning-card">Please enter a valid session ID</div>', unsafe_allow_html=True)
             except Exception as e:
                 st.markdown(f'<div class="warning-card">Error during analysis: {e}</div>', unsafe_allow_html=True)
+
+        try:
+            job = poll_report_job("analysis", "Session analysis")
+            if job:
+                resp = job["result"]
+                st.markdown('<div class="success-card"><h4>🧠 AI Financial Analysis Complete!</h4></div>', unsafe_allow_html=True)
+                st.text_area("🔍 Financial Analysis", resp["analysis"], height=400)
+                st.markdown(f'<div class="info-card">Analysis by: <strong>{resp.get("model", "AI Assistant")}</strong></div>', unsafe_allow_html=True)
+        except Exception as e:
+            st.markdown(f'<div class="warning-card">Error during analysis: {e}</div>', unsafe_allow_html=True)
     
     st.markdown('</div>', unsafe_allow_html=True)
 
@@ -410,3 +443,8 @@ st.markdown("""
     <p><em>This tool provides informational content only and should not be considered as professional financial advice.</em></p>
 </div>
 """, unsafe_allow_html=True)
+
+# Poll unfinished report jobs once the whole page has rendered
+if jobs_pending:
+    time.sleep(POLL_INTERVAL)
+    st.rerun()
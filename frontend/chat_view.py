@@ -0,0 +1,45 @@
+"""
+Chat history with incrementally maintained HTML and serialized text.
+Each message is rendered once when it is added, so a Streamlit rerun only joins the visible window
+instead of re-rendering the whole conversation.
+"""
+
+PAGE_SIZE = 50
+
+def render_message(sender: str, msg: str) -> str:
+    if sender == "You":
+        return f'<div class="chat-message user-message"><strong>👤 You:</strong> {msg}</div>'
+    return f'<div class="chat-message bot-message"><strong>🤖 Assistant:</strong> {msg}</div>'
+
+class ChatLog:
+    def __init__(self, messages=None):
+        self.messages = []
+        self._html = []
+        self._serialized = ""
+        self._pending = []
+        for sender, msg in messages or []:
+            self.append(sender, msg)
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def append(self, sender: str, msg: str):
+        self.messages.append((sender, msg))
+        self._html.append(render_message(sender, msg))
+        self._pending.append(f"{sender}: {msg}")
+
+    def clear(self):
+        self.__init__()
+
+    def window_html(self, visible: int = PAGE_SIZE) -> str:
+        """HTML for the most recent `visible` messages"""
+        return "".join(self._html[-visible:]) if visible > 0 else ""
+
+    @property
+    def serialized(self) -> str:
+        """The history as "Sender: message" lines, extended with new messages rather than rebuilt"""
+        if self._pending:
+            parts = [self._serialized] + self._pending if self._serialized else self._pending
+            self._serialized = "\n".join(parts)
+            self._pending = []
+        return self._serialized